@@ -0,0 +1,218 @@
+"""
+Throughput and tail latency of the catalogue and cart reads under load, for
+three servers against the same seeded SQLite file:
+
+* gunicorn, gthread workers, serving ecommerce.wsgi (the DRF views);
+* uvicorn serving ecommerce.asgi with the DRF views, each request run in
+  the thread-sensitive executor;
+* uvicorn serving ecommerce.asgi with the routes on their async views
+  (settings.ASYNC_VIEWS, see ecommerce/asyncviews.py).
+
+Every connection is an HTTP/1.1 keep-alive connection that sends its next
+request as soon as it has the last response, cycling through the read
+endpoints with a bearer token. Servers run with benchmarks.load_settings.
+
+    pip install -r requirements-bench.txt
+    python -m benchmarks.asgi_load --connections 10 100 1000 --duration 10
+
+The load generator shares the machine with the server, so compare the
+rows with each other rather than with production numbers.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.harness import percentile, report
+
+ROOT = Path(__file__).resolve().parent.parent
+ASYNC_ROUTES = 'product-list,product-detail,category-list,category-detail,product-reviews,cart-detail'
+
+
+def seed(products):
+    """Migrate the database and fill it; return the URLs to read and an access token."""
+    import django
+    from django.core.management import call_command
+    django.setup()
+    from django.contrib.auth import get_user_model
+    from orders.models import Cart, CartItem
+    from products.models import Category, Product, ProductImage, Review
+    from users.serializers import ClaimsTokenObtainPairSerializer
+
+    call_command('migrate', verbosity=0)
+    User = get_user_model()
+    user = User.objects.create_user(username="bench", password="pass")
+    reviewers = User.objects.bulk_create(User(username=f"reviewer{i}") for i in range(5))
+    parent = Category.objects.create(name="Home")
+    categories = Category.objects.bulk_create(Category(name=f"Room {i}", parent=parent) for i in range(5))
+    catalogue = Product.objects.bulk_create(
+        Product(name=f"Product {i}", price='9.99', stock=10, category=categories[i % len(categories)])
+        for i in range(products)
+    )
+    ProductImage.objects.bulk_create(
+        ProductImage(product=product, image=f"product_images/{product.pk}.jpg") for product in catalogue
+    )
+    Review.objects.bulk_create(
+        Review(product=product, user=reviewer, rating=rating, comment="Fine")
+        for product in catalogue for rating, reviewer in enumerate(reviewers, start=1)
+    )
+    Product.objects.rebuild_rating_aggregates()
+    cart = Cart.objects.create(user=user)
+    CartItem.objects.bulk_create(CartItem(cart=cart, product=product) for product in catalogue[:5])
+
+    product = catalogue[0].pk
+    urls = [
+        '/api/products/products/?page_size=20',
+        f"/api/products/products/{product}/",
+        '/api/products/categories/',
+        f"/api/products/products/{product}/reviews/",
+        '/api/orders/cart/',
+    ]
+    return urls, str(ClaimsTokenObtainPairSerializer.get_token(user).access_token)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def server_command(server, port, args):
+    if server == 'gunicorn':
+        return [
+            sys.executable, '-m', 'gunicorn', 'ecommerce.wsgi:application',
+            '--worker-class', 'gthread', '--workers', str(args.workers), '--threads', str(args.threads),
+            '--worker-connections', '2000', '--bind', f"127.0.0.1:{port}", '--log-level', 'warning',
+        ]
+    return [
+        sys.executable, '-m', 'uvicorn', 'ecommerce.asgi:application',
+        '--workers', str(args.workers), '--host', '127.0.0.1', '--port', str(port),
+        '--log-level', 'warning', '--no-access-log',
+    ]
+
+
+async def read_response(reader):
+    """Read one response; return its status code."""
+    head = await reader.readuntil(b'\r\n\r\n')
+    status_line, *lines = head.decode('latin-1').split('\r\n')
+    headers = dict(line.lower().split(': ', 1) for line in lines if line)
+    if headers.get('transfer-encoding') == 'chunked':
+        while size := int((await reader.readuntil(b'\r\n')).strip(), 16):
+            await reader.readexactly(size + 2)
+        await reader.readuntil(b'\r\n')
+    else:
+        await reader.readexactly(int(headers.get('content-length', 0)))
+    return int(status_line.split()[1])
+
+
+async def client(port, requests, offset, deadline, latencies, failures):
+    reader = writer = None
+    index = offset
+    while time.perf_counter() < deadline:
+        request = requests[index % len(requests)]
+        index += 1
+        began = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(request)
+            status = await read_response(reader)
+        except (OSError, asyncio.IncompleteReadError):
+            failures.append(None)
+            writer = None
+            await asyncio.sleep(0.01)
+            continue
+        latencies.append(time.perf_counter() - began)
+        if status != 200:
+            failures.append(status)
+    if writer is not None:
+        writer.close()
+
+
+async def load(port, requests, connections, duration):
+    latencies, failures = [], []
+    deadline = time.perf_counter() + duration
+    began = time.perf_counter()
+    await asyncio.gather(*(
+        client(port, requests, offset, deadline, latencies, failures) for offset in range(connections)
+    ))
+    return latencies, failures, time.perf_counter() - began
+
+
+def wait_until_ready(port, server, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited with {server.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--connections', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--duration', type=float, default=10, help="seconds of load per row")
+    parser.add_argument('--workers', type=int, default=1, help="server processes")
+    parser.add_argument('--threads', type=int, default=8, help="threads per gunicorn worker")
+    parser.add_argument('--products', type=int, default=500)
+    parser.add_argument('--catalogue-cache', action='store_true', help="leave the catalogue cache on")
+    args = parser.parse_args()
+
+    directory = tempfile.TemporaryDirectory()
+    env = {
+        **os.environ,
+        'DJANGO_SETTINGS_MODULE': 'benchmarks.load_settings',
+        'BENCH_DB': os.path.join(directory.name, 'load.sqlite3'),
+    }
+    if args.catalogue_cache:
+        env['BENCH_CATALOGUE_CACHE'] = '1'
+    os.environ.update(env)
+    urls, token = seed(args.products)
+    requests = [
+        (
+            f"GET {url} HTTP/1.1\r\nHost: localhost\r\nAccept: application/json\r\n"
+            f"Authorization: Bearer {token}\r\n\r\n"
+        ).encode()
+        for url in urls
+    ]
+
+    rows = []
+    for server, views in (('gunicorn', 'DRF'), ('uvicorn', 'DRF'), ('uvicorn', 'async')):
+        port = free_port()
+        process = subprocess.Popen(
+            server_command(server, port, args), cwd=ROOT,
+            env={**env, 'BENCH_ASYNC_VIEWS': ASYNC_ROUTES if views == 'async' else ''},
+        )
+        try:
+            wait_until_ready(port, process)
+            asyncio.run(load(port, requests, 10, 2))  # warm up
+            for connections in args.connections:
+                latencies, failures, elapsed = asyncio.run(load(port, requests, connections, args.duration))
+                rows.append([
+                    server, views, connections, len(latencies), f"{len(latencies) / elapsed:.0f}",
+                    f"{percentile(latencies, 50) * 1000:.1f}", f"{percentile(latencies, 99) * 1000:.1f}",
+                    len(failures),
+                ])
+        finally:
+            process.terminate()
+            process.wait()
+    directory.cleanup()
+
+    report(
+        f"{args.duration:g}s of keep-alive GETs over {len(urls)} read endpoints, {args.workers} worker(s)",
+        ['server', 'views', 'connections', 'requests', 'req/s', 'p50 ms', 'p99 ms', 'errors'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Cart read cost by cart size: CartView (prefetched lines, total summed from
+them) against serializing a plainly fetched Cart, which is what CartView
+used to do.
+
+    python -m benchmarks.cart --sizes 1 10 100 500
+"""
+import argparse
+import time
+
+from benchmarks.harness import median_ms, report, setup_django, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100, 500])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth import get_user_model
+    from django.db import connection, reset_queries
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIClient
+    from orders.models import Cart, CartItem
+    from orders.serializers import CartSerializer
+    from products.models import Category, Product, ProductImage
+
+    def measure(read):
+        reset_queries()
+        with CaptureQueriesContext(connection) as ctx:
+            read()
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            read()
+            samples.append(time.perf_counter() - start)
+        return len(ctx.captured_queries), f"{median_ms(samples):.1f}"
+
+    rows = []
+    with test_database():
+        user = get_user_model().objects.create(username="bench")
+        cart = Cart.objects.create(user=user)
+        category = Category.objects.create(name="Bench")
+        products = Product.objects.bulk_create(
+            Product(name=f"Product {i}", price=1, stock=100, category=category)
+            for i in range(max(args.sizes))
+        )
+        ProductImage.objects.bulk_create(
+            ProductImage(product=p, image=f"product_images/{p.pk}.jpg") for p in products
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+
+        for size in args.sizes:
+            CartItem.objects.all().delete()
+            CartItem.objects.bulk_create(CartItem(cart=cart, product=p, quantity=2) for p in products[:size])
+            legacy = measure(lambda: CartSerializer(Cart.objects.get(user=user)).data)
+            current = measure(lambda: client.get('/api/orders/cart/'))
+            rows.append([size, *legacy, *current])
+
+    report(
+        "Cart read by size",
+        ['lines', 'legacy queries', 'legacy ms', 'CartView queries', 'CartView ms'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Catalogue import throughput (products/importer.py): a generated CSV of new
+products with two-level categories and one image each, then the same file
+again, when every row is an update.
+
+    python -m benchmarks.catalogue_import --products 100000 --batch-size 1000
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+
+from benchmarks.harness import report, setup_django, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=100_000)
+    parser.add_argument('--categories', type=int, default=50)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+    from products.importer import import_catalogue
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory, test_database():
+        path = os.path.join(directory, 'catalogue.csv')
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['sku', 'name', 'description', 'price', 'stock', 'category', 'images'])
+            for i in range(args.products):
+                category = i % args.categories
+                writer.writerow([
+                    f"SKU-{i:07d}", f"Product {i}", "Imported for the benchmark", f"{i % 500}.99",
+                    i % 40, f"Department {category % 5} > Category {category}", f"product_images/{i}.jpg",
+                ])
+
+        for run in ('insert', 'update'):
+            with open(path, newline='') as file:
+                start = time.perf_counter()
+                result = import_catalogue(file, 'csv', batch_size=args.batch_size)
+                elapsed = time.perf_counter() - start
+            rows.append([
+                run, result.created, result.updated, result.failed,
+                f"{elapsed:.1f}", f"{args.products / elapsed:,.0f}",
+            ])
+
+    report(
+        f"Import of {args.products} products, batch size {args.batch_size}",
+        ['run', 'created', 'updated', 'failed', 'seconds', 'rows/s'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Checkout latency and query count by cart size, through CheckoutView.
+
+    python -m benchmarks.checkout --sizes 1 10 100 1000
+"""
+import argparse
+import time
+from decimal import Decimal
+
+from benchmarks.harness import median_ms, report, setup_django, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth import get_user_model
+    from django.db import connection, reset_queries
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIClient
+    from orders.models import Address, Cart, CartItem
+    from products.models import Product
+
+    rows = []
+    with test_database():
+        user = get_user_model().objects.create(username="bench")
+        Address.objects.create(
+            user=user, full_name="Bench", phone="0", street="1 Main St", city="X",
+            state="Y", postal_code="0", country="Z", is_default=True,
+        )
+        cart = Cart.objects.create(user=user)
+        products = Product.objects.bulk_create(
+            Product(name=f"Product {i}", price=Decimal('1.99'), stock=10**6)
+            for i in range(max(args.sizes))
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+
+        def checkout(size):
+            CartItem.objects.bulk_create(CartItem(cart=cart, product=p, quantity=1) for p in products[:size])
+            start = time.perf_counter()
+            response = client.post('/api/orders/checkout/')
+            elapsed = time.perf_counter() - start
+            assert response.status_code == 201, response.data
+            return elapsed
+
+        for size in args.sizes:
+            reset_queries()
+            with CaptureQueriesContext(connection) as ctx:
+                checkout(size)
+            samples = [checkout(size) for _ in range(args.repeat)]
+            rows.append([size, len(ctx.captured_queries), f"{median_ms(samples):.1f}"])
+
+    report("CheckoutView by cart size", ['lines', 'queries', 'median ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
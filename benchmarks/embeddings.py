@@ -0,0 +1,86 @@
+"""
+Queries, payload bytes and response time for the endpoints that nest
+products (cart, order detail, wishlist), with the default product summary
+against ?expand=product, which is the full ProductSerializer form every
+one of them returned before.
+
+    python -m benchmarks.embeddings --items 50
+"""
+import argparse
+
+from benchmarks.harness import median_ms, report, setup_django, test_database, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth import get_user_model
+    from django.db import connection, reset_queries
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIClient
+    from benchmarks.search import WORDS
+    from orders.models import Address, Cart, CartItem
+    from products.models import Category, Product, ProductImage, WishlistItem
+
+    rows = []
+    with test_database():
+        user = get_user_model().objects.create_user(username="bench", password="pass")
+        address = Address.objects.create(
+            user=user, full_name="Bench", phone="555", street="1 Main St", city="Springfield",
+            state="IL", postal_code="62701", country="US", is_default=True,
+        )
+        parent = Category.objects.create(name="Parent")
+        category = Category.objects.create(name="Bench", parent=parent)
+        for i in range(8):
+            Category.objects.create(name=f"Child {i}", parent=category)
+        products = Product.objects.bulk_create(
+            Product(sku=f"SKU-{i}", name=f"Product {i}", description=' '.join(WORDS * 4), price='19.99',
+                    stock=50, category=category)
+            for i in range(args.items)
+        )
+        ProductImage.objects.bulk_create(
+            ProductImage(product=product, image=f"product_images/{product.pk}-{n}.jpg", alt_text=f"View {n}")
+            for product in products for n in range(3)
+        )
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.bulk_create(CartItem(cart=cart, product=product, quantity=1) for product in products)
+        client = APIClient()
+        client.force_authenticate(user)
+        order_id = client.post('/api/orders/checkout/', {'address_id': address.pk}).data['id']
+        CartItem.objects.bulk_create(CartItem(cart=cart, product=product, quantity=1) for product in products)
+        WishlistItem.objects.bulk_create(WishlistItem(user=user, product=product) for product in products)
+
+        endpoints = [
+            ('cart', '/api/orders/cart/', {}),
+            ('order', f"/api/orders/orders/{order_id}/", {}),
+            ('wishlist', '/api/products/wishlist/', {'page_size': args.items}),
+        ]
+        for name, url, params in endpoints:
+            measured = []
+            for form in ({'expand': 'product'}, {}):
+                query = {**params, **form}
+                reset_queries()
+                with CaptureQueriesContext(connection) as ctx:
+                    response = client.get(url, query)
+                samples = timed(lambda: client.get(url, query), args.repeat)
+                measured.append((len(ctx.captured_queries), len(response.content), median_ms(samples)))
+            (queries_before, bytes_before, ms_before), (queries_after, bytes_after, ms_after) = measured
+            rows.append([
+                name, queries_before, queries_after, f"{bytes_before:,}", f"{bytes_after:,}",
+                f"{bytes_before / bytes_after:.1f}x", f"{ms_before:.1f}", f"{ms_after:.1f}",
+            ])
+
+    report(
+        f"Nested products, {args.items} items: full (?expand=product) against summary",
+        ['endpoint', 'queries full', 'queries summary', 'bytes full', 'bytes summary', 'smaller',
+         'ms full', 'ms summary'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Export throughput and memory: the streaming CSV/NDJSON exports
+(ecommerce/export.py) against rendering ProductSerializer over the whole
+catalogue, which is what paging through the JSON API amounts to.
+
+Peak RSS is sampled while each export runs and reported above the RSS
+measured just before it, so the columns are comparable within one run.
+Streaming runs go first, because the serializer's memory is not returned
+to the OS.
+
+    python -m benchmarks.export --products 200000 --orders 50000
+"""
+import argparse
+import os
+import resource
+import threading
+import time
+
+from benchmarks.harness import report, setup_django, test_database
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+
+def rss():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * PAGE_SIZE
+
+
+class PeakRSS:
+    """Sample RSS every few milliseconds in a background thread."""
+
+    def __enter__(self):
+        self.baseline = self.peak = rss()
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self.sample)
+        self.thread.start()
+        return self
+
+    def sample(self):
+        while not self.done.wait(0.005):
+            self.peak = max(self.peak, rss())
+
+    def __exit__(self, *exc):
+        self.done.set()
+        self.thread.join()
+        self.peak = max(self.peak, rss())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=200_000)
+    parser.add_argument('--orders', type=int, default=50_000)
+    parser.add_argument('--items-per-order', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=10_000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth import get_user_model
+    from django.db import transaction
+    from rest_framework.renderers import JSONRenderer
+    from orders.exports import ORDER_EXPORT
+    from orders.models import Order, OrderItem
+    from products.exports import PRODUCT_EXPORT
+    from products.models import Category, Product
+    from products.serializers import ProductSerializer
+
+    def run(name, rows, export):
+        with PeakRSS() as memory:
+            start = time.perf_counter()
+            size = export()
+            elapsed = time.perf_counter() - start
+        return [
+            name, rows, f"{size / 2**20:.1f}", f"{rows / elapsed:,.0f}",
+            f"{(memory.peak - memory.baseline) / 2**20:.1f}",
+        ]
+
+    def stream(export, format):
+        return lambda: sum(len(chunk) for chunk in export.stream(format))
+
+    def serializer():
+        queryset = Product.objects.with_listing_data()
+        return len(JSONRenderer().render(ProductSerializer(queryset, many=True).data))
+
+    rows = []
+    with test_database():
+        user = get_user_model().objects.create(username="bench")
+        category = Category.objects.create(name="Bench")
+        for start in range(0, args.products, args.batch_size):
+            with transaction.atomic():
+                Product.objects.bulk_create(
+                    Product(name=f"Product {i}", description="A fine product " * 4, price=10,
+                            stock=5, category=category)
+                    for i in range(start, min(start + args.batch_size, args.products))
+                )
+        product_ids = list(Product.objects.values_list('id', flat=True)[:1000])
+        for start in range(0, args.orders, args.batch_size):
+            with transaction.atomic():
+                orders = Order.objects.bulk_create(
+                    Order(user=user, total=30, status='PAID', shipping_address="1 Main St")
+                    for _ in range(start, min(start + args.batch_size, args.orders))
+                )
+                OrderItem.objects.bulk_create(
+                    OrderItem(order=order, product_id=product_ids[(order.pk + n) % len(product_ids)],
+                              quantity=1, price=10)
+                    for order in orders for n in range(args.items_per_order)
+                )
+
+        order_rows = args.orders * args.items_per_order
+        rows.append(run('products csv', args.products, stream(PRODUCT_EXPORT, 'csv')))
+        rows.append(run('products ndjson', args.products, stream(PRODUCT_EXPORT, 'ndjson')))
+        rows.append(run('orders csv', order_rows, stream(ORDER_EXPORT, 'csv')))
+        rows.append(run('orders ndjson', order_rows, stream(ORDER_EXPORT, 'ndjson')))
+        rows.append(run('ProductSerializer json', args.products, serializer))
+
+    report(
+        "Exports",
+        ['export', 'rows', 'MB out', 'rows/s', 'peak RSS +MB'],
+        rows,
+    )
+    print(f"\nProcess ru_maxrss: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Shared plumbing for the benchmark scripts in this package.
+
+Run a benchmark from the repository root, e.g.::
+
+    python -m benchmarks.payments
+
+Each script works against a throwaway test database created from
+settings.DATABASES (the same one `manage.py test` uses), never the
+development database.
+"""
+import contextlib
+import os
+import statistics
+import time
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce.settings')
+    import django
+    django.setup()
+
+
+@contextlib.contextmanager
+def test_database():
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def timed(fn, repeat=5):
+    """Run fn `repeat` times and return the wall-clock seconds of each run."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def median_ms(samples):
+    return statistics.median(samples) * 1000
+
+
+def report(title, header, rows):
+    """Print rows as a fixed-width table."""
+    widths = [max(len(str(cell)) for cell in column) for column in zip(header, *rows)]
+    print(f"\n{title}")
+    for row in [header, ['-' * width for width in widths], *rows]:
+        print('  '.join(str(cell).rjust(width) for cell, width in zip(row, widths)))
@@ -0,0 +1,71 @@
+"""
+Product image renditions per second (products.images) by worker count:
+every size in RENDITIONS, as WebP and JPEG, from camera-sized JPEGs.
+
+    python -m benchmarks.image_renditions --images 48 --workers 0 1 2 4 8
+
+0 workers is the request thread itself, i.e. what an upload would cost if
+it made its renditions before answering.
+"""
+import argparse
+import io
+import tempfile
+import time
+
+from benchmarks.harness import report, setup_django, test_database
+
+
+def photo(width, height, seed):
+    """A JPEG with a photo's detail, which is what makes encoding work."""
+    from PIL import Image, ImageChops
+    noise = Image.effect_noise((width, height), 40 + seed % 20).convert('RGB')
+    gradient = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    image = ImageChops.add(ImageChops.multiply(noise, gradient), Image.new('RGB', (width, height), (seed % 255, 90, 40)))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=48)
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 1, 2, 4, 8])
+    parser.add_argument('--size', type=int, nargs=2, default=[4000, 3000], metavar=('WIDTH', 'HEIGHT'))
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.files.base import ContentFile
+    from django.test import override_settings
+    from products.images import process_images
+    from products.models import Product, ProductImage
+
+    rows = []
+    with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media), test_database():
+        product = Product.objects.create(name="Bench", price='1.00', stock=1)
+        originals = [photo(*args.size, seed) for seed in range(8)]
+        for i in range(args.images):
+            image = ProductImage(product=product)
+            image.image.save(f"bench-{i}.jpg", ContentFile(originals[i % len(originals)]), save=False)
+            image.save()
+        pks = list(ProductImage.objects.values_list('pk', flat=True))
+
+        baseline = None
+        for workers in args.workers:
+            ProductImage.objects.update(renditions={}, processed_at=None)
+            began = time.perf_counter()
+            processed = process_images(pks, workers)
+            elapsed = time.perf_counter() - began
+            assert processed == len(pks), processed
+            rate = len(pks) / elapsed
+            baseline = baseline or rate
+            rows.append([workers, len(pks), f"{elapsed:.2f}", f"{rate:.1f}", f"{rate / baseline:.2f}x"])
+
+    report(
+        f"Renditions of {args.images} {args.size[0]}x{args.size[1]} JPEGs",
+        ['workers', 'images', 'seconds', 'images/s', 'speedup'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Disk used by product image uploads when every variant of a product is
+uploaded with the same pictures: the plain FileSystemStorage ProductImage
+used to write to, against products.storage.ContentAddressedStorage.
+
+    python -m benchmarks.image_storage --pictures 50 --variants 4
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.harness import report, setup_django
+from benchmarks.image_renditions import photo
+
+
+def disk_usage(root):
+    files = [os.path.join(path, name) for path, _, names in os.walk(root) for name in names]
+    return len(files), sum(os.path.getsize(file) for file in files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pictures', type=int, default=50, help="distinct pictures")
+    parser.add_argument('--variants', type=int, default=4, help="uploads of each picture")
+    parser.add_argument('--size', type=int, nargs=2, default=[1600, 1200], metavar=('WIDTH', 'HEIGHT'))
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import FileSystemStorage
+    from products.storage import ContentAddressedStorage
+
+    pictures = [photo(*args.size, seed) for seed in range(args.pictures)]
+    rows = []
+    for storage_class in (FileSystemStorage, ContentAddressedStorage):
+        with tempfile.TemporaryDirectory() as root:
+            storage = storage_class(location=root)
+            names = set()
+            began = time.perf_counter()
+            for variant in range(args.variants):
+                for i, picture in enumerate(pictures):
+                    names.add(storage.save(f"product_images/picture-{i}.jpg", ContentFile(picture)))
+            elapsed = time.perf_counter() - began
+            files, size = disk_usage(root)
+            uploads = args.pictures * args.variants
+            rows.append([
+                storage_class.__name__, uploads, len(names), files, f"{size / 2**20:.1f}",
+                f"{elapsed / uploads * 1000:.2f}",
+            ])
+
+    report(
+        f"{args.pictures} {args.size[0]}x{args.size[1]} pictures, each uploaded {args.variants} times",
+        ['storage', 'uploads', 'names', 'files', 'MiB', 'ms/save'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Background jobs (jobs.queue) run per second by worker threads, for jobs
+that only touch the queue and for jobs that wait on a slow service (an SMTP
+server, a payment API), and what enqueueing one adds to the request.
+
+    python -m benchmarks.jobs --jobs 2000 --threads 1 2 4 8 --wait-ms 20
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from benchmarks.harness import median_ms, report, setup_django, test_database, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, default=2000)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--batch-size', type=int, default=10)
+    parser.add_argument('--wait-ms', type=float, default=20, help="how long the slow handler waits")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from jobs.models import Job
+    from jobs.queue import Metrics, Worker, enqueue, job
+
+    @job('bench.noop')
+    def noop(n):
+        pass
+
+    @job('bench.wait')
+    def wait(n):
+        time.sleep(args.wait_ms / 1000)
+
+    def work(name, metrics):
+        try:
+            Worker(name, metrics, args.batch_size).run(burst=True)
+        finally:
+            connection.close()
+
+    rows = []
+    with test_database():
+        counter = iter(range(10**9))
+        enqueue_ms = median_ms(timed(lambda: enqueue('bench.noop', {'n': next(counter)}), repeat=200))
+        keyed_ms = median_ms(timed(lambda: enqueue('bench.noop', {'n': 0}, key=f"bench-{next(counter)}"), repeat=200))
+        # Enqueueing under a key that exists: the insert fails and the job is read back.
+        duplicate_ms = median_ms(timed(lambda: enqueue('bench.noop', {'n': 0}, key="bench-1"), repeat=200))
+
+        for name, jobs in (('bench.noop', args.jobs), ('bench.wait', args.jobs // 10)):
+            for threads in args.threads:
+                Job.objects.all().delete()
+                Job.objects.bulk_create(
+                    Job(name=name, payload={'n': n}, max_attempts=1) for n in range(jobs)
+                )
+                metrics = Metrics()
+                pool = [threading.Thread(target=work, args=(f"bench-{i}", metrics)) for i in range(threads)]
+                began = time.perf_counter()
+                for thread in pool:
+                    thread.start()
+                for thread in pool:
+                    thread.join()
+                elapsed = time.perf_counter() - began
+                snapshot = metrics.snapshot()
+                assert snapshot['done'] == jobs == Job.objects.filter(status='DONE').count(), snapshot
+                durations = sorted(metrics.durations)
+                rows.append([
+                    name, threads, jobs, f"{elapsed:.2f}", f"{jobs / elapsed:.0f}",
+                    f"{statistics.median(durations) * 1000:.2f}", f"{snapshot['run_p99_ms']:.2f}",
+                ])
+
+    report(
+        f"Jobs run by worker threads ({connection.vendor}, batches of {args.batch_size})",
+        ['handler', 'threads', 'jobs', 'seconds', 'jobs/s', 'run p50 ms', 'run p99 ms'],
+        rows,
+    )
+    report(
+        "Enqueue cost",
+        ['enqueue', 'keyed', 'existing key'],
+        [[f"{enqueue_ms:.2f}ms", f"{keyed_ms:.2f}ms", f"{duplicate_ms:.2f}ms"]],
+    )
+
+
+if __name__ == '__main__':
+    main()
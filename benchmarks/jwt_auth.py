@@ -0,0 +1,71 @@
+"""
+Authenticated requests per second for cart and order reads with bearer
+tokens, authenticated by simplejwt's JWTAuthentication (a user query per
+request) against users.authentication.CachedJWTAuthentication.
+
+    python -m benchmarks.jwt_auth --requests 500
+"""
+import argparse
+import time
+
+from benchmarks.harness import report, setup_django, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--items', type=int, default=5)
+    parser.add_argument('--orders', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth import get_user_model
+    from django.db import connection, reset_queries
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIClient
+    from rest_framework.views import APIView
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from orders.models import Cart, CartItem, Order
+    from products.models import Product
+    from users.authentication import CachedJWTAuthentication
+
+    rows = []
+    with test_database():
+        user = get_user_model().objects.create_user(username="bench", password="pass")
+        products = Product.objects.bulk_create(
+            Product(name=f"Product {i}", price='9.99', stock=100) for i in range(args.items)
+        )
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.bulk_create(CartItem(cart=cart, product=product) for product in products)
+        Order.objects.bulk_create(Order(user=user, total='9.99') for _ in range(args.orders))
+
+        client = APIClient()
+        access = client.post('/api/token/', {'username': "bench", 'password': "pass"}).data['access']
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+
+        for url in ('/api/orders/cart/', '/api/orders/orders/'):
+            for authentication in (JWTAuthentication, CachedJWTAuthentication):
+                # Every view takes its authentication from APIView's default.
+                APIView.authentication_classes = [authentication]
+                client.get(url)
+                reset_queries()
+                with CaptureQueriesContext(connection) as ctx:
+                    assert client.get(url).status_code == 200
+                began = time.perf_counter()
+                for _ in range(args.requests):
+                    client.get(url)
+                elapsed = time.perf_counter() - began
+                rows.append([
+                    url, authentication.__name__, len(ctx.captured_queries),
+                    f"{args.requests / elapsed:.0f}", f"{elapsed / args.requests * 1000:.2f}",
+                ])
+
+    report(
+        f"{args.requests} authenticated GETs per endpoint",
+        ['endpoint', 'authentication', 'queries', 'req/s', 'ms/req'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
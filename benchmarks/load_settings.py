@@ -0,0 +1,26 @@
+"""
+Settings for the servers benchmarks.asgi_load starts: production-like
+(DEBUG off, so no query log), against the database file it seeds, with the
+routes in BENCH_ASYNC_VIEWS (comma separated) on their async views.
+"""
+import os
+from datetime import timedelta
+
+from ecommerce.settings import *  # noqa: F401,F403
+from ecommerce.settings import CACHES, DATABASES, SIMPLE_JWT
+
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+
+DATABASES = {'default': {**DATABASES['default'], 'NAME': os.environ['BENCH_DB']}}
+
+ASYNC_VIEWS = [name for name in os.environ.get('BENCH_ASYNC_VIEWS', '').split(',') if name]
+
+# Left on, the catalogue cache answers nearly every read without a query;
+# off, each request does the work its view does on a miss.
+if not os.environ.get('BENCH_CATALOGUE_CACHE'):
+    CACHES = {**CACHES, 'catalogue': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+    CATALOGUE_CACHE_ALIAS = 'catalogue'
+
+# The token is minted once, before the run.
+SIMPLE_JWT = {**SIMPLE_JWT, 'ACCESS_TOKEN_LIFETIME': timedelta(hours=1)}
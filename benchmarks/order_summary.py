@@ -0,0 +1,63 @@
+"""
+The account page's order overview: /orders/summary/, served from the
+user's UserOrderStats row, against paging through /orders/ to count the
+same things client-side, for a user with --orders orders of --items items.
+
+    python -m benchmarks.order_summary --orders 200
+"""
+import argparse
+
+from benchmarks.harness import median_ms, report, setup_django, test_database, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--orders', type=int, default=200)
+    parser.add_argument('--items', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth import get_user_model
+    from django.db import connection, reset_queries
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIClient
+    from orders.models import Order, OrderItem
+    from orders.services import STATUS_FIELDS
+    from products.models import Product
+
+    rows = []
+    with test_database():
+        user = get_user_model().objects.create_user(username="bench", password="pass")
+        products = Product.objects.bulk_create(
+            Product(name=f"Product {i}", price='9.99', stock=100) for i in range(args.items)
+        )
+        statuses = list(STATUS_FIELDS)
+        for i in range(args.orders):
+            order = Order.objects.create(user=user, total='29.97', status=statuses[i % len(statuses)])
+            OrderItem.objects.bulk_create(
+                OrderItem(order=order, product=product, quantity=1, price='9.99') for product in products
+            )
+        client = APIClient()
+        client.force_authenticate(user)
+
+        def list_orders():
+            url, data = '/api/orders/orders/', {'page_size': 100}
+            while url:
+                response = client.get(url, data)
+                url, data = response.data['next'], None
+
+        def summary():
+            client.get('/api/orders/orders/summary/')
+
+        for name, read in (('paged /orders/', list_orders), ('/orders/summary/', summary)):
+            reset_queries()
+            with CaptureQueriesContext(connection) as ctx:
+                read()
+            rows.append([name, len(ctx.captured_queries), f"{median_ms(timed(read, args.repeat)):.1f}"])
+
+    report(f"Order overview for a user with {args.orders} orders", ['source', 'queries', 'ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Concurrent payment throughput and correctness: the conditional-UPDATE
+stock decrement (orders.services.pay_order) against the original
+read-check-save loop that PaymentSimulationView used to run.
+
+    python -m benchmarks.payments --threads 8 --orders 400
+"""
+import argparse
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.harness import report, setup_django, test_database
+
+
+def legacy_pay(order):
+    # PaymentSimulationView.post before the rewrite, minus the HTTP layer.
+    for item in order.items.all():
+        if item.product.stock < item.quantity:
+            return False
+    for item in order.items.all():
+        item.product.stock -= item.quantity
+        item.product.save()
+    order.status = "PAID"
+    order.payment_method = "MockPay"
+    order.transaction_id = str(uuid.uuid4())
+    order.save()
+    return True
+
+
+def atomic_pay(order):
+    from orders.services import InsufficientStock, OrderNotPending, pay_order
+    try:
+        pay_order(order, "MockPay")
+    except (InsufficientStock, OrderNotPending):
+        return False
+    return True
+
+
+def seed(orders, stock, lines):
+    from django.contrib.auth import get_user_model
+    from orders.models import Order, OrderItem
+    from products.models import Product
+
+    Order.objects.all().delete()
+    Product.objects.all().delete()
+    user, _ = get_user_model().objects.get_or_create(username="bench")
+    products = Product.objects.bulk_create(
+        Product(name=f"Product {i}", price=1, stock=stock) for i in range(lines)
+    )
+    created = Order.objects.bulk_create(Order(user=user, total=lines) for _ in range(orders))
+    OrderItem.objects.bulk_create(
+        OrderItem(order=order, product=product, quantity=1, price=1)
+        for order in created for product in products
+    )
+    return [order.pk for order in created]
+
+
+def run(pay, order_ids, threads):
+    from django.db import connection
+    from orders.models import Order
+
+    def worker(order_id):
+        try:
+            return pay(Order.objects.get(pk=order_id))
+        except Exception:
+            return None
+        finally:
+            connection.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        outcomes = list(pool.map(worker, order_ids))
+    return time.perf_counter() - start, outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--orders', type=int, default=400)
+    parser.add_argument('--stock', type=int, default=200)
+    parser.add_argument('--lines', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    from orders.models import OrderItem
+    from products.models import Product
+
+    rows = []
+    with test_database():
+        for name, pay in [('legacy', legacy_pay), ('atomic', atomic_pay)]:
+            order_ids = seed(args.orders, args.stock, args.lines)
+            elapsed, outcomes = run(pay, order_ids, args.threads)
+            sold = sum(OrderItem.objects.filter(order__status='PAID').values_list('quantity', flat=True))
+            taken = sum(args.stock - p.stock for p in Product.objects.all())
+            rows.append([
+                name,
+                outcomes.count(True),
+                outcomes.count(None),
+                sold - taken,
+                f"{len(order_ids) / elapsed:.0f}",
+            ])
+    report(
+        f"{args.orders} orders x {args.lines} lines, {args.threads} threads, stock {args.stock}/product",
+        ['impl', 'paid', 'errors', 'oversold', 'payments/s'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Sales reports over a year of orders: the SalesRollup reads behind the
+admin analytics endpoints against the same aggregates computed ad hoc over
+OrderItem joined to Order, which is what the reports would otherwise run.
+
+    python -m benchmarks.sales_analytics --days 365 --orders-per-day 300
+"""
+import argparse
+import datetime
+import random
+import time
+
+from benchmarks.harness import median_ms, report, setup_django, test_database, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--orders-per-day', type=int, default=300)
+    parser.add_argument('--items-per-order', type=int, default=3)
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth import get_user_model
+    from django.db import transaction
+    from django.db.models import F, Sum
+    from django.db.models.functions import TruncMonth
+    from django.utils import timezone
+    from orders import analytics
+    from orders.models import Order, OrderItem
+    from products.models import Category, Product
+
+    random.seed(19)
+    rows = []
+    with test_database():
+        user = get_user_model().objects.create_user(username="bench", password="pass")
+        categories = Category.objects.bulk_create(Category(name=f"Category {i}") for i in range(20))
+        products = Product.objects.bulk_create(
+            Product(name=f"Product {i}", price=f"{random.randint(1, 200)}.99", stock=0,
+                    category=categories[i % len(categories)])
+            for i in range(args.products)
+        )
+        end = timezone.localdate()
+        start = end - datetime.timedelta(days=args.days - 1)
+        for day in range(args.days):
+            paid_at = timezone.now() - datetime.timedelta(days=day)
+            with transaction.atomic():
+                orders = Order.objects.bulk_create(
+                    Order(user=user, status='DELIVERED', total=0, paid_at=paid_at)
+                    for _ in range(args.orders_per_day)
+                )
+                OrderItem.objects.bulk_create(
+                    OrderItem(order=order, product=product, quantity=random.randint(1, 3), price=product.price)
+                    for order in orders for product in random.sample(products, args.items_per_order)
+                )
+
+        began = time.perf_counter()
+        written = analytics.rebuild_sales_rollup()
+        rebuild_seconds = time.perf_counter() - began
+
+        items = OrderItem.objects.filter(
+            order__status__in=Order.SPENT_STATUSES,
+            order__paid_at__gte=analytics._day_start(start),
+            order__paid_at__lt=analytics._day_start(end + datetime.timedelta(days=1)),
+        ).order_by()
+        figures = {'total_quantity': Sum('quantity'), 'total_revenue': Sum(F('quantity') * F('price'))}
+        reports = [
+            (
+                'revenue by month',
+                lambda: analytics.revenue_by_period(start, end, 'month'),
+                lambda: list(items.annotate(period=TruncMonth('order__paid_at')).values('period')
+                             .annotate(**figures).order_by('period')),
+            ),
+            (
+                'top 10 products',
+                lambda: analytics.top_products(start, end),
+                lambda: list(items.values('product_id', 'product__name').annotate(**figures)
+                             .order_by('-total_revenue', 'product_id')[:10]),
+            ),
+            (
+                'revenue by category',
+                lambda: analytics.revenue_by_category(start, end),
+                lambda: list(items.values('product__category_id', 'product__category__name')
+                             .annotate(**figures).order_by('-total_revenue', 'product__category_id')),
+            ),
+        ]
+        for name, rollup, ad_hoc in reports:
+            before = timed(ad_hoc, args.repeat)
+            after = timed(rollup, args.repeat)
+            rows.append([
+                name, f"{median_ms(before):.1f}", f"{median_ms(after):.1f}",
+                f"{median_ms(before) / median_ms(after):.0f}x",
+            ])
+
+    items = args.days * args.orders_per_day * args.items_per_order
+    report(
+        f"Sales reports over {args.days} days: {items:,} order items, {written:,} rollup rows "
+        f"(rebuilt in {rebuild_seconds:.1f}s)",
+        ['report', 'OrderItem ms', 'SalesRollup ms', 'speedup'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Product search latency: the full-text backend (products/search.py) against
+the icontains match over name and description that DRF's SearchFilter
+used to run, on a generated catalogue. Each sample fetches one page of 20
+ids: by relevance for full-text, newest first for icontains.
+
+icontains only looks cheap for common words, because the scan stops after
+the first 20 hits; rare words and misses scan the whole table. Full-text
+cost follows the number of matches instead, since they are all ranked.
+
+    python -m benchmarks.search --products 1000000
+"""
+import argparse
+import random
+
+from benchmarks.harness import median_ms, percentile, report, setup_django, test_database, timed
+
+WORDS = (
+    "lamp kettle chair table phone case cable charger speaker headphones wallet "
+    "backpack bottle mug notebook pencil jacket boots scarf gloves blender toaster "
+    "mirror pillow blanket candle clock frame rug shelf"
+).split()
+ADJECTIVES = (
+    "red blue green black white wooden steel leather cotton wireless compact "
+    "portable vintage modern classic deluxe premium eco smart travel"
+).split()
+QUERIES = ["kettle", "premium lamp", "wire", "vintage leather boots", "headph", "12345", "nothingmatches"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=1_000_000)
+    parser.add_argument('--batch-size', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import transaction
+    from django.db.models import Q
+    from products.models import Product
+    from products.search import get_search_backend, tokenize
+
+    def legacy(words):
+        queryset = Product.objects.all()
+        for word in words:
+            queryset = queryset.filter(Q(name__icontains=word) | Q(description__icontains=word))
+        return queryset.order_by('-id')
+
+    def full_text(words):
+        return backend.search(Product.objects.all(), words).order_by('-search_rank', '-id')
+
+    rng = random.Random(0)
+
+    def generate(start, count):
+        for i in range(start, start + count):
+            noun = rng.choice(WORDS)
+            name = f"{rng.choice(ADJECTIVES)} {rng.choice(ADJECTIVES)} {noun} {i}"
+            description = ' '.join(rng.choice(ADJECTIVES + WORDS) for _ in range(12))
+            yield Product(name=name, description=description, price=10, stock=5)
+
+    rows = []
+    with test_database():
+        backend = get_search_backend()
+        for start in range(0, args.products, args.batch_size):
+            with transaction.atomic():
+                Product.objects.bulk_create(generate(start, min(args.batch_size, args.products - start)))
+        with transaction.atomic():
+            backend.rebuild()
+
+        for query in QUERIES:
+            words = tokenize([query])
+            matches = full_text(words).count()
+            cells = [query, matches]
+            for build in (legacy, full_text):
+                samples = timed(lambda: list(build(words).values_list('id', flat=True)[:20]), args.repeat)
+                cells += [f"{median_ms(samples):.1f}", f"{percentile(samples, 99) * 1000:.1f}"]
+            rows.append(cells)
+
+    report(
+        f"Search over {args.products} products ({type(backend).__name__})",
+        ['query', 'matches', 'icontains p50 ms', 'icontains p99 ms', 'full-text p50 ms', 'full-text p99 ms'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
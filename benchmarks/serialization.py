@@ -0,0 +1,87 @@
+"""
+Products rendered per second: ProductSerializer against the values() fast
+path in products/rendering.py, for one listing page of each size.
+
+"end to end" includes the queries; "format only" works on rows that were
+already fetched (model instances with their prefetches for the serializer,
+values rows plus images and subcategories for the fast path).
+
+    python -m benchmarks.serialization --page-sizes 20 100
+"""
+import argparse
+
+from benchmarks.harness import median_ms, report, setup_django, test_database, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--page-sizes', type=int, nargs='+', default=[20, 100])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.test import APIRequestFactory
+    from products.models import Category, Product, ProductImage
+    from products.rendering import format_products, product_rows, related_querysets, render_products
+    from products.serializers import ProductSerializer
+
+    def per_second(samples, size):
+        return f"{size / (median_ms(samples) / 1000):,.0f}"
+
+    rows = []
+    with test_database():
+        request = APIRequestFactory().get('/')
+        parent = Category.objects.create(name="Parent")
+        category = Category.objects.create(name="Bench", parent=parent)
+        for i in range(5):
+            Category.objects.create(name=f"Child {i}", parent=category)
+        products = Product.objects.bulk_create(
+            Product(sku=f"SKU-{i}", name=f"Product {i}", description="Benchmark product", price='19.99',
+                    stock=5, category=category)
+            for i in range(max(args.page_sizes))
+        )
+        ProductImage.objects.bulk_create(
+            ProductImage(product=product, image=f"product_images/{product.pk}-{n}.jpg")
+            for product in products for n in range(2)
+        )
+
+        for size in args.page_sizes:
+            queryset = Product.objects.with_listing_data().order_by('-id')[:size]
+            values = product_rows(Product.objects.order_by('-id'))[:size]
+
+            def serializer():
+                return ProductSerializer(queryset.all(), many=True, context={'request': request}).data
+
+            def fast():
+                return render_products(values.all(), request)
+
+            instances = list(queryset.all())
+            fetched = list(values.all())
+            images, subcategories = (list(qs) for qs in related_querysets(fetched))
+
+            def serializer_format():
+                return ProductSerializer(instances, many=True, context={'request': request}).data
+
+            def fast_format():
+                return format_products(fetched, images, subcategories, request)
+
+            for label, slow, quick in (
+                ('end to end', serializer, fast),
+                ('format only', serializer_format, fast_format),
+            ):
+                before = timed(slow, args.repeat)
+                after = timed(quick, args.repeat)
+                rows.append([
+                    size, label, per_second(before, size), per_second(after, size),
+                    f"{median_ms(before) / median_ms(after):.1f}x",
+                ])
+
+    report(
+        "Products rendered per second",
+        ['page', 'measure', 'ProductSerializer', 'fast path', 'speedup'],
+        rows,
+    )
+
+
+if __name__ == '__main__':
+    main()
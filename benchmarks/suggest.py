@@ -0,0 +1,95 @@
+"""
+Suggest index (products/suggest.py) build cost, memory footprint and lookup
+latency on a generated catalogue, plus the cost of one incremental update.
+
+Lookups use random 1-8 character prefixes of indexed words, and a second
+word for a quarter of them. The first lookup of a very broad prefix ranks
+every match and is reported apart from the rest.
+
+    python -m benchmarks.suggest --products 1000000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from benchmarks.harness import median_ms, percentile, report, setup_django, test_database
+from benchmarks.search import ADJECTIVES, WORDS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=1_000_000)
+    parser.add_argument('--batch-size', type=int, default=10_000)
+    parser.add_argument('--lookups', type=int, default=20_000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import transaction
+    from products.models import Category, Product
+    from products.suggest import SuggestIndex
+
+    rng = random.Random(0)
+    vocabulary = WORDS + ADJECTIVES
+
+    def generate(start, count):
+        for i in range(start, start + count):
+            name = f"{rng.choice(ADJECTIVES)} {rng.choice(WORDS)} {rng.choice(vocabulary)}{i % 997}"
+            yield Product(name=name, price=10, stock=5, rating_count=rng.randrange(500))
+
+    def sample_query():
+        query = rng.choice(vocabulary)[:rng.randint(1, 8)]
+        if rng.random() < 0.25:
+            query = f"{rng.choice(ADJECTIVES)} {query}"
+        return query
+
+    with test_database():
+        Category.objects.bulk_create(Category(name=f"{word} department") for word in WORDS)
+        for start in range(0, args.products, args.batch_size):
+            with transaction.atomic():
+                Product.objects.bulk_create(generate(start, min(args.batch_size, args.products - start)))
+
+        tracemalloc.start()
+        index = SuggestIndex.build()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del index
+
+        start = time.perf_counter()
+        index = SuggestIndex.build()
+        build_seconds = time.perf_counter() - start
+
+        queries = [sample_query() for _ in range(args.lookups)]
+        first, warm, seen = [], [], set()
+        for query in queries:
+            start = time.perf_counter()
+            index.suggest(query)
+            elapsed = time.perf_counter() - start
+            (warm if query in seen else first).append(elapsed)
+            seen.add(query)
+
+        updates = []
+        for pk in rng.sample(range(1, args.products + 1), 200):
+            start = time.perf_counter()
+            index.update('product', pk, f"{rng.choice(ADJECTIVES)} {rng.choice(WORDS)} renamed", 1)
+            updates.append(time.perf_counter() - start)
+
+    report(
+        f"Suggest index over {args.products} products",
+        ['entries', 'build s', 'resident MB', 'build peak MB'],
+        [[len(index.entries), f"{build_seconds:.1f}", f"{current / 2**20:.0f}", f"{peak / 2**20:.0f}"]],
+    )
+    report(
+        "Latency",
+        ['operation', 'count', 'p50 ms', 'p99 ms', 'max ms'],
+        [
+            [name, len(samples), f"{median_ms(samples):.3f}", f"{percentile(samples, 99) * 1000:.3f}",
+             f"{max(samples) * 1000:.3f}"]
+            for name, samples in (('first lookup', first), ('repeat lookup', warm), ('update', updates))
+            if samples
+        ],
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Async variants of DRF read endpoints, for serving under ASGI.
+
+DRF views are synchronous, so under an ASGI server every request to one is
+handed to a worker thread and back. An AsyncReadView answers GET and HEAD
+on the event loop instead. It borrows an instance of the DRF view it stands
+in for (`view_class`) for everything that does not touch the database:
+queryset construction, filters, pagination, serializers, permissions and
+exception handling. It fetches with the async ORM (aget, afirst, async for)
+and renders JSON. Any other method goes to the DRF view itself, which is
+also the only way to get the browsable API.
+
+Django 5.2's async ORM still runs each query in the thread-sensitive
+executor, so a request costs one thread hop per query rather than one for
+the whole view; the views keep their query counts small for that reason.
+
+The ASYNC_VIEWS setting names the routes served this way (see
+async_routes()); everything else stays on the DRF views.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+SAFE_READS = ('GET', 'HEAD')
+
+
+def async_routes(*patterns):
+    """The URL patterns among `patterns` whose names are in settings.ASYNC_VIEWS."""
+    return [pattern for pattern in patterns if pattern.name in settings.ASYNC_VIEWS]
+
+
+class AsyncReadView(View):
+    """
+    Subclasses set `view_class` (and `actions`, the viewset's method to
+    action map, for a viewset) and implement read(view, request, ...),
+    returning a DRF Response.
+    """
+    view_class = None
+    actions = None
+    sync_view = None
+    renderer = JSONRenderer()
+    # Every method goes through the async dispatch(), there are no handlers
+    # for View to tell from.
+    view_is_async = True
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        if cls.actions is not None:
+            sync_view = cls.view_class.as_view(cls.actions)
+        else:
+            sync_view = cls.view_class.as_view()
+        # Like APIView.as_view(): authentication is by token, never by session.
+        return csrf_exempt(super().as_view(sync_view=sync_view, **initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method not in SAFE_READS:
+            return await sync_to_async(self.sync_view)(request, *args, **kwargs)
+
+        view = self.view_class(args=args, kwargs=kwargs, format_kwarg=None, headers={})
+        if self.actions is not None:
+            # What ViewSetMixin.as_view() does for each request.
+            view.action_map, view.action = self.actions, self.actions['get']
+            for method, action in self.actions.items():
+                setattr(view, method, getattr(view, action))
+        view.request = request = Request(
+            request,
+            authenticators=view.get_authenticators(),
+            parser_context={'view': view, 'args': args, 'kwargs': kwargs},
+        )
+        try:
+            await self.authenticate(request)
+            view.check_permissions(request)
+            response = await self.read(view, request, *args, **kwargs)
+        except Exception as exc:
+            response = view.handle_exception(exc)
+        return self.render(view, response)
+
+    async def authenticate(self, request):
+        """Request._authenticate(), awaiting each authenticator's aauthenticate() where it has one."""
+        for authenticator in request.authenticators:
+            aauthenticate = getattr(authenticator, 'aauthenticate', None)
+            if aauthenticate is None:
+                aauthenticate = sync_to_async(authenticator.authenticate)
+            try:
+                result = await aauthenticate(request)
+            except Exception:
+                request._not_authenticated()
+                raise
+            if result is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = result
+                return
+        request._not_authenticated()
+
+    async def read(self, view, request, *args, **kwargs):
+        raise NotImplementedError
+
+    def render(self, view, response):
+        # The JSON and headers DRF's finalize_response() would give it.
+        rendered = HttpResponse(
+            self.renderer.render(response.data), status=response.status_code,
+            content_type=self.renderer.media_type,
+        )
+        for header, value in response.items():
+            if header != 'Content-Type':
+                rendered[header] = value
+        rendered['Allow'] = ', '.join(view.allowed_methods)
+        rendered['Vary'] = 'Accept'
+        return rendered
@@ -0,0 +1,78 @@
+"""
+Sparse fieldsets and expansion for API serializers.
+
+On reads, ?fields=id,name keeps only the listed fields of the top-level
+object (of each object, for a list) and ?omit=description drops fields from
+it. ?expand=product swaps a field's compact nested form for its full one,
+wherever that field appears. Unknown names are ignored. Writes always use
+and return every field.
+
+FieldSelectionMixin applies the parameters to a serializer.
+FieldSelectionViewMixin lets a view tie the joins, prefetches and
+annotations behind a field to that field, so dropping it from the response
+also drops the SQL work.
+"""
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+def query_names(request, param):
+    """The comma-separated names in ?<param>=, or None when it is absent."""
+    if request is None:
+        return None
+    value = getattr(request, 'query_params', request.GET).get(param)
+    if value is None:
+        return None
+    return {name.strip() for name in value.split(',')} - {''}
+
+
+def is_expanded(request, name):
+    return name in (query_names(request, 'expand') or ())
+
+
+def selected_fields(request, names):
+    """The names, in order, that the request's ?fields= and ?omit= keep."""
+    if request is None or request.method not in SAFE_METHODS:
+        return list(names)
+    only = query_names(request, 'fields')
+    omit = query_names(request, 'omit') or set()
+    return [name for name in names if (only is None or name in only) and name not in omit]
+
+
+class FieldSelectionMixin:
+    """
+    `expandable_fields` maps a field name to a callable returning the field
+    that replaces it under ?expand=<name>.
+    """
+    expandable_fields = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        for name, expanded in self.expandable_fields.items():
+            if name in fields and is_expanded(request, name):
+                fields[name] = expanded()
+        if self.is_top_level():
+            fields = {name: fields[name] for name in selected_fields(request, fields)}
+        return fields
+
+    def is_top_level(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+
+class FieldSelectionViewMixin:
+    """
+    `field_querysets` maps a serializer field to a function taking the
+    queryset and the request and returning it with whatever that field
+    needs (select_related, prefetch_related, annotate). get_queryset()
+    should pass its queryset through select_for_fields().
+    """
+    field_querysets = {}
+
+    def select_for_fields(self, queryset):
+        for name in selected_fields(self.request, self.field_querysets):
+            queryset = self.field_querysets[name](queryset, self.request)
+        return queryset
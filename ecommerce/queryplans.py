@@ -0,0 +1,56 @@
+"""
+EXPLAIN for the queries an endpoint runs, to check in tests that its hot
+query shapes are served from an index rather than a full table scan.
+
+    with QueryPlans() as plans:
+        client.get('/api/orders/orders/')
+    assert not plans.full_scans()
+
+Supported on SQLite (EXPLAIN QUERY PLAN) and PostgreSQL. Test tables hold
+a handful of rows, which PostgreSQL would rather read whole, so sequential
+scans are switched off while explaining: a Seq Scan that is still chosen
+means no index applies at all.
+"""
+import re
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+FULL_SCAN = {
+    # "SCAN t" reads the whole table; "SCAN t USING INDEX i" walks an index
+    # in order and stops at the LIMIT, "SEARCH t ..." seeks into one.
+    'sqlite': re.compile(r'\bSCAN (\w+)$'),
+    'postgresql': re.compile(r'\bSeq Scan on (\w+)'),
+}
+EXPLAINED = ('SELECT', 'UPDATE', 'DELETE')
+
+
+def explain(sql, using=connection):
+    """The plan of `sql` (with its parameters inlined), one line per step."""
+    with transaction.atomic(using=using.alias), using.cursor() as cursor:
+        if using.vendor == 'postgresql':
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        cursor.execute(f"{using.ops.explain_query_prefix()} {sql}")
+        return [str(row[-1]).strip() for row in cursor.fetchall()]
+
+
+def full_scans(sql, using=connection):
+    """The tables `sql` reads in full."""
+    pattern = FULL_SCAN[using.vendor]
+    return [match.group(1) for line in explain(sql, using) for match in [pattern.search(line)] if match]
+
+
+class QueryPlans(CaptureQueriesContext):
+    """Capture the queries run inside the block, to explain them afterwards."""
+
+    def statements(self):
+        return [query['sql'] for query in self.captured_queries if query['sql'].startswith(EXPLAINED)]
+
+    def full_scans(self):
+        """{sql: [tables read in full]} for the captured queries that scan any."""
+        scans = {}
+        for sql in self.statements():
+            tables = full_scans(sql, self.connection)
+            if tables:
+                scans[sql] = tables
+        return scans
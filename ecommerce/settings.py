@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +44,7 @@ INSTALLED_APPS = [
     'users',
     'products',
     'orders',
+    'jobs',
 ]
 
 MIDDLEWARE = [
@@ -82,10 +84,70 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+        },
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Swap for a shared backend (Redis, Memcached) when running several processes.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ecommerce',
+    }
+}
+
+# Versioned catalogue response cache (products.cache)
+CATALOGUE_CACHE_ALIAS = 'default'
+CATALOGUE_CACHE_TIMEOUT = 60 * 15
+
+# How long an authenticated request may reuse the user a token resolved to
+# (users.authentication)
+USER_AUTH_CACHE_ALIAS = 'default'
+USER_AUTH_CACHE_TIMEOUT = 60
+
+# Threads per process making resized product image renditions after upload
+# (products.images); 0 makes them in the request instead
+PRODUCT_IMAGE_WORKERS = 2
+
+# Routes served by their async views (ecommerce.asyncviews) rather than the
+# DRF views; only worthwhile under an ASGI server. Available:
+# 'product-list', 'product-detail', 'category-list', 'category-detail',
+# 'product-reviews' and 'cart-detail'.
+ASYNC_VIEWS = []
+
+# Rebuild a process's in-memory suggest index after this long, to pick up
+# changes made by other processes (products.suggest)
+SUGGEST_INDEX_MAX_AGE = timedelta(minutes=10)
+
+
+# How long checkout holds stock for an unpaid order (orders.services)
+STOCK_RESERVATION_TTL = timedelta(minutes=15)
+
+# Background jobs (jobs.queue): runs a job gets before it is FAILED, the
+# delay before its first retry (doubling after each failure, up to the max),
+# and how long a worker holds a job before another may take it over; all in
+# seconds
+JOBS_MAX_ATTEMPTS = 5
+JOBS_RETRY_BACKOFF = 10
+JOBS_RETRY_BACKOFF_MAX = 60 * 60
+JOBS_LEASE = 5 * 60
+
+# Order emails are sent by the run_workers jobs; swap for an SMTP backend
+# in production
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+DEFAULT_FROM_EMAIL = 'shop@example.com'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -124,6 +186,14 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    # Product images and their renditions, stored once per distinct content
+    # under MEDIA_ROOT (products.storage)
+    'product_images': {'BACKEND': 'products.storage.ContentAddressedStorage'},
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -133,7 +203,7 @@ AUTH_USER_MODEL = 'users.User'
 
 REST_FRAMEWORK = {
         'DEFAULT_AUTHENTICATION_CLASSES': (
-            'rest_framework_simplejwt.authentication.JWTAuthentication',
+            'users.authentication.CachedJWTAuthentication',
             ),
         'DEFAULT_FILTER_BACKENDS': [
             'django_filters.rest_framework.DjangoFilterBackend',
@@ -141,3 +211,8 @@ REST_FRAMEWORK = {
             ]
         }
 
+SIMPLE_JWT = {
+        'TOKEN_OBTAIN_SERIALIZER': 'users.serializers.ClaimsTokenObtainPairSerializer',
+        'TOKEN_REFRESH_SERIALIZER': 'users.serializers.VersionedTokenRefreshSerializer',
+        }
+
@@ -0,0 +1,127 @@
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+
+from jobs.models import Job
+from jobs.queue import Metrics, Worker
+
+
+def run_threads(prefix, threads, options, stop, metrics):
+    def work(name):
+        try:
+            Worker(name, metrics, options['batch_size'], options['poll_interval'], stop).run(options['burst'])
+        finally:
+            connection.close()
+
+    pool = [threading.Thread(target=work, args=(f"{prefix}-{i}",)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    return pool
+
+
+def run_process(options, results):
+    """A process of --processes: --threads workers of its own, stopped by SIGTERM from the parent."""
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    # Ctrl-C reaches the whole process group; the parent passes it on as SIGTERM.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    metrics = Metrics()
+    for thread in run_threads(f"{socket.gethostname()}-{os.getpid()}", options['threads'], options, stop, metrics):
+        thread.join()
+    results.put(metrics.snapshot())
+
+
+class Command(BaseCommand):
+    help = "Run background jobs (jobs.queue) until stopped with SIGTERM or Ctrl-C."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help="Worker threads per process (default: 4).")
+        parser.add_argument(
+            '--processes', type=int, default=1,
+            help="Processes, each running --threads workers (default: 1, this one).",
+        )
+        parser.add_argument('--batch-size', type=int, default=10, help="Jobs a worker claims at a time (default: 10).")
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help="Seconds an idle worker waits before looking for due jobs again (default: 1).",
+        )
+        parser.add_argument('--burst', action='store_true', help="Stop once no job is due, instead of waiting for more.")
+        parser.add_argument(
+            '--report-every', type=float, default=60,
+            help="Seconds between throughput reports; 0 reports only on exit, as --processes does (default: 60).",
+        )
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *args: stop.set())
+
+        if options['processes'] > 1:
+            snapshots = self.run_processes(options, stop)
+        else:
+            metrics = Metrics()
+            pool = run_threads(f"{socket.gethostname()}-{os.getpid()}", options['threads'], options, stop, metrics)
+            self.wait(pool, options['report_every'], lambda: [metrics.snapshot()])
+            snapshots = [metrics.snapshot()]
+        self.report(snapshots)
+
+        stats = Job.objects.stats()
+        lag = stats.pop('lag')
+        self.stdout.write(self.style.SUCCESS(
+            "Queue: " + ", ".join(f"{count} {status.lower()}" for status, count in stats.items())
+            + ("" if lag is None else f"; the oldest due job has waited {lag:.1f}s")
+        ))
+
+    def wait(self, pool, report_every, snapshots):
+        """Join the threads or processes in `pool`, waking up for signals and, every `report_every` seconds, to report."""
+        next_report = time.monotonic() + report_every
+        for member in pool:
+            while member.is_alive():
+                member.join(1)
+                if report_every and time.monotonic() >= next_report:
+                    self.report(snapshots())
+                    next_report += report_every
+
+    def run_processes(self, options, stop):
+        # Each process opens its own connections; inherited ones would be shared.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        results = context.SimpleQueue()
+        pool = [context.Process(target=run_process, args=(options, results)) for _ in range(options['processes'])]
+        for process in pool:
+            process.start()
+
+        def forward_stop():
+            stop.wait()
+            for process in pool:
+                if process.is_alive():
+                    process.terminate()
+        threading.Thread(target=forward_stop, daemon=True).start()
+
+        # Processes report only when they exit; the parent has nothing to show meanwhile.
+        self.wait(pool, 0, None)
+        snapshots = []
+        # A process that was killed rather than stopped has nothing to report.
+        while not results.empty():
+            snapshots.append(results.get())
+        return snapshots or [Metrics().snapshot()]
+
+    def report(self, snapshots):
+        jobs = sum(snapshot['jobs'] for snapshot in snapshots)
+        seconds = max(snapshot['seconds'] for snapshot in snapshots)
+        outcomes = {
+            outcome: sum(snapshot[outcome] for snapshot in snapshots) for outcome in ('done', 'retried', 'failed', 'lost')
+        }
+        # Percentiles are per process; the worst process's is the honest one to show.
+        worst = {key: max(snapshot[key] for snapshot in snapshots) for key in ('run_p50_ms', 'run_p99_ms', 'lag_p99_s')}
+        self.stdout.write(
+            f"{jobs} jobs in {seconds:.1f}s ({jobs / seconds if seconds else 0:.1f}/s): "
+            + ", ".join(f"{count} {outcome}" for outcome, count in outcomes.items())
+            + f"; run p50 {worst['run_p50_ms']:.1f}ms, p99 {worst['run_p99_ms']:.1f}ms; lag p99 {worst['lag_p99_s']:.1f}s"
+        )
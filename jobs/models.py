@@ -0,0 +1,61 @@
+from django.db import models
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+
+class JobQuerySet(models.QuerySet):
+    def ready(self, now):
+        """
+        Jobs a worker may claim: queued ones that are due, and running ones
+        whose worker's lease ran out (it died or hung mid-job).
+        """
+        return self.filter(
+            Q(status='QUEUED', run_at__lte=now) | Q(status='RUNNING', locked_until__lt=now)
+        )
+
+    def stats(self):
+        """Jobs by status, and how long the oldest due job has waited (None when none has)."""
+        now = timezone.now()
+        counts = dict(self.order_by().values_list('status').annotate(count=Count('pk')))
+        oldest = self.filter(status='QUEUED', run_at__lte=now).aggregate(oldest=Min('run_at'))['oldest']
+        return {
+            **{status: counts.get(status, 0) for status, _ in Job.STATUS_CHOICES},
+            'lag': (now - oldest).total_seconds() if oldest is not None else None,
+        }
+
+
+class Job(models.Model):
+    STATUS_CHOICES = [
+            ('QUEUED', 'Queued'),
+            ('RUNNING', 'Running'),
+            ('DONE', 'Done'),
+            ('FAILED', 'Failed'),
+            ]
+
+    # The name the handler was registered under (jobs.queue.job).
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    # Enqueueing again under a key that exists returns the existing job.
+    key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='QUEUED')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField()
+    run_at = models.DateTimeField(default=timezone.now)
+    # The worker running it, and until when; past that, another may take over.
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    objects = JobQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # What JobQuerySet.ready() reads; finished jobs stay out of both.
+            models.Index(fields=['run_at', 'id'], condition=Q(status='QUEUED'), name='job_queued_idx'),
+            models.Index(fields=['locked_until'], condition=Q(status='RUNNING'), name='job_running_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
@@ -0,0 +1,204 @@
+"""
+A background job queue kept in the Job table.
+
+A side effect that need not hold up a request (an email, a call to another
+service) gets a handler, registered with @job in its app's jobs.py, and is
+enqueued instead of done. Enqueue it inside the transaction that calls for
+it: the job then exists if and only if that transaction commits.
+
+    @job('orders.send_order_email')
+    def send_order_email(order_id, status): ...
+
+    enqueue('orders.send_order_email', {'order_id': 1, 'status': 'PAID'}, key='order-email:1:PAID')
+
+Workers (Worker, run by `manage.py run_workers`) claim due jobs in batches.
+Where the database supports it (PostgreSQL), the claim is SELECT ... FOR
+UPDATE SKIP LOCKED, so workers never wait on one another's rows. Elsewhere
+(SQLite), each candidate is taken with a conditional UPDATE that only one
+worker can win. A claim is a lease of JOBS_LEASE seconds. When a worker dies
+holding jobs, they are claimed again once the lease runs out.
+
+Jobs run at least once: a worker that dies after a handler returns, or
+outlives its lease, leaves the job to run again. Handlers must therefore be
+safe to repeat, and make their database writes in one transaction.atomic()
+of their own. They are not run inside one: on SQLite (transaction_mode
+IMMEDIATE) that would hold the database's write lock for the whole job, so
+that workers waiting on a slow service would wait on one another too.
+A job that raises is retried after JOBS_RETRY_BACKOFF seconds. The delay
+doubles with each failure, with jitter, up to JOBS_RETRY_BACKOFF_MAX. After
+max_attempts runs the job is FAILED, keeping the last traceback.
+"""
+import logging
+import random
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+
+
+def job(name):
+    """Register the decorated function as the handler of `name` jobs; it is called with the payload as keywords."""
+    def register(handler):
+        _handlers[name] = handler
+        return handler
+    return register
+
+
+def enqueue(name, payload=None, key=None, delay=None, max_attempts=None):
+    """
+    Queue a `name` job; `payload` is a JSON-serializable dict. A job
+    already enqueued under `key` is returned instead, finished or not.
+    """
+    if name not in _handlers:
+        raise ValueError(f"No job handler is registered as {name!r}")
+    fields = {
+        'name': name,
+        'payload': payload or {},
+        'key': key,
+        'max_attempts': max_attempts or settings.JOBS_MAX_ATTEMPTS,
+        'run_at': timezone.now() + (delay or timedelta(0)),
+    }
+    if key is None:
+        return Job.objects.create(**fields)
+    try:
+        with transaction.atomic():
+            return Job.objects.create(**fields)
+    except IntegrityError:
+        return Job.objects.get(key=key)
+
+
+def claim(worker, limit):
+    """Lease up to `limit` due jobs to `worker` and return them, the longest due first."""
+    now = timezone.now()
+    lease = {'status': 'RUNNING', 'locked_by': worker, 'locked_until': now + timedelta(seconds=settings.JOBS_LEASE)}
+    ready = Job.objects.ready(now).order_by('run_at', 'id')
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(ready.select_for_update(skip_locked=True).values_list('pk', flat=True)[:limit])
+            Job.objects.filter(pk__in=ids).update(attempts=F('attempts') + 1, **lease)
+    else:
+        ids = []
+        # Workers polling together read the same candidates; the ones lost to
+        # another worker are no longer ready, so read on until the batch is full.
+        while len(ids) < limit and (candidates := list(ready.values_list('pk', 'attempts')[:limit - len(ids)])):
+            for pk, attempts in candidates:
+                # Whichever worker updates first moves the attempt on; the others match nothing.
+                if Job.objects.ready(now).filter(pk=pk, attempts=attempts).update(attempts=attempts + 1, **lease):
+                    ids.append(pk)
+    return list(Job.objects.filter(pk__in=ids).order_by('run_at', 'id'))
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying a job that has failed `attempts` times."""
+    delay = min(settings.JOBS_RETRY_BACKOFF * 2 ** (attempts - 1), settings.JOBS_RETRY_BACKOFF_MAX)
+    # Jobs that failed together (a service was down) come back spread out.
+    return delay * random.uniform(0.5, 1)
+
+
+def run_job(job, worker):
+    """
+    Run a job claimed by `worker` and record the outcome: 'DONE', 'RETRIED',
+    'FAILED', or 'LOST' when its lease ran out and another worker took it
+    over, in which case that worker's outcome is the one recorded.
+    """
+    mine = Job.objects.filter(pk=job.pk, locked_by=worker, attempts=job.attempts)
+    try:
+        _handlers[job.name](**job.payload)
+    except Exception:
+        logger.exception("Job %s (%s) failed on attempt %s of %s", job.pk, job.name, job.attempts, job.max_attempts)
+        if job.attempts >= job.max_attempts:
+            outcome, changes = 'FAILED', {'status': 'FAILED', 'finished_at': timezone.now()}
+        else:
+            retry_at = timezone.now() + timedelta(seconds=backoff(job.attempts))
+            outcome, changes = 'RETRIED', {'status': 'QUEUED', 'run_at': retry_at}
+        changed = mine.update(last_error=traceback.format_exc(), locked_until=None, **changes)
+    else:
+        outcome = 'DONE'
+        changed = mine.update(status='DONE', finished_at=timezone.now(), locked_until=None, last_error='')
+    if not changed:
+        logger.warning("Lost the lease on job %s before it finished", job.pk)
+        return 'LOST'
+    return outcome
+
+
+class Metrics:
+    """Throughput, outcomes, run times and queue lag of the jobs run by one process's workers."""
+    SAMPLES = 10000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.outcomes = Counter()
+        self.durations = deque(maxlen=self.SAMPLES)
+        self.lags = deque(maxlen=self.SAMPLES)
+
+    def record(self, outcome, duration, lag):
+        with self.lock:
+            self.outcomes[outcome] += 1
+            self.durations.append(duration)
+            self.lags.append(lag)
+
+    def snapshot(self):
+        with self.lock:
+            outcomes, durations, lags = Counter(self.outcomes), sorted(self.durations), sorted(self.lags)
+        elapsed = time.monotonic() - self.started
+        jobs = sum(outcomes.values())
+
+        def percentile(samples, pct):
+            return samples[min(len(samples) - 1, round(pct / 100 * (len(samples) - 1)))] if samples else 0
+
+        return {
+            'jobs': jobs,
+            'seconds': elapsed,
+            'per_second': jobs / elapsed if elapsed else 0,
+            **{outcome.lower(): outcomes[outcome] for outcome in ('DONE', 'RETRIED', 'FAILED', 'LOST')},
+            'run_p50_ms': percentile(durations, 50) * 1000,
+            'run_p99_ms': percentile(durations, 99) * 1000,
+            'lag_p50_s': percentile(lags, 50),
+            'lag_p99_s': percentile(lags, 99),
+        }
+
+
+class Worker:
+    def __init__(self, name, metrics, batch_size=10, poll_interval=1.0, stop=None):
+        self.name = name
+        self.metrics = metrics
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.stop = stop or threading.Event()
+
+    def run(self, burst=False):
+        """Claim and run jobs until stopped or, with `burst`, until none is due."""
+        while not self.stop.is_set():
+            jobs = claim(self.name, self.batch_size)
+            if not jobs:
+                if burst:
+                    return
+                self.stop.wait(self.poll_interval)
+                continue
+            claimed_at = timezone.now()
+            for index, job in enumerate(jobs):
+                if self.stop.is_set():
+                    self.release(jobs[index:])
+                    return
+                began = time.monotonic()
+                outcome = run_job(job, self.name)
+                self.metrics.record(outcome, time.monotonic() - began, (claimed_at - job.run_at).total_seconds())
+
+    def release(self, jobs):
+        """Give back claimed jobs that were not started, as if never claimed."""
+        Job.objects.filter(pk__in=[job.pk for job in jobs], locked_by=self.name, status='RUNNING').update(
+            status='QUEUED', attempts=F('attempts') - 1, locked_by='', locked_until=None
+        )
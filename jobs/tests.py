@@ -0,0 +1,171 @@
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .models import Job
+from .queue import Metrics, Worker, claim, enqueue, job, run_job
+
+calls = []
+stop_workers = threading.Event()
+
+
+@job('tests.record')
+def record(value):
+    calls.append(value)
+
+
+@job('tests.fail')
+def fail():
+    raise RuntimeError("downstream service unavailable")
+
+
+@job('tests.stop')
+def stop_worker():
+    stop_workers.set()
+
+
+@override_settings(JOBS_MAX_ATTEMPTS=3, JOBS_RETRY_BACKOFF=10, JOBS_RETRY_BACKOFF_MAX=3600, JOBS_LEASE=300)
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_key_enqueues_once(self):
+        first = enqueue('tests.record', {'value': 1}, key='once')
+        second = enqueue('tests.record', {'value': 2}, key='once')
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(Job.objects.get().payload, {'value': 1})
+        # Without a key every call is a job of its own.
+        enqueue('tests.record', {'value': 3})
+        enqueue('tests.record', {'value': 3})
+        self.assertEqual(Job.objects.count(), 3)
+
+    def test_unregistered_name_is_refused(self):
+        with self.assertRaises(ValueError):
+            enqueue('tests.missing')
+        self.assertFalse(Job.objects.exists())
+
+    def test_claim_runs_due_jobs_in_order(self):
+        later = enqueue('tests.record', {'value': 'later'}, delay=timedelta(minutes=5))
+        first, second = enqueue('tests.record', {'value': 'a'}), enqueue('tests.record', {'value': 'b'})
+        claimed = claim('worker', 10)
+        self.assertEqual([job.pk for job in claimed], [first.pk, second.pk])
+        self.assertEqual(claim('other', 10), [])
+        self.assertEqual([run_job(job, 'worker') for job in claimed], ['DONE', 'DONE'])
+        self.assertEqual(calls, ['a', 'b'])
+        later.refresh_from_db()
+        self.assertEqual((later.status, later.attempts), ('QUEUED', 0))
+
+    def test_failures_back_off_then_fail(self):
+        queued = enqueue('tests.fail')
+        delays = []
+        for attempt in range(1, 4):
+            Job.objects.filter(pk=queued.pk).update(run_at=timezone.now())
+            [claimed] = claim('worker', 1)
+            self.assertEqual(claimed.attempts, attempt)
+            before = timezone.now()
+            with self.assertLogs('jobs.queue', 'ERROR'):
+                outcome = run_job(claimed, 'worker')
+            claimed.refresh_from_db()
+            if attempt < 3:
+                self.assertEqual((outcome, claimed.status), ('RETRIED', 'QUEUED'))
+                delays.append((claimed.run_at - before).total_seconds())
+            else:
+                self.assertEqual((outcome, claimed.status), ('FAILED', 'FAILED'))
+                self.assertIsNotNone(claimed.finished_at)
+            self.assertIn("downstream service unavailable", claimed.last_error)
+        # 10s then 20s, each jittered down by up to half.
+        self.assertTrue(5 <= delays[0] <= 10.5, delays)
+        self.assertTrue(10 <= delays[1] <= 20.5, delays)
+        self.assertEqual(claim('worker', 1), [])
+
+    def test_expired_lease_is_taken_over(self):
+        queued = enqueue('tests.record', {'value': 'x'})
+        [stale] = claim('dead', 1)
+        self.assertEqual(claim('live', 1), [])
+        Job.objects.filter(pk=queued.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        [current] = claim('live', 1)
+        self.assertEqual(current.attempts, 2)
+        # The first worker comes back to life: it runs the job, but the
+        # outcome recorded is the second worker's.
+        with self.assertLogs('jobs.queue', 'WARNING'):
+            self.assertEqual(run_job(stale, 'dead'), 'LOST')
+        self.assertEqual(Job.objects.get().status, 'RUNNING')
+        self.assertEqual(run_job(current, 'live'), 'DONE')
+        self.assertEqual(calls, ['x', 'x'])
+        self.assertEqual(Job.objects.values_list('status', 'locked_by').get(), ('DONE', 'live'))
+
+    def test_stopped_worker_releases_what_it_did_not_start(self):
+        for value in range(3):
+            enqueue('tests.record', {'value': value})
+        stop_workers.clear()
+        enqueue('tests.stop', delay=timedelta(minutes=-1))
+        metrics = Metrics()
+        Worker('worker', metrics, batch_size=10, stop=stop_workers).run()
+        self.assertEqual(metrics.snapshot()['done'], 1)
+        self.assertEqual(calls, [])
+        self.assertEqual(
+            sorted(Job.objects.filter(name='tests.record').values_list('status', 'attempts', 'locked_by')),
+            [('QUEUED', 0, '')] * 3,
+        )
+
+    def test_stats(self):
+        enqueue('tests.record', {'value': 1})
+        enqueue('tests.record', {'value': 2}, delay=timedelta(hours=1))
+        Job.objects.filter(run_at__lte=timezone.now()).update(run_at=timezone.now() - timedelta(seconds=30))
+        stats = Job.objects.stats()
+        self.assertEqual((stats['QUEUED'], stats['RUNNING'], stats['DONE'], stats['FAILED']), (2, 0, 0, 0))
+        self.assertGreaterEqual(stats['lag'], 30)
+
+    @skipUnlessDBFeature('has_select_for_update_skip_locked')
+    def test_claim_skips_locked_rows(self):
+        enqueue('tests.record', {'value': 1})
+        with CaptureQueriesContext(connection) as ctx:
+            claim('worker', 10)
+        self.assertTrue(any('SKIP LOCKED' in query['sql'] for query in ctx.captured_queries))
+
+
+class ConcurrentWorkerTests(TransactionTestCase):
+    JOBS = 200
+    WORKERS = 6
+
+    def setUp(self):
+        calls.clear()
+
+    def test_each_job_runs_once_across_workers(self):
+        for value in range(self.JOBS):
+            enqueue('tests.record', {'value': value})
+        metrics = Metrics()
+
+        def work(name):
+            try:
+                Worker(name, metrics, batch_size=7).run(burst=True)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=work, args=(f"worker-{i}",)) for i in range(self.WORKERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(calls), list(range(self.JOBS)))
+        self.assertEqual(metrics.snapshot()['done'], self.JOBS)
+        self.assertEqual(Job.objects.filter(status='DONE', attempts=1).count(), self.JOBS)
+
+    def test_run_workers_command(self):
+        for value in range(20):
+            enqueue('tests.record', {'value': value})
+        out = StringIO()
+        # Left to the test runner, not the command's shutdown handlers.
+        with mock.patch('signal.signal'):
+            call_command('run_workers', '--threads', '3', '--burst', stdout=out)
+        self.assertEqual(sorted(calls), list(range(20)))
+        self.assertIn("20 jobs in", out.getvalue())
+        self.assertIn("Queue: 0 queued, 0 running, 20 done, 0 failed", out.getvalue())
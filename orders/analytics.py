@@ -0,0 +1,175 @@
+"""
+Sales analytics for admins, served from the SalesRollup table.
+
+SalesRollup holds units and revenue by the day orders were paid, at a day
+and a month grain, per product and for all products together. record_sales()
+adds an order's items to its day and month, or takes them off again, in the
+transaction that moves the order into or out of Order.SPENT_STATUSES;
+rebuild_sales_rollup() recomputes whole months from OrderItem.
+
+A report over a date range reads month rows for the calendar months inside
+it and day rows only for the days either side, so a year costs about twelve
+rows per product (or twelve rows in all, for the totals) rather than one
+per product per day, and nothing at all per order.
+"""
+import datetime
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import DateField, F, Q, Sum
+from django.db.models.functions import Trunc, TruncDate
+from django.utils import timezone
+
+from .models import Order, OrderItem, SalesRollup
+
+PERIODS = ('day', 'week', 'month')
+REPORT_ORDERINGS = ('revenue', 'quantity')
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def _month_start(day):
+    return day.replace(day=1)
+
+
+def _next_month(day):
+    return (day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+def record_sales(order, sign=1):
+    """Add (sign=1) or take off (sign=-1) the order's items on the day and month it was paid."""
+    day = timezone.localdate(order.paid_at)
+    lines = list(
+        OrderItem.objects.filter(order_id=order.pk).order_by().values('product_id').annotate(
+            total_quantity=Sum('quantity'), total_revenue=Sum(F('quantity') * F('price'))
+        )
+    )
+    if not lines:
+        return
+    lines.append({
+        'product_id': None,
+        'total_quantity': sum(line['total_quantity'] for line in lines),
+        'total_revenue': sum(line['total_revenue'] for line in lines),
+    })
+    grains = (('day', day), ('month', _month_start(day)))
+    SalesRollup.objects.bulk_create(
+        [SalesRollup(period=period, date=date, product_id=line['product_id'])
+         for period, date in grains for line in lines],
+        ignore_conflicts=True,
+    )
+    for period, date in grains:
+        for line in lines:
+            SalesRollup.objects.filter(period=period, date=date, product_id=line['product_id']).update(
+                quantity=F('quantity') + sign * line['total_quantity'],
+                revenue=F('revenue') + sign * line['total_revenue'],
+            )
+    if sign < 0:
+        SalesRollup.objects.filter(
+            Q(period='day', date=day) | Q(period='month', date=_month_start(day)),
+            Q(product_id__in=[line['product_id'] for line in lines[:-1]]) | Q(product__isnull=True),
+            quantity=0, revenue=0,
+        ).delete()
+
+
+def rebuild_sales_rollup(start=None, end=None, batch_size=5000):
+    """
+    Recompute the rollup from OrderItem for the months from `start` to `end`
+    (both optional and widened to whole months, so that their month rows
+    stay the sum of their days) in one transaction. Returns the number of
+    rows written.
+    """
+    rollups = SalesRollup.objects.all()
+    items = OrderItem.objects.filter(order__status__in=Order.SPENT_STATUSES, order__paid_at__isnull=False)
+    if start is not None:
+        start = _month_start(start)
+        rollups = rollups.filter(date__gte=start)
+        items = items.filter(order__paid_at__gte=_day_start(start))
+    if end is not None:
+        end = _next_month(end)
+        rollups = rollups.filter(date__lt=end)
+        items = items.filter(order__paid_at__lt=_day_start(end))
+    rows = items.annotate(date=TruncDate('order__paid_at')).order_by().values('date', 'product_id').annotate(
+        total_quantity=Sum('quantity'), total_revenue=Sum(F('quantity') * F('price'))
+    )
+
+    # The day rows per product are written as they stream in; the coarser
+    # grains are summed from them on the way and written at the end.
+    totals = defaultdict(lambda: [0, 0])
+    written = 0
+    with transaction.atomic():
+        rollups.delete()
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            date, product_id = row['date'], row['product_id']
+            batch.append(SalesRollup(
+                period='day', date=date, product_id=product_id,
+                quantity=row['total_quantity'], revenue=row['total_revenue'],
+            ))
+            for key in (('day', date, None), ('month', _month_start(date), product_id),
+                        ('month', _month_start(date), None)):
+                totals[key][0] += row['total_quantity']
+                totals[key][1] += row['total_revenue']
+            if len(batch) == batch_size:
+                written += len(SalesRollup.objects.bulk_create(batch))
+                batch = []
+        batch.extend(
+            SalesRollup(period=period, date=date, product_id=product_id, quantity=quantity, revenue=revenue)
+            for (period, date, product_id), (quantity, revenue) in totals.items()
+        )
+        written += len(SalesRollup.objects.bulk_create(batch, batch_size=batch_size))
+    return written
+
+
+def _sales(start, end, products=True):
+    """
+    The rows that add up to exactly the days from `start` to `end`: month
+    rows for the calendar months inside the range, day rows for the rest.
+    `products` picks the per-product rows, or else the all-product totals.
+    """
+    first_month = start if start.day == 1 else _next_month(start)
+    after_months = _month_start(end + datetime.timedelta(days=1))
+    if first_month < after_months:
+        covering = (
+            Q(period='month', date__gte=first_month, date__lt=after_months)
+            | Q(period='day', date__gte=start, date__lt=first_month)
+            | Q(period='day', date__gte=after_months, date__lte=end)
+        )
+    else:
+        covering = Q(period='day', date__range=(start, end))
+    return SalesRollup.objects.filter(covering, product__isnull=not products).order_by()
+
+
+def revenue_by_period(start, end, period='day'):
+    """Units and revenue per day, week (starting Monday) or month, oldest first."""
+    if period == 'month':
+        sales = _sales(start, end, products=False)
+    else:
+        sales = SalesRollup.objects.filter(period='day', date__range=(start, end), product__isnull=True)
+    return list(
+        sales
+        .annotate(period_start=Trunc('date', period, output_field=DateField()))
+        .values('period_start')
+        .annotate(total_quantity=Sum('quantity'), total_revenue=Sum('revenue'))
+        .order_by('period_start')
+    )
+
+
+def top_products(start, end, limit=10, order_by='revenue'):
+    return list(
+        _sales(start, end)
+        .values('product_id', 'product__name')
+        .annotate(total_quantity=Sum('quantity'), total_revenue=Sum('revenue'))
+        .order_by(f"-total_{order_by}", 'product_id')[:limit]
+    )
+
+
+def revenue_by_category(start, end, order_by='revenue'):
+    """Units and revenue per product category; uncategorised products come under None."""
+    return list(
+        _sales(start, end)
+        .values('product__category_id', 'product__category__name')
+        .annotate(total_quantity=Sum('quantity'), total_revenue=Sum('revenue'))
+        .order_by(f"-total_{order_by}", 'product__category_id')
+    )
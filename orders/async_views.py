@@ -0,0 +1,26 @@
+"""
+Async variant of the cart read endpoint; see ecommerce/asyncviews.py.
+"""
+from rest_framework.response import Response
+
+from ecommerce.asyncviews import AsyncReadView
+from ecommerce.fields import selected_fields
+from .models import Cart
+from .serializers import CartSerializer
+from .views import CartView, with_items
+
+
+class AsyncCartView(AsyncReadView):
+    view_class = CartView
+
+    async def read(self, view, request):
+        fields = selected_fields(request, CartSerializer.Meta.fields)
+        carts = view.select_for_fields(Cart.objects.filter(user=request.user))
+        if 'total' in fields and 'items' not in fields:
+            # Cart.total_price() would otherwise sum the lines in a query of its own.
+            carts = with_items(carts, request)
+        cart = await carts.afirst()
+        if cart is None:
+            await Cart.objects.aget_or_create(user=request.user)
+            cart = await carts.afirst()
+        return Response(view.get_serializer(cart).data)
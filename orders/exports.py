@@ -0,0 +1,20 @@
+from ecommerce.export import Export
+from .models import Order
+
+# One row per order item, joined to its order. Orders without items still
+# get a row, with empty item columns.
+ORDER_EXPORT = Export('orders', Order.objects.order_by('id', 'items__id'), {
+    'order_id': 'id',
+    'user_id': 'user_id',
+    'status': 'status',
+    'total': 'total',
+    'payment_method': 'payment_method',
+    'transaction_id': 'transaction_id',
+    'shipping_address': 'shipping_address',
+    'created_at': 'created_at',
+    'item_id': 'items__id',
+    'product_id': 'items__product_id',
+    'product_name': 'items__product__name',
+    'quantity': 'items__quantity',
+    'price': 'items__price',
+})
@@ -0,0 +1,37 @@
+"""
+Order side effects run by the job workers (jobs.queue) rather than in the
+request that placed or updated the order.
+"""
+from django.core.mail import send_mail
+
+from jobs.queue import enqueue, job
+from .models import Order
+
+SUBJECTS = {
+    'PENDING': "We have your order #{id}",
+    'PAID': "Payment received for order #{id}",
+    'SHIPPED': "Order #{id} is on its way",
+    'DELIVERED': "Order #{id} was delivered",
+    'CANCELLED': "Order #{id} was cancelled",
+}
+
+
+def notify_order(order, status):
+    """Email the order's owner that it is now `status`, once, when the current transaction commits."""
+    return enqueue(
+        'orders.send_order_email', {'order_id': order.pk, 'status': status}, key=f"order-email:{order.pk}:{status}"
+    )
+
+
+@job('orders.send_order_email')
+def send_order_email(order_id, status):
+    order = Order.objects.select_related('user').filter(pk=order_id).first()
+    # Deleted since, or an account without an address: nothing to send.
+    if order is None or not order.user.email:
+        return
+    send_mail(
+        SUBJECTS[status].format(id=order.pk),
+        f"Hello {order.user.username},\n\nOrder #{order.pk} ({order.total}) is now {order.get_status_display().lower()}.",
+        None,
+        [order.user.email],
+    )
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from orders.exports import ORDER_EXPORT
+
+
+class Command(BaseCommand):
+    help = "Stream every order, one row per order item, as CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['csv', 'ndjson'], default='csv')
+        parser.add_argument('--output', help="File to write to; standard output by default.")
+
+    def handle(self, *args, **options):
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as file:
+                ORDER_EXPORT.write(file, options['format'])
+        else:
+            ORDER_EXPORT.write(self.stdout, options['format'])
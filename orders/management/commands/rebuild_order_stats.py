@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from orders.services import rebuild_order_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute every user's order summary (UserOrderStats) from the orders table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--user', type=int, action='append', dest='users', help="Only this user id (repeatable).")
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_order_stats(options['users'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt order stats for {rebuilt} users with orders."))
@@ -0,0 +1,18 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from orders.analytics import rebuild_sales_rollup
+
+
+class Command(BaseCommand):
+    help = "Recompute the day and month sales rollup behind the analytics endpoints from the order items."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=datetime.date.fromisoformat, help="First day (YYYY-MM-DD); default: all.")
+        parser.add_argument('--end', type=datetime.date.fromisoformat, help="Last day (YYYY-MM-DD); default: all.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        written = rebuild_sales_rollup(options['start'], options['end'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} sales rollup rows."))
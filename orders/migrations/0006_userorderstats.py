@@ -0,0 +1,53 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:58
+
+import django.db.models.deletion
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_order_stats(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Order = apps.get_model('orders', 'Order')
+    UserOrderStats = apps.get_model('orders', 'UserOrderStats')
+    statuses = ['PENDING', 'PAID', 'SHIPPED', 'DELIVERED', 'CANCELLED']
+    user_ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(user_ids), 1000):
+        batch = user_ids[start:start + 1000]
+        aggregates = Order.objects.filter(user_id__in=batch).values('user_id').annotate(
+            **{status.lower(): Count('pk', filter=Q(status=status)) for status in statuses},
+            lifetime_spend=Coalesce(
+                Sum('total', filter=Q(status__in=statuses[1:4])), Value(Decimal(0)), output_field=DecimalField()
+            ),
+            last_order_at=Max('created_at'),
+        ).order_by()
+        rows = {row.pop('user_id'): row for row in aggregates}
+        UserOrderStats.objects.bulk_create(UserOrderStats(user_id=pk, **rows.get(pk, {})) for pk in batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_cartitem_unique_cart_product'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserOrderStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='order_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('pending', models.PositiveIntegerField(default=0)),
+                ('paid', models.PositiveIntegerField(default=0)),
+                ('shipped', models.PositiveIntegerField(default=0)),
+                ('delivered', models.PositiveIntegerField(default=0)),
+                ('cancelled', models.PositiveIntegerField(default=0)),
+                ('lifetime_spend', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('last_order_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_order_stats, migrations.RunPython.noop),
+    ]
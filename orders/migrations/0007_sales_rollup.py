@@ -0,0 +1,68 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:03
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+
+SPENT_STATUSES = ['PAID', 'SHIPPED', 'DELIVERED']
+
+
+def backfill_sales(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    SalesRollup = apps.get_model('orders', 'SalesRollup')
+    # When existing orders were paid was never stored; their creation is the closest.
+    Order.objects.filter(status__in=SPENT_STATUSES).update(paid_at=F('created_at'))
+    rows = OrderItem.objects.filter(order__status__in=SPENT_STATUSES).annotate(
+        date=TruncDate('order__paid_at')
+    ).order_by().values('date', 'product_id').annotate(
+        total_quantity=Sum('quantity'), total_revenue=Sum(F('quantity') * F('price'))
+    )
+    sales = defaultdict(lambda: [0, 0])
+    for row in rows.iterator():
+        month = row['date'].replace(day=1)
+        for key in (('day', row['date'], row['product_id']), ('day', row['date'], None),
+                    ('month', month, row['product_id']), ('month', month, None)):
+            sales[key][0] += row['total_quantity']
+            sales[key][1] += row['total_revenue']
+    SalesRollup.objects.bulk_create(
+        (
+            SalesRollup(period=period, date=date, product_id=product_id, quantity=quantity, revenue=revenue)
+            for (period, date, product_id), (quantity, revenue) in sales.items()
+        ),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_userorderstats'),
+        ('products', '0009_product_sku'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='paid_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('month', 'Month')], max_length=5)),
+                ('date', models.DateField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sales', to='products.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('period', 'date', 'product'), name='unique_product_sales'), models.UniqueConstraint(condition=models.Q(('product__isnull', True)), fields=('period', 'date'), name='unique_total_sales')],
+            },
+        ),
+        migrations.RunPython(backfill_sales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:15
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def keep_one_default_address(apps, schema_editor):
+    # Checkout took the lowest-pk default (`.first()`), so that one stays.
+    Address = apps.get_model('orders', 'Address')
+    duplicates = (
+        Address.objects.filter(is_default=True).values('user')
+        .annotate(defaults=Count('id'), keep=Min('id'))
+        .filter(defaults__gt=1)
+    )
+    for row in duplicates:
+        Address.objects.filter(user=row['user'], is_default=True).exclude(pk=row['keep']).update(is_default=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_sales_rollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(keep_one_default_address, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='address',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_default', True)), fields=('user',), name='unique_default_address'),
+        ),
+    ]
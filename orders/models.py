@@ -1,17 +1,37 @@
 from django.db import models
+from django.db.models import F, Sum
 from django.conf import settings
 from products.models import Product
 
 User = settings.AUTH_USER_MODEL
 
+class CartQuerySet(models.QuerySet):
+    def with_items(self, expand=False):
+        """
+        Prefetch everything CartSerializer renders for each line: the
+        product summary, or the full product when `expand` is set.
+        """
+        items = CartItem.objects.select_related('product').prefetch_related('product__images')
+        if expand:
+            items = items.select_related('product__category').prefetch_related('product__category__subcategories')
+        return self.prefetch_related(models.Prefetch('items', queryset=items))
+
+
 class Cart(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="cart")
 
+    objects = CartQuerySet.as_manager()
+
     def __str__(self):
         return f"Cart of {self.user.username}"
 
     def total_price(self):
-        return sum(item.subtotal() for item in self.items.all())
+        # Reuse the lines when they were prefetched (Cart.objects.with_items),
+        # otherwise let the database do the sum.
+        if 'items' in getattr(self, '_prefetched_objects_cache', {}):
+            return sum(item.subtotal() for item in self.items.all())
+        total = self.items.aggregate(total=Sum(F('quantity') * F('product__price')))['total']
+        return total or 0
 
 
 class CartItem(models.Model):
@@ -19,6 +39,9 @@ class CartItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        unique_together = ('cart', 'product') # repeated adds merge into one line
+
     def __str__(self):
         return f"{self.quantity} X {self.product.name}"
 
@@ -27,6 +50,18 @@ class CartItem(models.Model):
 
 # --------------- Order Models ---------
 
+class OrderQuerySet(models.QuerySet):
+    def with_items(self, expand=False):
+        """
+        Prefetch everything OrderSerializer renders for each item: the
+        product summary, or the full product when `expand` is set.
+        """
+        items = OrderItem.objects.select_related('product').prefetch_related('product__images')
+        if expand:
+            items = items.select_related('product__category').prefetch_related('product__category__subcategories')
+        return self.prefetch_related(models.Prefetch('items', queryset=items))
+
+
 class Order(models.Model):
     STATUS_CHOICES = [
             ('PENDING', 'Pending'),
@@ -35,14 +70,26 @@ class Order(models.Model):
             ('DELIVERED', 'Delivered'),
             ('CANCELLED', 'Cancelled'),
             ]
+    # Statuses whose total has been taken: they count as spend and sales.
+    SPENT_STATUSES = ('PAID', 'SHIPPED', 'DELIVERED')
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="orders")
     created_at = models.DateTimeField(auto_now_add=True)
+    paid_at = models.DateTimeField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     payment_method = models.CharField(max_length=50, blank=True, null=True)
     transaction_id = models.CharField(max_length=100, blank=True, null=True)
     shipping_address = models.TextField(null=True, blank=True)
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='order_created_idx'),
+        ]
+
     def __str__(self):
         return f"Order {self.id} by {self.user.username}"
 
@@ -58,6 +105,70 @@ class OrderItem(models.Model):
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
 
+class SalesRollup(models.Model):
+    """
+    Units sold and revenue, by the day orders were paid, at two grains: a
+    day or a calendar month (dated by its first day), per product and, with
+    no product, for all products together. orders/analytics.py keeps every
+    grain in step as orders are paid, cancelled or deleted, and rebuilds
+    them from the order items.
+    """
+    PERIOD_CHOICES = [
+            ('day', 'Day'),
+            ('month', 'Month'),
+            ]
+
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, null=True, blank=True, related_name="sales")
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'date', 'product'], name='unique_product_sales'),
+            models.UniqueConstraint(
+                fields=['period', 'date'], condition=models.Q(product__isnull=True), name='unique_total_sales'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id or 'all'} in {self.period} {self.date}"
+
+class UserOrderStats(models.Model):
+    """
+    One user's order counts by status, lifetime spend (the totals of paid,
+    shipped and delivered orders) and last order time. The order services
+    update it in the same transaction as the order; rebuild_order_stats
+    recomputes it from the orders table.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="order_stats")
+    pending = models.PositiveIntegerField(default=0)
+    paid = models.PositiveIntegerField(default=0)
+    shipped = models.PositiveIntegerField(default=0)
+    delivered = models.PositiveIntegerField(default=0)
+    cancelled = models.PositiveIntegerField(default=0)
+    lifetime_spend = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    last_order_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Order stats for user {self.user_id}"
+
+class StockReservation(models.Model):
+    """
+    A time-limited hold on stock for one line of an unpaid order. The held
+    quantity is mirrored in Product.reserved so availability never has to
+    scan this table.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="reservations")
+    order_item = models.OneToOneField(OrderItem, on_delete=models.CASCADE, related_name="reservation")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="reservations")
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} held until {self.expires_at}"
+
 class Address(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="addresses")
     full_name = models.CharField(max_length=100)
@@ -69,6 +180,15 @@ class Address(models.Model):
     country = models.CharField(max_length=100)
     is_default = models.BooleanField(default=False)
 
+    class Meta:
+        constraints = [
+            # At most one default per user; also the index behind the
+            # default-address lookup at checkout.
+            models.UniqueConstraint(
+                fields=['user'], condition=models.Q(is_default=True), name='unique_default_address'
+            ),
+        ]
+
     def __str__(self):
         return f"{self.full_name}, {self.street}, {self.city}"
 
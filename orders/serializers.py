@@ -1,9 +1,15 @@
+from datetime import timedelta
+from functools import partial
+
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Cart, CartItem, Order, OrderItem, Address
-from products.serializers import ProductSerializer
+from ecommerce.fields import FieldSelectionMixin
+from .analytics import PERIODS, REPORT_ORDERINGS
+from .models import Cart, CartItem, Order, OrderItem, Address, UserOrderStats
+from products.serializers import ProductSerializer, ProductSummarySerializer
 
-class CartItemSerializer(serializers.ModelSerializer):
-    product = ProductSerializer(read_only=True)
+class CartItemSerializer(FieldSelectionMixin, serializers.ModelSerializer):
+    product = ProductSummarySerializer(read_only=True)
     product_id = serializers.PrimaryKeyRelatedField(
             queryset=CartItem._meta.get_field('product').remote_field.model.objects.all(),
             source='product',
@@ -14,7 +20,19 @@ class CartItemSerializer(serializers.ModelSerializer):
         model = CartItem
         fields = ['id', 'product', 'product_id', 'quantity']
 
-class CartSerializer(serializers.ModelSerializer):
+    expandable_fields = {'product': partial(ProductSerializer, read_only=True)}
+
+    def validate(self, attrs):
+        if self.instance is None and attrs.get('quantity', 1) < 1:
+            raise serializers.ValidationError("Quantity to add must be at least 1.")
+        product = attrs.get('product')
+        if self.instance is not None and product is not None and product.pk != self.instance.product_id:
+            # One line per product (CartItem.unique_together).
+            if CartItem.objects.filter(cart_id=self.instance.cart_id, product=product).exists():
+                raise serializers.ValidationError("That product is already in the cart; change that line instead.")
+        return attrs
+
+class CartSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     items = CartItemSerializer(many=True, read_only=True)
     total = serializers.SerializerMethodField()
 
@@ -26,17 +44,29 @@ class CartSerializer(serializers.ModelSerializer):
     def get_total(self, obj):
         return obj.total_price()
 
+class CartOperationSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0, default=1)
+    op = serializers.ChoiceField(choices=['add', 'set', 'remove'], default='add')
+
+    def validate(self, attrs):
+        if attrs['op'] == 'add' and attrs['quantity'] < 1:
+            raise serializers.ValidationError("Quantity to add must be at least 1.")
+        return attrs
+
 class PaymentSerializer(serializers.Serializer):
     payment_method = serializers.CharField(max_length=50)
 
-class OrderItemSerializer(serializers.ModelSerializer):
-    product = ProductSerializer(read_only=True)
+class OrderItemSerializer(FieldSelectionMixin, serializers.ModelSerializer):
+    product = ProductSummarySerializer(read_only=True)
 
     class Meta:
         model = OrderItem
         fields = ['id', 'product', 'quantity', 'price']
 
-class OrderSerializer(serializers.ModelSerializer):
+    expandable_fields = {'product': partial(ProductSerializer, read_only=True)}
+
+class OrderSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
 
     class Meta:
@@ -44,8 +74,56 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'status', 'total', 'created_at', 'items']
         read_only_fields = ['user', 'status', 'total']
 
-class AddressSerializer(serializers.ModelSerializer):
+class OrderSummarySerializer(FieldSelectionMixin, serializers.ModelSerializer):
+    order_count = serializers.SerializerMethodField()
+    orders_by_status = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UserOrderStats
+        fields = ['order_count', 'orders_by_status', 'lifetime_spend', 'last_order_at']
+
+    def get_orders_by_status(self, stats):
+        return {status: getattr(stats, status.lower()) for status, _ in Order.STATUS_CHOICES}
+
+    def get_order_count(self, stats):
+        return sum(self.get_orders_by_status(stats).values())
+
+class AddressSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     class Meta:
         model = Address
         fields = "__all__"
-        read_only_fields = ("user",)
\ No newline at end of file
+        read_only_fields = ("user",)
+
+class SalesQuerySerializer(serializers.Serializer):
+    """Query parameters of the sales reports; the range defaults to the last 30 days."""
+    MAX_DAYS = 366 * 3
+
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    period = serializers.ChoiceField(choices=PERIODS, default='day')
+    order_by = serializers.ChoiceField(choices=REPORT_ORDERINGS, default='revenue')
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+    def validate(self, attrs):
+        end = attrs.setdefault('end', timezone.localdate())
+        start = attrs.setdefault('start', end - timedelta(days=29))
+        if start > end:
+            raise serializers.ValidationError("start must not be after end.")
+        if (end - start).days >= self.MAX_DAYS:
+            raise serializers.ValidationError(f"Reports cover at most {self.MAX_DAYS} days.")
+        return attrs
+
+class SalesFiguresSerializer(serializers.Serializer):
+    quantity = serializers.IntegerField(source='total_quantity')
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2, source='total_revenue')
+
+class PeriodSalesSerializer(SalesFiguresSerializer):
+    period = serializers.DateField(source='period_start')
+
+class ProductSalesSerializer(SalesFiguresSerializer):
+    product_id = serializers.IntegerField()
+    name = serializers.CharField(source='product__name')
+
+class CategorySalesSerializer(SalesFiguresSerializer):
+    category_id = serializers.IntegerField(source='product__category_id', allow_null=True)
+    name = serializers.CharField(source='product__category__name', allow_null=True)
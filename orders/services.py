@@ -0,0 +1,379 @@
+"""
+Order workflows that have to stay consistent under concurrent requests.
+"""
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, Exists, F, IntegerField, Max, OuterRef, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from products.cache import bump_product
+from products.models import Product
+from .analytics import record_sales
+from .jobs import notify_order
+from .models import Cart, CartItem, Order, OrderItem, StockReservation, UserOrderStats
+
+# UserOrderStats counter for each order status.
+STATUS_FIELDS = {status: status.lower() for status, _ in Order.STATUS_CHOICES}
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_id):
+        super().__init__(product_id)
+        self.product_id = product_id
+
+
+class OrderNotPending(Exception):
+    pass
+
+
+class EmptyCart(Exception):
+    pass
+
+
+class UnknownProduct(Exception):
+    def __init__(self, product_id):
+        super().__init__(product_id)
+        self.product_id = product_id
+
+
+class _Uncovered(Exception):
+    pass
+
+
+def _adjust_stock(changes, check=True):
+    """
+    Apply {product_id: (taken, released)} to the stock counters, all or
+    nothing: stock drops by `taken` and reserved by `released` (negative
+    to place a hold).
+
+    Everything is one UPDATE ... SET stock = stock - CASE id ... END that
+    only matches rows where stock - taken >= reserved - released, so
+    concurrent requests can neither oversell nor lose an update, and the
+    cost does not grow with the number of products. Raises
+    InsufficientStock, rolling back every line, when one cannot be
+    covered; `check=False` skips the condition for releases.
+    """
+    if not changes:
+        return
+
+    def per_product(index):
+        return Case(
+            *[When(pk=pk, then=Value(change[index])) for pk, change in changes.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+
+    taken, released = per_product(0), per_product(1)
+    products = Product.objects.filter(pk__in=list(changes))
+    covered = Q(stock__gte=F('reserved') - released + taken)
+    try:
+        with transaction.atomic():
+            updated = (products.filter(covered) if check else products).update(
+                stock=F('stock') - taken, reserved=F('reserved') - released
+            )
+            if updated != len(changes):
+                raise _Uncovered
+    except _Uncovered:
+        # None are uncovered now when a product was deleted or a concurrent
+        # change covered it since; the error still names one of the lines.
+        uncovered = products.exclude(covered).values_list('pk', flat=True).first()
+        raise InsufficientStock(uncovered or next(iter(changes)))
+
+    for product_id, (taken_quantity, _) in changes.items():
+        if taken_quantity:
+            bump_product(product_id)
+
+
+def reserve_stock(order_items):
+    """
+    Hold stock for freshly created order items until the reservation TTL
+    runs out. Raises InsufficientStock if any line is not available.
+    """
+    holds = defaultdict(int)
+    for item in order_items:
+        holds[item.product_id] += item.quantity
+    expires_at = timezone.now() + settings.STOCK_RESERVATION_TTL
+
+    with transaction.atomic():
+        _adjust_stock({product_id: (0, -quantity) for product_id, quantity in holds.items()})
+        StockReservation.objects.bulk_create(
+            StockReservation(
+                order_id=item.order_id,
+                order_item=item,
+                product_id=item.product_id,
+                quantity=item.quantity,
+                expires_at=expires_at,
+            )
+            for item in order_items
+        )
+
+
+def release_reservations(reservations):
+    """Give the stock held by `reservations` back and delete them."""
+    with transaction.atomic():
+        held = list(reservations.select_for_update().values_list('id', 'product_id', 'quantity'))
+        released = defaultdict(int)
+        for _, product_id, quantity in held:
+            released[product_id] += quantity
+        _adjust_stock({product_id: (0, quantity) for product_id, quantity in released.items()}, check=False)
+        StockReservation.objects.filter(pk__in=[pk for pk, _, _ in held]).delete()
+    return len(held)
+
+
+def release_expired_reservations(batch_size=1000):
+    """Release every hold whose TTL has run out, `batch_size` at a time."""
+    now = timezone.now()
+    released = 0
+    while True:
+        batch = StockReservation.objects.filter(expires_at__lte=now).order_by('pk')[:batch_size]
+        ids = list(batch.values_list('pk', flat=True))
+        if not ids:
+            return released
+        released += release_reservations(StockReservation.objects.filter(pk__in=ids, expires_at__lte=now))
+
+
+def _record_orders(user_id, counts, spend=0, placed_at=None):
+    """
+    Apply {status: delta} `counts`, a lifetime spend delta and the time of
+    a new order to the user's UserOrderStats, inside the caller's
+    transaction and after its order writes. A user without stats yet gets
+    them rebuilt from their orders instead.
+    """
+    changes = {STATUS_FIELDS[status]: F(STATUS_FIELDS[status]) + delta for status, delta in counts.items() if delta}
+    if spend:
+        changes['lifetime_spend'] = F('lifetime_spend') + spend
+    if placed_at is not None:
+        changes['last_order_at'] = placed_at
+    if changes and not UserOrderStats.objects.filter(user_id=user_id).update(**changes):
+        rebuild_order_stats([user_id])
+
+
+def record_new_order(order):
+    spend = Decimal(order.total) if order.status in Order.SPENT_STATUSES else 0
+    _record_orders(order.user_id, {order.status: 1}, spend=spend, placed_at=order.created_at)
+
+
+def _record_status_change(order, previous, status):
+    """Record a status change in UserOrderStats and, when it is paid or unpaid, in the sales rollup."""
+    spent = (status in Order.SPENT_STATUSES) - (previous in Order.SPENT_STATUSES)
+    _record_orders(order.user_id, {previous: -1, status: 1}, spend=spent * order.total)
+    if spent:
+        record_sales(order, spent)
+
+
+def rebuild_order_stats(user_ids=None, batch_size=1000):
+    """
+    Recompute UserOrderStats from the orders table, for `user_ids` or for
+    everyone: one grouped query and one upsert per `batch_size` users with
+    orders, and the counters of users without any reset. A full rebuild
+    also creates the missing rows. Returns the number of users with orders.
+    """
+    orders = Order.objects.all() if user_ids is None else Order.objects.filter(user_id__in=user_ids)
+    aggregates = orders.order_by('user_id').values('user_id').annotate(
+        **{field: Count('pk', filter=Q(status=status)) for status, field in STATUS_FIELDS.items()},
+        lifetime_spend=Coalesce(
+            Sum('total', filter=Q(status__in=Order.SPENT_STATUSES)), Value(Decimal(0)), output_field=DecimalField()
+        ),
+        last_order_at=Max('created_at'),
+    )
+    update_fields = [*STATUS_FIELDS.values(), 'lifetime_spend', 'last_order_at']
+    rebuilt = 0
+    with transaction.atomic():
+        last_user_id = None
+        while True:
+            batch = aggregates if last_user_id is None else aggregates.filter(user_id__gt=last_user_id)
+            rows = list(batch[:batch_size])
+            if not rows:
+                break
+            UserOrderStats.objects.bulk_create(
+                [UserOrderStats(**row) for row in rows],
+                update_conflicts=True, unique_fields=['user'], update_fields=update_fields,
+            )
+            rebuilt += len(rows)
+            last_user_id = rows[-1]['user_id']
+
+        without_orders = UserOrderStats.objects.exclude(Exists(Order.objects.filter(user_id=OuterRef('user_id'))))
+        if user_ids is not None:
+            without_orders = without_orders.filter(user_id__in=user_ids)
+        without_orders.update(
+            **{field: 0 for field in STATUS_FIELDS.values()}, lifetime_spend=0, last_order_at=None
+        )
+
+        if user_ids is None:
+            missing = get_user_model().objects.filter(order_stats__isnull=True).values_list('pk', flat=True)
+            while ids := list(missing[:batch_size]):
+                UserOrderStats.objects.bulk_create([UserOrderStats(user_id=pk) for pk in ids])
+    return rebuilt
+
+
+def _take_order_stock(order):
+    """
+    Take the order's items off stock, converting the lines still covered by
+    a live reservation from holds into decrements and deleting the holds.
+    """
+    reservations = StockReservation.objects.filter(order=order)
+    held = dict(reservations.select_for_update().values_list('order_item_id', 'quantity'))
+    changes = defaultdict(lambda: (0, 0))
+    for item_id, product_id, quantity in order.items.values_list('id', 'product_id', 'quantity'):
+        taken, released = changes[product_id]
+        changes[product_id] = (taken + quantity, released + held.get(item_id, 0))
+    _adjust_stock(changes)
+    reservations.delete()
+
+
+def pay_order(order, payment_method):
+    """
+    Mark a PENDING order as PAID and take its items off stock in one
+    transaction. Lines still covered by a live reservation convert the
+    hold into a decrement; lines whose hold expired must be covered by
+    the stock that is still available. The status change is conditional
+    too, so two concurrent payments of the same order cannot both succeed.
+    """
+    transaction_id = str(uuid.uuid4())
+    paid_at = timezone.now()
+    with transaction.atomic():
+        claimed = Order.objects.filter(pk=order.pk, status='PENDING').update(
+            status='PAID', payment_method=payment_method, transaction_id=transaction_id, paid_at=paid_at
+        )
+        if not claimed:
+            raise OrderNotPending(order.pk)
+        order.paid_at = paid_at
+        _take_order_stock(order)
+        _record_status_change(order, 'PENDING', 'PAID')
+        notify_order(order, 'PAID')
+
+    order.status = 'PAID'
+    order.payment_method = payment_method
+    order.transaction_id = transaction_id
+    return order
+
+
+def set_order_status(order, status):
+    """
+    Move an order to `status`, giving its stock holds back when it is
+    cancelled, and keep its owner's UserOrderStats and the sales rollup in
+    step. An order counts as paid from the first time it is moved to a
+    paid status, which takes its items off stock as pay_order does; raises
+    InsufficientStock when they cannot be covered.
+    """
+    with transaction.atomic():
+        previous, order.paid_at = Order.objects.select_for_update().filter(pk=order.pk).values_list(
+            'status', 'paid_at'
+        ).get()
+        if order.paid_at is None and status in Order.SPENT_STATUSES:
+            order.paid_at = timezone.now()
+            _take_order_stock(order)
+        Order.objects.filter(pk=order.pk).update(status=status, paid_at=order.paid_at)
+        if status == 'CANCELLED':
+            release_reservations(order.reservations.all())
+        if status != previous:
+            _record_status_change(order, previous, status)
+            notify_order(order, status)
+    order.status = status
+    return order
+
+
+def delete_order(order):
+    """Delete an order, taking it off the sales rollup, and recount its owner's UserOrderStats."""
+    with transaction.atomic():
+        status, order.paid_at = Order.objects.select_for_update().filter(pk=order.pk).values_list(
+            'status', 'paid_at'
+        ).get()
+        if status in Order.SPENT_STATUSES and order.paid_at is not None:
+            record_sales(order, -1)
+        order.delete()
+        rebuild_order_stats([order.user_id])
+
+
+def checkout_cart(cart, address):
+    """
+    Turn the cart into a PENDING order in a single transaction.
+
+    The cart is read once with its products, the total is summed by the
+    database, item prices are snapshotted into OrderItem rows with one
+    bulk insert, stock is held for each line (see reserve_stock), and
+    exactly the lines that were ordered are removed from the cart. The
+    order email is queued with it (orders.jobs). Raises EmptyCart when
+    there is nothing to order and InsufficientStock when a line cannot be
+    held.
+    """
+    with transaction.atomic():
+        cart_items = list(cart.items.select_related('product'))
+        if not cart_items:
+            raise EmptyCart(cart.pk)
+        item_ids = [item.pk for item in cart_items]
+
+        total = cart.items.filter(pk__in=item_ids).aggregate(
+            total=Sum(F('quantity') * F('product__price'))
+        )['total']
+        order = Order.objects.create(
+            user_id=cart.user_id,
+            total=total,
+            status='PENDING',
+            shipping_address=str(address),
+        )
+        order_items = OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=item.product, quantity=item.quantity, price=item.product.price)
+            for item in cart_items
+        )
+        reserve_stock(order_items)
+        cart.items.filter(pk__in=item_ids).delete()
+        notify_order(order, 'PENDING')
+    return order
+
+
+def apply_cart_operations(cart, operations):
+    """
+    Apply a list of {'product_id', 'quantity', 'op'} operations to the
+    cart in one transaction. `add` merges into the existing line, `set`
+    replaces its quantity (0 removes it) and `remove` drops it.
+
+    The cart's lines and every referenced product are each read with one
+    query, and the result is written back with at most one bulk insert,
+    one bulk update and one delete. Raises UnknownProduct or
+    InsufficientStock without changing anything.
+    """
+    with transaction.atomic():
+        # Serialize concurrent batches for the same cart.
+        Cart.objects.select_for_update().filter(pk=cart.pk).exists()
+        lines = {item.product_id: item for item in cart.items.all()}
+        products = Product.objects.in_bulk({op['product_id'] for op in operations})
+
+        quantities = {product_id: item.quantity for product_id, item in lines.items()}
+        for op in operations:
+            product_id = op['product_id']
+            if product_id not in products:
+                raise UnknownProduct(product_id)
+            if op['op'] == 'add':
+                quantities[product_id] = quantities.get(product_id, 0) + op['quantity']
+            elif op['op'] == 'set':
+                quantities[product_id] = op['quantity']
+            else:
+                quantities[product_id] = 0
+
+        created, updated, removed = [], [], []
+        for product_id, quantity in quantities.items():
+            item = lines.get(product_id)
+            if item is not None and item.quantity == quantity:
+                continue
+            if quantity and quantity > products[product_id].available_stock:
+                raise InsufficientStock(product_id)
+            if item is None:
+                if quantity:
+                    created.append(CartItem(cart=cart, product=products[product_id], quantity=quantity))
+            elif quantity:
+                item.quantity = quantity
+                updated.append(item)
+            else:
+                removed.append(item.pk)
+
+        CartItem.objects.bulk_create(created)
+        CartItem.objects.bulk_update(updated, ['quantity'])
+        CartItem.objects.filter(pk__in=removed).delete()
+    return cart
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Order, UserOrderStats
+from .services import record_new_order, release_reservations
+
+
+@receiver(pre_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    # Cascading deletes would drop the holds without giving the stock back.
+    release_reservations(instance.reservations.all())
+
+
+@receiver(post_save, sender=Order)
+def order_created(sender, instance, created, raw=False, **kwargs):
+    # Status changes go through the services, which record them.
+    if created and not raw:
+        record_new_order(instance)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_created(sender, instance, created, raw=False, **kwargs):
+    # Every user has stats, so order changes only ever update them.
+    if created and not raw:
+        UserOrderStats.objects.create(user=instance)
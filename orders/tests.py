@@ -1,3 +1,820 @@
-from django.test import TestCase
+import csv
+import json
+import threading
+
+from django.contrib.auth import get_user_model
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core import mail
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
+
+from ecommerce.queryplans import QueryPlans
+from jobs.models import Job
+from jobs.queue import Metrics, Worker
+from products.models import Category, Product
+from products.tests import AsyncViewTestCase
+from .analytics import rebuild_sales_rollup
+from .models import Address, Cart, CartItem, Order, OrderItem, SalesRollup, StockReservation, UserOrderStats
+from .services import InsufficientStock, _adjust_stock, apply_cart_operations
+from .views import insufficient_stock
+
+User = get_user_model()
+
+ORDERS_URL = '/api/orders/orders/'
+CHECKOUT_URL = '/api/orders/checkout/'
+
+
+def make_address(user, **kwargs):
+    return Address.objects.create(
+        user=user, full_name="Ada Buyer", phone="555", street="1 Main St",
+        city="Springfield", state="IL", postal_code="62701", country="US", **kwargs
+    )
+
+
+def fill_cart(user, lines, quantity=2):
+    cart, _ = Cart.objects.get_or_create(user=user)
+    products = Product.objects.bulk_create(
+        Product(name=f"Item {i}", price=Decimal('2.50') + i, stock=100) for i in range(lines)
+    )
+    CartItem.objects.bulk_create(CartItem(cart=cart, product=p, quantity=quantity) for p in products)
+    return cart, products
+
+
+class OrderListPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="buyer", password="pass")
+        self.admin = User.objects.create_user(username="admin", password="pass", is_admin=True)
+        self.orders = [Order.objects.create(user=self.user, total=10) for _ in range(3)]
+        Order.objects.create(user=self.admin, total=5)
+
+    def test_customer_pages_through_own_orders(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(ORDERS_URL, {'page_size': 2})
+        self.assertEqual(
+            [o['id'] for o in response.data['results']],
+            [self.orders[2].pk, self.orders[1].pk],
+        )
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([o['id'] for o in response.data['results']], [self.orders[0].pk])
+        self.assertIsNone(response.data['next'])
+
+    def test_admin_lists_all_orders(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(ORDERS_URL, {'page_size': 10})
+        self.assertEqual(len(response.data['results']), 4)
+
+
+class PaymentStockTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="buyer", password="pass")
+        self.client.force_authenticate(self.user)
+        self.lamp = Product.objects.create(name="Lamp", price='10.00', stock=5)
+        self.desk = Product.objects.create(name="Desk", price='99.00', stock=1)
+
+    def pay(self, order):
+        return self.client.post(f"/api/orders/orders/{order.pk}/pay/", {'payment_method': 'Card'})
+
+    def test_payment_decrements_stock(self):
+        order = Order.objects.create(user=self.user, total=20)
+        OrderItem.objects.create(order=order, product=self.lamp, quantity=2, price='10.00')
+
+        response = self.pay(order)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'PAID')
+        self.lamp.refresh_from_db()
+        self.assertEqual(self.lamp.stock, 3)
+
+        self.assertEqual(self.pay(order).status_code, 400)
+        self.lamp.refresh_from_db()
+        self.assertEqual(self.lamp.stock, 3)
+
+    def test_short_line_rolls_back_whole_payment(self):
+        order = Order.objects.create(user=self.user, total=218)
+        OrderItem.objects.create(order=order, product=self.lamp, quantity=2, price='10.00')
+        OrderItem.objects.create(order=order, product=self.desk, quantity=2, price='99.00')
+
+        response = self.pay(order)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], "Not enough stock for Desk")
+        order.refresh_from_db()
+        self.lamp.refresh_from_db()
+        self.assertEqual(order.status, 'PENDING')
+        self.assertEqual(self.lamp.stock, 5)
+
+
+class PaymentContentionTests(TransactionTestCase):
+    STOCK = 10
+    BUYERS = 24
+
+    def test_concurrent_payments_never_oversell(self):
+        product = Product.objects.create(name="Hot item", price='5.00', stock=self.STOCK)
+        buyers = []
+        for i in range(self.BUYERS):
+            user = User.objects.create(username=f"buyer{i}")
+            order = Order.objects.create(user=user, total=5)
+            OrderItem.objects.create(order=order, product=product, quantity=1, price='5.00')
+            buyers.append((user, order))
+
+        results = []
+        barrier = threading.Barrier(self.BUYERS)
+
+        def pay(user, order):
+            client = APIClient()
+            client.force_authenticate(user)
+            barrier.wait()
+            try:
+                results.append(client.post(f"/api/orders/orders/{order.pk}/pay/").status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=pay, args=buyer) for buyer in buyers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(results.count(200), self.STOCK)
+        self.assertEqual(results.count(400), self.BUYERS - self.STOCK)
+        self.assertEqual(Order.objects.filter(status='PAID').count(), self.STOCK)
+
+
+class CheckoutTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="shopper", password="pass")
+        self.address = make_address(self.user, is_default=True)
+        self.client.force_authenticate(self.user)
+
+    def checkout(self, **data):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(CHECKOUT_URL, data)
+        return response, len(ctx.captured_queries)
+
+    def test_checkout_snapshots_prices_and_clears_cart(self):
+        cart, products = fill_cart(self.user, 3)
+        Product.objects.filter(pk=products[0].pk).update(price='4.00')
+
+        response, _ = self.checkout()
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(pk=response.data['id'])
+        self.assertEqual(order.total, Decimal('2') * (Decimal('4.00') + Decimal('3.50') + Decimal('4.50')))
+        self.assertEqual(order.shipping_address, str(self.address))
+        self.assertFalse(cart.items.exists())
+
+        # Later price changes do not touch the order.
+        Product.objects.update(price='99.00')
+        self.assertEqual(
+            sorted(order.items.values_list('price', flat=True)),
+            [Decimal('3.50'), Decimal('4.00'), Decimal('4.50')],
+        )
+
+    def test_query_count_does_not_grow_with_cart(self):
+        fill_cart(self.user, 1)
+        small_response, small = self.checkout()
+        fill_cart(self.user, 25)
+        large_response, large = self.checkout()
+
+        self.assertEqual(len(large_response.data['items']), 25)
+        self.assertEqual(small, large)
+
+    def test_empty_cart_and_missing_address(self):
+        Cart.objects.create(user=self.user)
+        response, _ = self.checkout()
+        self.assertEqual(response.status_code, 400)
+
+        self.address.is_default = False
+        self.address.save()
+        fill_cart(self.user, 1)
+        response, _ = self.checkout()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Order.objects.count(), 0)
+
+        other = make_address(User.objects.create_user(username="other", password="pass"))
+        response, _ = self.checkout(address_id=other.pk)
+        self.assertEqual(response.status_code, 404)
+
+
+class OrderEmailTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="shopper", email="shopper@example.com", password="pass")
+        self.address = make_address(self.user)
+        self.client.force_authenticate(self.user)
+
+    def run_jobs(self):
+        Worker('test', Metrics()).run(burst=True)
+
+    def test_order_emails_are_queued_with_the_order_and_sent_once(self):
+        fill_cart(self.user, 1)
+        order_id = self.client.post(CHECKOUT_URL, {'address_id': self.address.pk}).data['id']
+        self.client.post(f"{ORDERS_URL}{order_id}/pay/")
+        # Nothing is sent by the requests themselves.
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(
+            list(Job.objects.order_by('id').values_list('key', flat=True)),
+            [f"order-email:{order_id}:PENDING", f"order-email:{order_id}:PAID"],
+        )
+
+        self.run_jobs()
+        self.run_jobs()
+        self.assertEqual([message.to for message in mail.outbox], [["shopper@example.com"]] * 2)
+        self.assertEqual(mail.outbox[1].subject, f"Payment received for order #{order_id}")
+
+    def test_failed_checkout_queues_nothing(self):
+        _, [product] = fill_cart(self.user, 1, quantity=5)
+        Product.objects.filter(pk=product.pk).update(stock=1)
+        self.assertEqual(self.client.post(CHECKOUT_URL, {'address_id': self.address.pk}).status_code, 400)
+        self.assertFalse(Job.objects.exists())
+
+
+class StockReservationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="holder", password="pass")
+        make_address(self.user, is_default=True)
+        self.client.force_authenticate(self.user)
+        self.product = Product.objects.create(name="Console", price='300.00', stock=3)
+
+    def checkout(self, quantity):
+        cart, _ = Cart.objects.get_or_create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=quantity)
+        return self.client.post(CHECKOUT_URL)
+
+    def assertStock(self, stock, reserved):
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved), (stock, reserved))
+
+    def test_checkout_holds_stock_and_payment_converts_hold(self):
+        response = self.checkout(2)
+        self.assertEqual(response.status_code, 201)
+        self.assertStock(3, 2)
+        self.assertEqual(self.product.available_stock, 1)
+
+        # A second checkout cannot take the held units.
+        self.assertEqual(self.checkout(2).status_code, 400)
+        self.assertStock(3, 2)
+
+        self.client.post(f"{ORDERS_URL}{response.data['id']}/pay/")
+        self.assertStock(1, 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_order_items_nest_the_product_summary(self):
+        response = self.checkout(3)
+        self.assertEqual(response.data['items'][0]['product'], {
+            'id': self.product.pk, 'name': "Console", 'price': '300.00', 'primary_image': None, 'in_stock': False,
+        })
+
+        response = self.client.get(f"{ORDERS_URL}{response.data['id']}/", {'expand': 'product'})
+        self.assertEqual(response.data['items'][0]['product']['stock'], 3)
+
+    def test_order_fields_skip_the_items_query(self):
+        order_id = self.checkout(1).data['id']
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(ORDERS_URL, {'fields': 'id,status,total'})
+        self.assertEqual(response.data['results'], [{'id': order_id, 'status': 'PENDING', 'total': '300.00'}])
+        self.assertFalse(any('orders_orderitem' in query['sql'] for query in ctx.captured_queries))
+
+    def test_add_to_cart_checks_available_stock(self):
+        self.checkout(2)
+        response = self.client.post('/api/orders/cart/add', {'product_id': self.product.pk, 'quantity': 2})
+        self.assertEqual(response.status_code, 400)
+
+    def test_expired_holds_are_released(self):
+        order_id = self.checkout(3).data['id']
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        call_command('expire_reservations', stdout=StringIO())
+        self.assertStock(3, 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+        # The order can still be paid while the stock is there.
+        self.assertEqual(self.client.post(f"{ORDERS_URL}{order_id}/pay/").status_code, 200)
+        self.assertStock(0, 0)
+
+    def test_payment_after_expiry_needs_available_stock(self):
+        order_id = self.checkout(3).data['id']
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        call_command('expire_reservations', stdout=StringIO())
+        Product.objects.filter(pk=self.product.pk).update(reserved=2)
+
+        self.assertEqual(self.client.post(f"{ORDERS_URL}{order_id}/pay/").status_code, 400)
+        self.assertStock(3, 2)
+
+    def test_cancelling_or_deleting_order_releases_holds(self):
+        admin = User.objects.create_user(username="boss", password="pass", is_admin=True)
+        first = self.checkout(1).data['id']
+        self.checkout(1)
+        self.assertStock(3, 2)
+
+        self.client.force_authenticate(admin)
+        response = self.client.post(f"{ORDERS_URL}{first}/update_status/", {'status': 'CANCELLED'})
+        self.assertEqual(response.status_code, 200)
+        self.assertStock(3, 1)
+
+        Order.objects.all().delete()
+        self.assertStock(3, 0)
+
+    def test_admin_fulfilment_takes_stock_once(self):
+        admin = User.objects.create_user(username="boss", password="pass", is_admin=True)
+        shipped, cancelled = self.checkout(2).data['id'], self.checkout(1).data['id']
+        self.assertStock(3, 3)
+
+        self.client.force_authenticate(admin)
+
+        def update(pk, status):
+            return self.client.post(f"{ORDERS_URL}{pk}/update_status/", {'status': status})
+
+        self.assertEqual(update(shipped, 'SHIPPED').status_code, 200)
+        self.assertStock(1, 1)
+        self.assertFalse(StockReservation.objects.filter(order_id=shipped).exists())
+        self.assertEqual(update(shipped, 'DELIVERED').status_code, 200)
+        self.assertStock(1, 1)
+
+        # Cancelled, its hold went back; paid after all, the stock is taken.
+        update(cancelled, 'CANCELLED')
+        self.assertStock(1, 0)
+        Product.objects.filter(pk=self.product.pk).update(reserved=1)
+        self.assertEqual(update(cancelled, 'PAID').status_code, 400)
+        self.assertEqual(Order.objects.get(pk=cancelled).status, 'CANCELLED')
+        Product.objects.filter(pk=self.product.pk).update(reserved=0)
+        self.assertEqual(update(cancelled, 'PAID').status_code, 200)
+        self.assertStock(0, 0)
+
+    def test_insufficient_stock_always_names_a_product(self):
+        with self.assertRaises(InsufficientStock) as raised:
+            with transaction.atomic():
+                _adjust_stock({self.product.pk: (1, 0), 0: (1, 0)})
+        self.assertEqual(raised.exception.product_id, self.product.pk)
+
+        self.product.delete()
+        response = insufficient_stock(raised.exception, "Not enough stock for {product.name}")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'error': f"Product {raised.exception.product_id} is no longer available"})
+
+
+class CartBatchTests(APITestCase):
+    BATCH_URL = '/api/orders/cart/batch'
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="batcher", password="pass")
+        self.client.force_authenticate(self.user)
+        self.products = Product.objects.bulk_create(
+            Product(name=f"Part {i}", price='1.00', stock=10) for i in range(30)
+        )
+        self.cart = Cart.objects.create(user=self.user)
+
+    def quantities(self):
+        return dict(self.cart.items.values_list('product_id', 'quantity'))
+
+    def test_batch_applies_operations_and_returns_cart(self):
+        a, b, c = self.products[:3]
+        CartItem.objects.create(cart=self.cart, product=c, quantity=4)
+
+        response = self.client.post(self.BATCH_URL, [
+            {'product_id': a.pk, 'quantity': 2},
+            {'product_id': a.pk, 'quantity': 3, 'op': 'add'},
+            {'product_id': b.pk, 'quantity': 1, 'op': 'set'},
+            {'product_id': c.pk, 'op': 'remove'},
+        ], format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.quantities(), {a.pk: 5, b.pk: 1})
+        self.assertEqual(len(response.data['items']), 2)
+
+    def test_repeated_add_to_cart_merges_lines(self):
+        for _ in range(2):
+            response = self.client.post('/api/orders/cart/add', {'product_id': self.products[0].pk, 'quantity': 3})
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.quantities(), {self.products[0].pk: 6})
+
+    def test_add_and_update_errors_are_400(self):
+        a, b = self.products[:2]
+        response = self.client.post('/api/orders/cart/add', {'product_id': a.pk, 'quantity': 0})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.quantities(), {})
+
+        line = CartItem.objects.create(cart=self.cart, product=a, quantity=1)
+        CartItem.objects.create(cart=self.cart, product=b, quantity=2)
+        response = self.client.patch(f"/api/orders/cart/item/{line.pk}", {'product_id': b.pk})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.quantities(), {a.pk: 1, b.pk: 2})
+
+    def test_failed_batch_changes_nothing(self):
+        a, b = self.products[:2]
+        CartItem.objects.create(cart=self.cart, product=a, quantity=1)
+
+        response = self.client.post(self.BATCH_URL, [
+            {'product_id': a.pk, 'quantity': 5, 'op': 'set'},
+            {'product_id': b.pk, 'quantity': 11},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(self.BATCH_URL, [{'product_id': 0, 'quantity': 1}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.quantities(), {a.pk: 1})
+
+    def test_query_count_does_not_grow_with_batch(self):
+        def count(products):
+            operations = [{'product_id': p.pk, 'quantity': 1, 'op': 'add'} for p in products]
+            with CaptureQueriesContext(connection) as ctx:
+                apply_cart_operations(self.cart, operations)
+            return len(ctx.captured_queries)
+
+        # New lines, then updates to existing lines.
+        self.assertEqual(count(self.products[:2]), count(self.products[2:30]))
+        self.assertEqual(count(self.products[:2]), count(self.products[2:30]))
+
+
+class CartReadTests(APITestCase):
+    CART_URL = '/api/orders/cart/'
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="reader", password="pass")
+        self.client.force_authenticate(self.user)
+
+    def read_cart(self, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.CART_URL, params)
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_empty_cart_is_created(self):
+        response, _ = self.read_cart()
+        self.assertEqual(response.data['items'], [])
+        self.assertEqual(response.data['total'], 0)
+
+    def test_query_count_does_not_grow_with_cart(self):
+        fill_cart(self.user, 1)
+        _, small = self.read_cart()
+        fill_cart(self.user, 20)
+        response, large = self.read_cart()
+
+        self.assertEqual(small, large)
+        self.assertEqual(len(response.data['items']), 21)
+        prices = [Decimal('2.50')] + [Decimal('2.50') + i for i in range(20)]
+        self.assertEqual(Decimal(response.data['total']), 2 * sum(prices))
+
+    def test_expanded_query_count_does_not_grow_with_cart(self):
+        fill_cart(self.user, 1)
+        _, small = self.read_cart({'expand': 'product'})
+        fill_cart(self.user, 20)
+        response, large = self.read_cart({'expand': 'product'})
+
+        self.assertEqual(small, large)
+        self.assertIn('description', response.data['items'][0]['product'])
+
+    def test_items_nest_the_product_summary(self):
+        cart, (product, sold_out) = fill_cart(self.user, 2)
+        product.images.create(image='product_images/b.jpg')
+        product.images.create(image='product_images/a.jpg')
+        sold_out.reserved = sold_out.stock
+        sold_out.save()
+
+        response, _ = self.read_cart()
+        first, second = [item['product'] for item in response.data['items']]
+        self.assertEqual(first, {
+            'id': product.pk,
+            'name': "Item 0",
+            'price': '2.50',
+            'primary_image': 'http://testserver/media/product_images/b.jpg',
+            'in_stock': True,
+        })
+        self.assertEqual((second['in_stock'], second['primary_image']), (False, None))
+
+    def test_omitting_items_skips_their_prefetch(self):
+        fill_cart(self.user, 3)
+        _, full = self.read_cart()
+        response, trimmed = self.read_cart({'omit': 'items'})
+        self.assertEqual(list(response.data), ['id', 'user', 'total'])
+        self.assertEqual(Decimal(response.data['total']), Decimal('2') * (Decimal('2.50') + Decimal('3.50') + Decimal('4.50')))
+        self.assertLess(trimmed, full)
+
+    def test_total_without_prefetch_uses_aggregate(self):
+        cart, _ = fill_cart(self.user, 3)
+        cart = Cart.objects.get(pk=cart.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(cart.total_price(), Decimal('2') * (Decimal('2.50') + Decimal('3.50') + Decimal('4.50')))
+
+
+class AsyncCartViewTests(AsyncViewTestCase):
+    CART_URL = '/api/orders/cart/'
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="reader", password="pass")
+
+    def test_cart_reads_match_the_drf_view(self):
+        fill_cart(self.user, 3)
+        self.authenticate(self.user)
+        self.assertSameResponses([
+            (self.CART_URL, {}),
+            (self.CART_URL, {'omit': 'items'}),
+            (self.CART_URL, {'fields': 'total'}),
+            (self.CART_URL, {'expand': 'product'}),
+        ])
+
+    def test_empty_cart_is_created(self):
+        self.async_views()
+        self.authenticate(self.user)
+        response = self.client.get(self.CART_URL)
+        self.assertEqual((response.status_code, response.json()['items']), (200, []))
+        self.assertTrue(Cart.objects.filter(user=self.user).exists())
+
+    def test_anonymous_reads_are_refused(self):
+        self.async_views()
+        self.assertEqual(self.client.get(self.CART_URL).status_code, 401)
+
+
+class OrderSummaryTests(APITestCase):
+    SUMMARY_URL = f"{ORDERS_URL}summary/"
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="regular", password="pass")
+        self.admin = User.objects.create_user(username="admin", password="pass", is_admin=True)
+        self.address = make_address(self.user)
+        self.client.force_authenticate(self.user)
+
+    def place_order(self, lines):
+        fill_cart(self.user, lines, quantity=1)
+        return self.client.post(CHECKOUT_URL, {'address_id': self.address.pk}).data['id']
+
+    def summary(self):
+        return self.client.get(self.SUMMARY_URL).data
+
+    def test_summary_follows_checkout_payment_and_status_changes(self):
+        self.assertEqual(self.summary()['order_count'], 0)
+        paid, shipped, cancelled = self.place_order(1), self.place_order(2), self.place_order(1)
+        self.client.post(f"{ORDERS_URL}{paid}/pay/")
+        self.client.post(f"{ORDERS_URL}{shipped}/pay/")
+        self.client.force_authenticate(self.admin)
+        self.client.post(f"{ORDERS_URL}{shipped}/update_status/", {'status': 'SHIPPED'})
+        self.client.post(f"{ORDERS_URL}{cancelled}/update_status/", {'status': 'CANCELLED'})
+        self.client.force_authenticate(self.user)
+
+        with self.assertNumQueries(1):
+            summary = self.summary()
+        self.assertEqual(summary['order_count'], 3)
+        self.assertEqual(
+            summary['orders_by_status'],
+            {'PENDING': 0, 'PAID': 1, 'SHIPPED': 1, 'DELIVERED': 0, 'CANCELLED': 1},
+        )
+        # 2.50 + (2.50 + 3.50); the cancelled order never counts.
+        self.assertEqual(summary['lifetime_spend'], '8.50')
+        self.assertEqual(summary['last_order_at'], self.client.get(f"{ORDERS_URL}{cancelled}/").data['created_at'])
+
+    def test_cancelling_a_paid_order_takes_it_off_the_spend(self):
+        order_id = self.place_order(1)
+        self.client.post(f"{ORDERS_URL}{order_id}/pay/")
+        self.client.force_authenticate(self.admin)
+        self.client.post(f"{ORDERS_URL}{order_id}/update_status/", {'status': 'CANCELLED'})
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.summary()['lifetime_spend'], '0.00')
+
+    def test_failed_payment_leaves_the_summary_alone(self):
+        order = Order.objects.create(user=self.user, total=30)
+        product = Product.objects.create(name="Rare", price='30.00', stock=0)
+        OrderItem.objects.create(order=order, product=product, quantity=1, price='30.00')
+        self.assertEqual(self.client.post(f"{ORDERS_URL}{order.pk}/pay/").status_code, 400)
+        self.assertEqual(self.summary()['orders_by_status']['PENDING'], 1)
+        self.assertEqual(self.summary()['lifetime_spend'], '0.00')
+
+    def test_deleting_an_order_recounts(self):
+        first, second = self.place_order(1), self.place_order(1)
+        self.client.delete(f"{ORDERS_URL}{second}/")
+        summary = self.summary()
+        self.assertEqual(summary['order_count'], 1)
+        self.assertEqual(summary['last_order_at'], self.client.get(f"{ORDERS_URL}{first}/").data['created_at'])
+
+    def test_rebuild_matches_incremental_updates(self):
+        self.client.post(f"{ORDERS_URL}{self.place_order(2)}/pay/")
+        self.place_order(1)
+        expected = self.summary()
+
+        UserOrderStats.objects.all().delete()
+        call_command('rebuild_order_stats', batch_size=1, stdout=StringIO())
+        self.assertEqual(self.summary(), expected)
+        self.assertTrue(UserOrderStats.objects.filter(user=self.admin, pending=0).exists())
+
+    def test_missing_stats_are_rebuilt_on_the_next_change(self):
+        order_id = self.place_order(1)
+        UserOrderStats.objects.filter(user=self.user).delete()
+        self.client.post(f"{ORDERS_URL}{order_id}/pay/")
+        self.assertEqual(self.summary()['orders_by_status']['PAID'], 1)
+
+
+class SalesAnalyticsTests(APITestCase):
+    ANALYTICS_URL = '/api/orders/analytics/'
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username="admin", password="pass", is_admin=True)
+        self.user = User.objects.create_user(username="buyer", password="pass")
+        self.address = make_address(self.user)
+        self.kitchen = Category.objects.create(name="Kitchen")
+        self.pan = Product.objects.create(name="Pan", price='20.00', stock=100, category=self.kitchen)
+        self.mug = Product.objects.create(name="Mug", price='5.00', stock=100)
+
+    def place_order(self, *lines, pay=True):
+        cart, _ = Cart.objects.get_or_create(user=self.user)
+        for product, quantity in lines:
+            CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+        self.client.force_authenticate(self.user)
+        order_id = self.client.post(CHECKOUT_URL, {'address_id': self.address.pk}).data['id']
+        if pay:
+            self.client.post(f"{ORDERS_URL}{order_id}/pay/")
+        self.client.force_authenticate(self.admin)
+        return order_id
+
+    def report(self, name, **params):
+        response = self.client.get(f"{self.ANALYTICS_URL}{name}/", params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['results']
+
+    def rollup(self):
+        """The per-product day rows."""
+        rows = SalesRollup.objects.filter(period='day', product__isnull=False)
+        return sorted(rows.values_list('date', 'product_id', 'quantity', 'revenue'))
+
+    def test_paying_adds_to_the_rollup_and_cancelling_takes_off(self):
+        self.place_order((self.pan, 2), (self.mug, 1))
+        cancelled = self.place_order((self.pan, 1))
+        self.place_order((self.mug, 4), pay=False)
+        today = timezone.localdate()
+        self.assertEqual(self.rollup(), [
+            (today, self.pan.pk, 3, Decimal('60.00')),
+            (today, self.mug.pk, 1, Decimal('5.00')),
+        ])
+
+        self.client.post(f"{ORDERS_URL}{cancelled}/update_status/", {'status': 'CANCELLED'})
+        self.assertEqual(self.rollup()[0], (today, self.pan.pk, 2, Decimal('40.00')))
+        totals = SalesRollup.objects.filter(product__isnull=True).values_list('period', 'date', 'quantity', 'revenue')
+        self.assertCountEqual(totals, [
+            ('day', today, 3, Decimal('45.00')),
+            ('month', today.replace(day=1), 3, Decimal('45.00')),
+        ])
+
+    def test_admin_status_change_and_deletion(self):
+        pending = self.place_order((self.mug, 2), pay=False)
+        self.client.post(f"{ORDERS_URL}{pending}/update_status/", {'status': 'PAID'})
+        self.assertEqual(self.rollup(), [(timezone.localdate(), self.mug.pk, 2, Decimal('10.00'))])
+        self.client.delete(f"{ORDERS_URL}{pending}/")
+        self.assertFalse(SalesRollup.objects.exists())
+
+    def test_reports(self):
+        self.place_order((self.pan, 1), (self.mug, 2))
+        self.place_order((self.mug, 6))
+        # Spread the orders over two months and rebuild from the items.
+        first_paid = timezone.now() - timedelta(days=40)
+        Order.objects.filter(pk=Order.objects.earliest('pk').pk).update(paid_at=first_paid)
+        call_command('rebuild_sales_rollup', stdout=StringIO())
+
+        start, end = timezone.localdate() - timedelta(days=60), timezone.localdate()
+        months = self.report('revenue', start=start, end=end, period='month')
+        self.assertEqual([row['revenue'] for row in months], ['30.00', '30.00'])
+        self.assertEqual(sum(row['quantity'] for row in self.report('revenue', start=start, end=end)), 9)
+
+        top = self.report('top-products', start=start, end=end, order_by='quantity', limit=1)
+        self.assertEqual(top, [{'quantity': 8, 'revenue': '40.00', 'product_id': self.mug.pk, 'name': "Mug"}])
+        categories = self.report('categories', start=start, end=end)
+        self.assertEqual(
+            [(row['name'], row['revenue']) for row in categories], [(None, '40.00'), ("Kitchen", '20.00')]
+        )
+        # The default range is the last 30 days.
+        self.assertEqual([row['revenue'] for row in self.report('revenue')], ['30.00'])
+        # A range that ends a day before the earlier order takes none of its month.
+        before = timezone.localdate(first_paid) - timedelta(days=1)
+        self.assertEqual(self.report('categories', start=start, end=before), [])
+
+    def test_reports_read_only_the_rollup(self):
+        self.place_order((self.pan, 1))
+        for name in ('revenue', 'top-products', 'categories'):
+            with CaptureQueriesContext(connection) as ctx:
+                self.report(name)
+            self.assertFalse(any('orders_order' in query['sql'] for query in ctx.captured_queries))
+
+    def test_incremental_rollup_matches_rebuild(self):
+        self.place_order((self.pan, 2), (self.mug, 1))
+        cancelled = self.place_order((self.mug, 3))
+        self.client.post(f"{ORDERS_URL}{cancelled}/update_status/", {'status': 'CANCELLED'})
+        self.place_order((self.pan, 5))
+        fields = ('period', 'date', 'product_id', 'quantity', 'revenue')
+        expected = set(SalesRollup.objects.values_list(*fields))
+        rebuild_sales_rollup()
+        self.assertEqual(set(SalesRollup.objects.values_list(*fields)), expected)
+
+    def test_bad_ranges_and_permissions(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(f"{self.ANALYTICS_URL}revenue/", {'start': '2026-02-01', 'end': '2026-01-01'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(f"{self.ANALYTICS_URL}revenue/", {'period': 'year'}).status_code, 400)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(f"{self.ANALYTICS_URL}revenue/").status_code, 403)
+
+
+class OrderExportTests(APITestCase):
+    EXPORT_URL = '/api/orders/export/orders/'
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username="admin", password="pass", is_admin=True)
+        self.user = User.objects.create_user(username="buyer", password="pass")
+        cart, self.products = fill_cart(self.user, 2)
+        self.client.force_authenticate(self.user)
+        self.client.post(CHECKOUT_URL, {'address_id': make_address(self.user).pk})
+        self.empty = Order.objects.create(user=self.user, status='CANCELLED')
+
+    def test_one_row_per_item_and_per_empty_order(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(self.EXPORT_URL)
+        self.assertEqual(response.status_code, 200)
+        rows = list(csv.DictReader(StringIO(b''.join(response.streaming_content).decode())))
+
+        order = Order.objects.exclude(pk=self.empty.pk).get()
+        self.assertEqual(
+            [(row['order_id'], row['product_name'], row['quantity'], row['price']) for row in rows],
+            [
+                (str(order.pk), "Item 0", '2', '2.50'),
+                (str(order.pk), "Item 1", '2', '3.50'),
+                (str(self.empty.pk), '', '', ''),
+            ],
+        )
+        self.assertEqual(rows[0]['total'], '12.00')
+
+    def test_customers_cannot_export(self):
+        self.assertEqual(self.client.get(self.EXPORT_URL).status_code, 403)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('export_orders', '--format', 'ndjson', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(json.loads(lines[-1])['item_id'], None)
+
+
+class DefaultAddressTests(APITestCase):
+    ADDRESSES_URL = '/api/orders/addresses/'
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="buyer", password="pass")
+        self.home = make_address(self.user, is_default=True)
+        self.work = make_address(self.user)
+        self.client.force_authenticate(self.user)
+
+    def default(self):
+        return list(Address.objects.filter(user=self.user, is_default=True).values_list('pk', flat=True))
+
+    def test_one_default_per_user(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Address.objects.filter(pk=self.work.pk).update(is_default=True)
+        # Other users keep their own default.
+        make_address(User.objects.create_user(username="other", password="pass"), is_default=True)
+
+    def test_switching_the_default(self):
+        response = self.client.post(f"{self.ADDRESSES_URL}{self.work.pk}/set-default/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.default(), [self.work.pk])
+        self.client.patch(f"{self.ADDRESSES_URL}{self.home.pk}/", {'is_default': True})
+        self.assertEqual(self.default(), [self.home.pk])
+        response = self.client.post(self.ADDRESSES_URL, {
+            'full_name': "Ada", 'phone': "1", 'street': "2 Side St", 'city': "Springfield", 'state': "IL",
+            'postal_code': "62701", 'country': "US", 'is_default': True,
+        })
+        self.assertEqual(self.default(), [response.data['id']])
+
+
+class QueryPlanTests(APITestCase):
+    """The order and address reads and checkout are served from indexes, not table scans."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="buyer", password="pass")
+        self.address = make_address(self.user, is_default=True)
+        fill_cart(self.user, 2)
+        self.client.force_authenticate(self.user)
+
+    def assertIndexed(self, method, url, data=None):
+        with QueryPlans(connection) as plans:
+            response = getattr(self.client, method)(url, data)
+        self.assertLess(response.status_code, 300, response.data)
+        self.assertTrue(plans.statements())
+        self.assertEqual(plans.full_scans(), {})
+        return response
+
+    def test_checkout_and_orders(self):
+        order = self.assertIndexed('post', CHECKOUT_URL).data
+        self.assertIndexed('post', f"{ORDERS_URL}{order['id']}/pay/", {'payment_method': "card"})
+        self.assertIndexed('get', ORDERS_URL)
+        self.assertIndexed('get', f"{ORDERS_URL}{order['id']}/")
+        self.assertIndexed('get', f"{ORDERS_URL}summary/")
+        self.client.force_authenticate(User.objects.create_user(username="admin", password="pass", is_admin=True))
+        self.assertIndexed('get', ORDERS_URL)
+
+    def test_cart_and_addresses(self):
+        self.assertIndexed('get', '/api/orders/cart/')
+        self.assertIndexed('get', '/api/orders/addresses/')
+        self.assertIndexed('post', f"/api/orders/addresses/{make_address(self.user).pk}/set-default/")
 
-# Create your tests here.
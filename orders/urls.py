@@ -2,6 +2,7 @@ from django.urls import path, include
 from .views import (
         CartView,
         AddToCartView,
+        CartBatchView,
         UpdateCartItemView,
         PaymentSimulationView,
         OrderViewSet,
@@ -9,22 +10,30 @@ from .views import (
         AddressListCreateView,
         AddressUpdateDeleteView,
         SetDefaultAddressView,
+        OrderExportView,
+        SalesAnalyticsViewSet,
         )
+from .async_views import AsyncCartView
+from ecommerce.asyncviews import async_routes
 from rest_framework.routers import DefaultRouter
 
 router = DefaultRouter()
 router.register(r'orders', OrderViewSet, basename='orders')
+router.register(r'analytics', SalesAnalyticsViewSet, basename='analytics')
 
 urlpatterns = [
+        *async_routes(path('cart/', AsyncCartView.as_view(), name='cart-detail')),
         path('', include(router.urls)),
         path('cart/', CartView.as_view(), name='cart-detail'),
         path('cart/add', AddToCartView.as_view(), name='cart-add'),
+        path('cart/batch', CartBatchView.as_view(), name='cart-batch'),
         path('cart/item/<int:pk>', UpdateCartItemView.as_view(), name='cart-item-update'),
         path('checkout/', CheckoutView.as_view(), name='checkout'),
         path('orders/<int:pk>/pay/', PaymentSimulationView.as_view(), name='order-pay'),
         path('addresses/', AddressListCreateView.as_view(), name='address-list-create'),
         path('addresses/<int:pk>/', AddressUpdateDeleteView.as_view(), name='address-update-delete'),
         path('addresses/<int:pk>/set-default/', SetDefaultAddressView.as_view(), name='set-default-address'),
+        path('export/orders/', OrderExportView.as_view(), name='order-export'),
         ]
 
 
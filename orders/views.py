@@ -1,19 +1,64 @@
+from django.db import transaction
 from django.shortcuts import render
-from rest_framework import generics, permissions, status, viewsets
+from rest_framework import generics, permissions, serializers, status, viewsets
 from rest_framework.response import Response
-from .models import Cart, CartItem, Order, Address
-from .serializers import CartSerializer, CartItemSerializer, OrderSerializer, AddressSerializer
+from .models import Cart, CartItem, Order, Address, UserOrderStats
+from .serializers import (
+    CartSerializer,
+    CartItemSerializer,
+    CartOperationSerializer,
+    OrderSerializer,
+    OrderSummarySerializer,
+    AddressSerializer,
+    CategorySalesSerializer,
+    PeriodSalesSerializer,
+    ProductSalesSerializer,
+    SalesQuerySerializer,
+)
 from .permissions import IsAdminOrOwner
-import uuid
+from .services import (
+    EmptyCart,
+    InsufficientStock,
+    OrderNotPending,
+    UnknownProduct,
+    apply_cart_operations,
+    checkout_cart,
+    delete_order,
+    pay_order,
+    rebuild_order_stats,
+    set_order_status,
+)
+from .exports import ORDER_EXPORT
+from . import analytics
+from products.models import Product
+from products.permissions import IsAdmin
 from rest_framework.views import APIView
 from rest_framework.decorators import action
+from ecommerce.export import ExportView
+from ecommerce.fields import FieldSelectionViewMixin, is_expanded
+from ecommerce.pagination import KeysetPagination
 
-class CartView(generics.RetrieveAPIView):
+def insufficient_stock(exc, message):
+    """The 400 for InsufficientStock, `message` formatted with its product, which may have been deleted since."""
+    product = Product.objects.filter(pk=exc.product_id).first()
+    if product is None:
+        return Response({"error": f"Product {exc.product_id} is no longer available"}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({"error": message.format(product=product)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def with_items(queryset, request):
+    return queryset.with_items(is_expanded(request, 'product'))
+
+
+class CartView(FieldSelectionViewMixin, generics.RetrieveAPIView):
     serializer_class = CartSerializer
     permission_classes = [permissions.IsAuthenticated]
+    field_querysets = {'items': with_items}
 
     def get_object(self):
-        cart, created = Cart.objects.get_or_create(user=self.request.user)
+        cart = self.select_for_fields(Cart.objects.filter(user=self.request.user)).first()
+        if cart is None:
+            cart, created = Cart.objects.get_or_create(user=self.request.user)
         return cart
 
 
@@ -24,27 +69,52 @@ class AddToCartView(generics.CreateAPIView):
     def perform_create(self, serializer):
         cart, created = Cart.objects.get_or_create(user=self.request.user)
         product = serializer.validated_data['product']
-        quantity = serializer.validated_Data['quantity']
+        quantity = serializer.validated_data.get('quantity', 1)
 
-        if product.stock < quantity:
+        # Adding a product that is already in the cart merges the lines.
+        try:
+            apply_cart_operations(cart, [{'product_id': product.pk, 'quantity': quantity, 'op': 'add'}])
+        except InsufficientStock:
             raise serializers.ValidationError(
-                f"Only {product.stock} items left in stock."
+                f"Only {product.available_stock} items left in stock."
             )
 
-        serializer.save(cart=cart)
+        serializer.instance = cart.items.select_related('product').get(product=product)
+
+
+class CartBatchView(APIView):
+    """Apply a list of {product_id, quantity, op} operations to the cart at once."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = CartOperationSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        cart, created = Cart.objects.get_or_create(user=request.user)
+
+        try:
+            apply_cart_operations(cart, serializer.validated_data)
+        except UnknownProduct as exc:
+            return Response({"error": f"Product {exc.product_id} not found"}, status=status.HTTP_400_BAD_REQUEST)
+        except InsufficientStock as exc:
+            return insufficient_stock(exc, "Only {product.available_stock} of {product.name} left in stock.")
+
+        cart = with_items(Cart.objects.all(), request).get(pk=cart.pk)
+        return Response(CartSerializer(cart, context={'request': request}).data, status=status.HTTP_200_OK)
 
 class UpdateCartItemView(generics.UpdateAPIView, generics.DestroyAPIView):
-    queryset = CartItem.objects.all()
     serializer_class = CartItemSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_queryset(self):
+        return CartItem.objects.filter(cart__user=self.request.user)
+
     def perform_update(self, serializer):
         product = serializer.validated_data.get('product', serializer.instance.product)
         quantity = serializer.validated_data.get('quantity', serializer.instance.quantity)
 
-        if product.stock < quantity:
+        if product.available_stock < quantity:
             raise serializers.ValidationError(
-                f"Only {product.stock} items left in stock."
+                f"Only {product.available_stock} items left in stock."
             )
         
         serializer.save()
@@ -60,25 +130,14 @@ class PaymentSimulationView(APIView):
 
         if order.status != "PENDING":
             return Response({"errors": "Order is not pending"}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Checking stock
-        for item in order.items.all():
-            if item.product.stock < item.quantity:
-                return Response(
-                        {"error": f"Not enough stock for {item.product.name}"}, status=status.HTTP_400_BAD_REQUEST)
-        
-        
-        for item in order.items.all():
-            item.product.stock -= item.quantity
-            item.product.save()
 
         payment_method = request.data.get("payment_method", "MockPay")
-        transaction_id = str(uuid.uuid4())
-
-        order.status = "PAID"
-        order.payment_method = payment_method
-        order.transaction_id = transaction_id
-        order.save()
+        try:
+            pay_order(order, payment_method)
+        except OrderNotPending:
+            return Response({"errors": "Order is not pending"}, status=status.HTTP_400_BAD_REQUEST)
+        except InsufficientStock as exc:
+            return insufficient_stock(exc, "Not enough stock for {product.name}")
 
         return Response({
             "message": "Payment successful",
@@ -89,15 +148,31 @@ class PaymentSimulationView(APIView):
             }, status=status.HTTP_200_OK)
 
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(FieldSelectionViewMixin, viewsets.ModelViewSet):
     queryset = Order.objects.all().order_by('-created_at')
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated, IsAdminOrOwner]
+    pagination_class = KeysetPagination
+    field_querysets = {'items': with_items}
 
     def get_queryset(self):
+        orders = self.select_for_fields(Order.objects.all())
         if self.request.user.is_admin:
-            return Order.objects.all().order_by('-created_at')
-        return Order.objects.filter(user=self.request.user).order_by('-created_at')
+            return orders.order_by('-created_at')
+        return orders.filter(user=self.request.user).order_by('-created_at')
+
+    def perform_destroy(self, instance):
+        delete_order(instance)
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """The user's order counts by status, lifetime spend and last order date."""
+        stats = UserOrderStats.objects.filter(user=request.user).first()
+        if stats is None:
+            # Never recorded (no orders yet, or not backfilled): count once.
+            rebuild_order_stats([request.user.pk])
+            stats = UserOrderStats.objects.filter(user=request.user).first() or UserOrderStats(user=request.user)
+        return Response(OrderSummarySerializer(stats, context=self.get_serializer_context()).data)
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def update_status(self, request, pk=None):
@@ -112,16 +187,18 @@ class OrderViewSet(viewsets.ModelViewSet):
         
         new_status = request.data.get("status")
         if new_status not in ["PAID", "SHIPPED", "DELIVERED", "CANCELLED"]:
-            return Response({"error": "Invalid status"}, status=HTTP_400_BAD_REQUEST)
+            return Response({"error": "Invalid status"}, status=status.HTTP_400_BAD_REQUEST)
 
-        order.status = new_status
-        order.save()
+        try:
+            set_order_status(order, new_status)
+        except InsufficientStock as exc:
+            return insufficient_stock(exc, "Not enough stock for {product.name}")
 
         return Response({
             "message": f"Order status updated to {new_status}",
             "order_id": order.id,
             "status": order.status
-            }, status=HTTP_200_OK)
+            }, status=status.HTTP_200_OK)
 
 
 class CheckoutView(APIView):
@@ -130,17 +207,12 @@ class CheckoutView(APIView):
     def post(self, request):
         # Get the user's cart
         try:
-            cart = Cart.objects.get(user.request.user)
+            cart = Cart.objects.get(user=request.user)
         except Cart.DoesNotExist:
             return Response(
                 {"error": "cart not found"}, status=status.HTTP_404_NOT_FOUND
                 )
 
-        cart_items = cart.items.all()
-        if not cart_items.exists():
-            return Response({"error": "Cart in empty"}, status=status.HTTP_400_BAD_REQUEST)
-
-        
         # Get address
         address_id = request.data.get("address_id")
         if address_id:
@@ -149,28 +221,19 @@ class CheckoutView(APIView):
             except Address.DoesNotExist:
                 return Response({"error": "Invalid address"}, status=status.HTTP_404_NOT_FOUND)
         else:
-            address = Address.objects.get(id=address_id, user=request.user, is_default=True).first()
+            address = Address.objects.filter(user=request.user, is_default=True).first()
             if not address:
                 return Response({"error": "No default address found. Please add one."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        
-        # Calculate total
-        total_price = sum(item.product.price * item.quantity for item in cart_items)
-
-        # Create order
-        order = Order.objects.create(
-            user=request.user,
-            total_price=total_price,
-            status="PENDING"
-        )
 
-        # Add items form cart -> order
-        for items in cart_items:
-            order.items.create(product=item.product, quantity=item.quantity)
-
-        cart_items.delete()
+        try:
+            order = checkout_cart(cart, address)
+        except EmptyCart:
+            return Response({"error": "Cart in empty"}, status=status.HTTP_400_BAD_REQUEST)
+        except InsufficientStock as exc:
+            return insufficient_stock(exc, "Not enough stock for {product.name}")
 
-        serializer = OrderSerializer(order)
+        order = with_items(Order.objects.all(), request).get(pk=order.pk)
+        serializer = OrderSerializer(order, context={'request': request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 class AddressListCreateView(generics.ListCreateAPIView):
@@ -182,9 +245,11 @@ class AddressListCreateView(generics.ListCreateAPIView):
 
     def perform_create(self, serializer):
         # If setting address as default, remove all other default addresses
-        if serializer.validated_data.get('is_default', False):
-            Address.objects.filter(user=self.request.user, is_default=True).update(is_default=False)
-        serializer.save(user=self.request.user)
+        # (one default per user is enforced by the database).
+        with transaction.atomic():
+            if serializer.validated_data.get('is_default', False):
+                Address.objects.filter(user=self.request.user, is_default=True).update(is_default=False)
+            serializer.save(user=self.request.user)
     
 class AddressUpdateDeleteView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = AddressSerializer
@@ -194,9 +259,10 @@ class AddressUpdateDeleteView(generics.RetrieveUpdateDestroyAPIView):
         return Address.objects.filter(user=self.request.user)
 
     def perform_update(self, serializer):
-        if serializer.validated_data.get('is_default', False):
-            Address.objects.filter(user=self.request.user, is_default=True).update(is_default=False)
-        serializer.save()
+        with transaction.atomic():
+            if serializer.validated_data.get('is_default', False):
+                Address.objects.filter(user=self.request.user, is_default=True).update(is_default=False)
+            serializer.save()
 
 class SetDefaultAddressView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -207,11 +273,54 @@ class SetDefaultAddressView(APIView):
         except Address.DoesNotExist:
             return Response({"error": "Address not found"}, status=status.HTTP_404_NOT_FOUND)
         
-        # Unset old default
-        Address.objects.filter(user=request.user, is_default=True).update(is_default=False)
-
-        # Set new default
-        address.is_default = True
-        address.save()
-
-        return Response({"message": "Default address set"}, status=status.HTTP_200_OK)
\ No newline at end of file
+        with transaction.atomic():
+            # Unset old default
+            Address.objects.filter(user=request.user, is_default=True).update(is_default=False)
+
+            # Set new default
+            address.is_default = True
+            address.save()
+
+        return Response({"message": "Default address set"}, status=status.HTTP_200_OK)
+
+
+class OrderExportView(ExportView):
+    permission_classes = [IsAdmin]
+    export = ORDER_EXPORT
+
+
+class SalesAnalyticsViewSet(viewsets.ViewSet):
+    """
+    Sales reports for admins, read from the daily SalesRollup table. Each
+    takes ?start= and ?end= (inclusive dates, the last 30 days by default).
+    """
+    permission_classes = [IsAdmin]
+
+    def get_query(self, request):
+        query = SalesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return query.validated_data
+
+    def report(self, query, results):
+        return Response({'start': query['start'], 'end': query['end'], 'results': results.data})
+
+    @action(detail=False, methods=['get'])
+    def revenue(self, request):
+        """Units and revenue per ?period=day|week|month."""
+        query = self.get_query(request)
+        rows = analytics.revenue_by_period(query['start'], query['end'], query['period'])
+        return self.report(query, PeriodSalesSerializer(rows, many=True))
+
+    @action(detail=False, methods=['get'], url_path='top-products')
+    def top_products(self, request):
+        """The ?limit= best-selling products by ?order_by=revenue|quantity."""
+        query = self.get_query(request)
+        rows = analytics.top_products(query['start'], query['end'], query['limit'], query['order_by'])
+        return self.report(query, ProductSalesSerializer(rows, many=True))
+
+    @action(detail=False, methods=['get'])
+    def categories(self, request):
+        """Units and revenue per product category, by ?order_by=revenue|quantity."""
+        query = self.get_query(request)
+        rows = analytics.revenue_by_category(query['start'], query['end'], query['order_by'])
+        return self.report(query, CategorySalesSerializer(rows, many=True))
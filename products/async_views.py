@@ -0,0 +1,79 @@
+"""
+Async variants of the catalogue read endpoints; see ecommerce/asyncviews.py.
+Each one produces what the DRF view of the same route would, byte for byte.
+"""
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404
+from rest_framework.response import Response
+
+from ecommerce.asyncviews import AsyncReadView
+from ecommerce.fields import selected_fields
+from .cache import acached_response, detail_stamp, list_stamp
+from .rendering import LIST_RENDITIONS, PRODUCT_FIELDS, arender_products, product_rows
+from .views import CategoryViewSet, ProductViewSet, ReviewListCreateView
+
+
+class AsyncProductListView(AsyncReadView):
+    view_class = ProductViewSet
+    actions = {'get': 'list', 'post': 'create'}
+    # ProductFilter filters that look something up while the queryset is
+    # built; a request using one filters in a thread.
+    querying_filters = ('category_tree',)
+
+    async def read(self, view, request):
+        return await acached_response(list_stamp(request), self.render_list, request, view)
+
+    async def render_list(self, request, view):
+        queryset = view.get_queryset()
+        if any(name in request.query_params for name in self.querying_filters):
+            queryset = await sync_to_async(view.filter_queryset)(queryset)
+        else:
+            queryset = view.filter_queryset(queryset)
+        fields = selected_fields(request, PRODUCT_FIELDS)
+        rows = product_rows(queryset, columns=view.sort_columns(queryset), fields=fields)
+        page = await view.paginator.apaginate_queryset(rows, request, view)
+        return view.get_paginated_response(
+            await arender_products(page, request, fields=fields, renditions=LIST_RENDITIONS)
+        )
+
+
+class AsyncProductDetailView(AsyncReadView):
+    view_class = ProductViewSet
+    actions = {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}
+
+    async def read(self, view, request, pk):
+        return await acached_response(detail_stamp(pk, request), self.render_detail, request, view, pk)
+
+    async def render_detail(self, request, view, pk):
+        fields = selected_fields(request, PRODUCT_FIELDS)
+        rows = product_rows(view.filter_queryset(view.get_queryset()), fields=fields)
+        row = await aget_object_or_404(rows, pk=pk)
+        return Response((await arender_products([row], request, fields=fields))[0])
+
+
+class AsyncCategoryListView(AsyncReadView):
+    view_class = CategoryViewSet
+    actions = {'get': 'list', 'post': 'create'}
+
+    async def read(self, view, request):
+        categories = [category async for category in view.filter_queryset(view.get_queryset())]
+        return Response(view.get_serializer(categories, many=True).data)
+
+
+class AsyncCategoryDetailView(AsyncReadView):
+    view_class = CategoryViewSet
+    actions = {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}
+
+    async def read(self, view, request, pk):
+        category = await aget_object_or_404(view.filter_queryset(view.get_queryset()), pk=pk)
+        view.check_object_permissions(request, category)
+        return Response(view.get_serializer(category).data)
+
+
+class AsyncReviewListView(AsyncReadView):
+    view_class = ReviewListCreateView
+
+    async def read(self, view, request, product_id):
+        queryset = view.filter_queryset(view.get_queryset())
+        page = await view.paginator.apaginate_queryset(queryset, request, view)
+        return view.get_paginated_response(view.get_serializer(page, many=True).data)
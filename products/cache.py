@@ -0,0 +1,157 @@
+"""
+Versioned read-through cache for catalogue responses.
+
+Nothing is ever deleted from the cache. Instead, every key embeds one or
+more version counters and writes bump the counters, so stale entries simply
+stop being addressed and age out. Three kinds of counter exist:
+
+* ``catalogue`` - bumped by any catalogue write; list pages depend on it.
+* ``product:<pk>`` - bumped by writes to a product, its images or reviews.
+* ``taxonomy`` - bumped by category writes and bulk changes, which may alter
+  any product's representation.
+
+The same counters form the ETag, so conditional requests are answered with
+a 304 from the cache alone. Responses carry absolute URLs (images,
+pagination links), so keys and ETags also identify the scheme and host.
+
+Counters live as long as the entries they address (CATALOGUE_CACHE_TIMEOUT),
+so requests for ids that do not exist leave nothing behind for good.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import Http404
+from django.utils.http import parse_etags, urlencode
+from rest_framework import status
+from rest_framework.response import Response
+
+CATALOGUE_VERSION = 'catalogue:version'
+TAXONOMY_VERSION = 'catalogue:taxonomy-version'
+
+
+def get_cache():
+    return caches[settings.CATALOGUE_CACHE_ALIAS]
+
+
+def product_version_key(pk):
+    return f"catalogue:product-version:{pk}"
+
+
+def get_versions(*keys):
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Seed from the clock rather than 1 so a counter that was evicted
+            # never comes back at a value that older entries were stored under.
+            cache.add(key, time.time_ns(), settings.CATALOGUE_CACHE_TIMEOUT)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _bump(*keys):
+    cache = get_cache()
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), settings.CATALOGUE_CACHE_TIMEOUT)
+
+
+def bump_product(pk):
+    """Invalidate one product and every list page, once the write commits."""
+    transaction.on_commit(lambda: _bump(product_version_key(pk), CATALOGUE_VERSION))
+
+
+def invalidate_catalogue():
+    """Invalidate every cached catalogue response, once the write commits."""
+    transaction.on_commit(lambda: _bump(TAXONOMY_VERSION, CATALOGUE_VERSION))
+
+
+def origin(request):
+    return f"{request.scheme}://{request.get_host()}"
+
+
+def list_stamp(request):
+    """(cache key, ETag) for a catalogue list request."""
+    params = request.query_params
+    query = urlencode(sorted((key, value) for key in params for value in params.getlist(key)))
+    digest = hashlib.sha1(f"{origin(request)}?{query}".encode()).hexdigest()
+    version, = get_versions(CATALOGUE_VERSION)
+    return f"catalogue:list:{version}:{digest}", f'"{version}-{digest[:16]}"'
+
+
+def detail_stamp(pk, request):
+    """
+    (cache key, ETag) for a single product, in the fields the request
+    selects. Raises Http404 for a pk not spelled the way writes bump it
+    (04, +4), whose entry no write would ever invalidate.
+    """
+    try:
+        canonical = str(int(pk)) == str(pk)
+    except ValueError:
+        canonical = False
+    if not canonical:
+        raise Http404
+    product_version, taxonomy_version = get_versions(product_version_key(pk), TAXONOMY_VERSION)
+    params = request.query_params
+    selection = urlencode([(name, params[name]) for name in ('fields', 'omit') if name in params])
+    digest = hashlib.sha1(f"{origin(request)}?{selection}".encode()).hexdigest()
+    stamp = f"{pk}-{product_version}-{taxonomy_version}-{digest[:16]}"
+    return f"catalogue:product:{stamp}", f'"{stamp}"'
+
+
+class CatalogueCacheMixin:
+    """Serve list() and retrieve() through the versioned catalogue cache."""
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(list_stamp(request), super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        stamp = detail_stamp(kwargs[self.lookup_url_kwarg or self.lookup_field], request)
+        return self.cached_response(stamp, super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, stamp, render, request, *args, **kwargs):
+        key, etag = stamp
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        cache = get_cache()
+        data = cache.get(key)
+        if data is None:
+            response = render(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cache.set(key, response.data, settings.CATALOGUE_CACHE_TIMEOUT)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        return response
+
+
+async def acached_response(stamp, render, request, *args, **kwargs):
+    """
+    CatalogueCacheMixin.cached_response() for async views, where `render` is
+    a coroutine function. The cache is read through its synchronous API,
+    like the version counters: Django's async cache methods run that same
+    code in a thread.
+    """
+    key, etag = stamp
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+    cache = get_cache()
+    data = cache.get(key)
+    if data is None:
+        response = await render(request, *args, **kwargs)
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        cache.set(key, response.data, settings.CATALOGUE_CACHE_TIMEOUT)
+    else:
+        response = Response(data)
+    response['ETag'] = etag
+    return response
+
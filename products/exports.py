@@ -0,0 +1,30 @@
+from ecommerce.export import Export
+from .models import Product, Review
+
+PRODUCT_EXPORT = Export('products', Product.objects.order_by('id'), {
+    'id': 'id',
+    'sku': 'sku',
+    'name': 'name',
+    'description': 'description',
+    'price': 'price',
+    'stock': 'stock',
+    'reserved': 'reserved',
+    'category_id': 'category_id',
+    'category': 'category__name',
+    'rating_avg': 'rating_avg',
+    'rating_count': 'rating_count',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+})
+
+REVIEW_EXPORT = Export('reviews', Review.objects.order_by('id'), {
+    'id': 'id',
+    'product_id': 'product_id',
+    'user_id': 'user_id',
+    'rating': 'rating',
+    'comment': 'comment',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+})
+
+CATALOGUE_EXPORTS = {export.name: export for export in (PRODUCT_EXPORT, REVIEW_EXPORT)}
@@ -1,19 +1,35 @@
 import django_filters
-from .models import Product
+from django.db.models import F
+from .models import Category, Product
 
 class ProductFilter(django_filters.FilterSet):
     min_price = django_filters.NumberFilter(field_name="price", lookup_expr="gte")
     max_price = django_filters.NumberFilter(field_name="price", lookup_expr="lte")
     in_stock = django_filters.BooleanFilter(method="filter_in_stock")
     category = django_filters.NumberFilter(field_name="category__id")
+    category_tree = django_filters.NumberFilter(method="filter_category_tree")
+    min_rating = django_filters.NumberFilter(field_name="rating_avg", lookup_expr="gte")
+    ordering = django_filters.OrderingFilter(
+        fields=(
+            ('rating_avg', 'rating'),
+            ('price', 'price'),
+            ('created_at', 'created_at'),
+        )
+    )
 
     class Meta:
         model = Product
-        fields = ['min_price', 'max_price', 'in_stock', 'category']
+        fields = ['min_price', 'max_price', 'in_stock', 'category', 'category_tree', 'min_rating']
 
     def filter_in_stock(self, queryset, name, value):
+        # Reserved units are held by pending orders: in stock means some are left to sell.
         if value:
-            return queryset.filter(stock__gt=0)
+            return queryset.filter(stock__gt=F('reserved'))
         return queryset
 
-
+    def filter_category_tree(self, queryset, name, value):
+        # Products in the category or any of its descendants.
+        path = Category.objects.filter(pk=value).values_list('path', flat=True).first()
+        if path is None:
+            return queryset.none()
+        return queryset.filter(category__in=Category.objects.subtree(path))
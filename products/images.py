@@ -0,0 +1,137 @@
+"""
+Resized renditions of uploaded product images.
+
+An upload is stored as it is and answered straight away. Its renditions are
+made once the upload commits, on a pool of PRODUCT_IMAGE_WORKERS threads
+(Pillow releases the GIL while it decodes, resizes and encodes): every size
+in RENDITIONS, as WebP and as JPEG, saved to the image field's storage
+(products.storage, so renditions of identical uploads are stored once).
+ProductImage.renditions then records their paths and dimensions and
+processed_at is set; products/rendering.py turns them into URLs.
+
+Images left without renditions, by a restart or by a catalogue import, are
+processed by `manage.py process_product_images` (process_images()).
+"""
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .cache import bump_product
+from .models import ImageBlob, ProductImage, rendition_files
+
+logger = logging.getLogger(__name__)
+
+# The longest edge of each rendition in pixels; images are never enlarged.
+RENDITIONS = {'thumbnail': 160, 'card': 480, 'full': 1280}
+
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+
+def make_renditions(image):
+    """Save the renditions of the ProductImage `image`; return what its renditions field should hold."""
+    storage = image.image.storage
+    sizes = sorted(RENDITIONS.items(), key=lambda item: item[1], reverse=True)
+    renditions = {}
+    with image.image.open('rb') as file, Image.open(file) as original:
+        # Lets a JPEG decode at a fraction of its size when that is still large enough.
+        original.draft('RGB', (sizes[0][1], sizes[0][1]))
+        resized = ImageOps.exif_transpose(original)
+        if resized.mode not in ('RGB', 'RGBA'):
+            resized = resized.convert('RGBA' if resized.has_transparency_data else 'RGB')
+        # Largest first, each made from the one before: much cheaper than
+        # going back to the original every time, and just as sharp.
+        for name, size in sizes:
+            resized = resized.copy()
+            resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+            rendition = renditions[name] = {'width': resized.width, 'height': resized.height}
+            for extension, (format, options) in FORMATS.items():
+                buffer = io.BytesIO()
+                (resized.convert('RGB') if format == 'JPEG' else resized).save(buffer, format, **options)
+                # The storage names it after its content; only the extension counts.
+                rendition[extension] = storage.save(f"{name}.{extension}", ContentFile(buffer.getvalue()))
+    return {name: renditions[name] for name in RENDITIONS}
+
+
+def process_image(pk):
+    """
+    Make the renditions of the ProductImage `pk`. Returns False when there
+    was nothing to do: the image is gone or another worker got there first.
+    """
+    image = ProductImage.objects.filter(pk=pk, processed_at__isnull=True).first()
+    if image is None:
+        return False
+    renditions = make_renditions(image) if image.image else {}
+    with transaction.atomic():
+        updated = ProductImage.objects.filter(pk=pk, processed_at__isnull=True).update(
+            renditions=renditions, processed_at=timezone.now()
+        )
+        if updated:
+            ImageBlob.objects.retain(rendition_files(renditions))
+    if not updated:
+        # Left to ImageBlob.objects.collect_garbage(): the blobs may be the other worker's too.
+        return False
+    # update() sends no post_save.
+    bump_product(image.product_id)
+    return True
+
+
+def try_process_image(pk):
+    """process_image(), logging a failure; the image stays pending."""
+    try:
+        return process_image(pk)
+    except Exception:
+        logger.exception("Could not make the renditions of product image %s", pk)
+        return False
+
+
+def _work(pk):
+    try:
+        return try_process_image(pk)
+    finally:
+        # Pool threads outlive requests; treat each image like one.
+        close_old_connections()
+
+
+def process_images(pks, workers):
+    """
+    Process the ProductImages `pks` on `workers` threads, or in this one
+    when `workers` is 0; return how many got renditions.
+    """
+    if not workers:
+        return sum(map(try_process_image, pks))
+    with ThreadPoolExecutor(workers, thread_name_prefix='product-images') as executor:
+        return sum(executor.map(_work, pks))
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(settings.PRODUCT_IMAGE_WORKERS, thread_name_prefix='product-images')
+        return _executor
+
+
+def schedule_renditions(pk):
+    """
+    Make the renditions of the ProductImage `pk` once the current
+    transaction commits: on the pool, or right away when
+    PRODUCT_IMAGE_WORKERS is 0.
+    """
+    if settings.PRODUCT_IMAGE_WORKERS:
+        transaction.on_commit(lambda: get_executor().submit(_work, pk))
+    else:
+        transaction.on_commit(lambda: try_process_image(pk))
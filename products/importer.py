@@ -0,0 +1,169 @@
+"""
+Bulk catalogue import from CSV or NDJSON.
+
+Rows are read one at a time from the file, validated with
+ProductImportSerializer and written in batches. For each batch, every
+category named in it is resolved with one lookup (creating the missing
+ones), products are upserted on `sku` with a single
+bulk_create(update_conflicts=True), images given in the batch replace the
+products' old ones, and the search index is refreshed for the batch. A row
+that fails validation is reported by line number and skipped; the rest of
+the file is still imported.
+"""
+import csv
+import json
+
+from django.db import DatabaseError, transaction
+from rest_framework.exceptions import ValidationError
+
+from .cache import invalidate_catalogue
+from .models import Category, ImageBlob, Product, ProductImage
+from .search import get_search_backend
+from .serializers import ProductImportSerializer
+from .suggest import discard_suggest_index
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+UPSERT_FIELDS = ['name', 'description', 'price', 'stock', 'category', 'updated_at']
+
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def fail(self, line, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.failed,
+            'errors': self.errors,
+        }
+
+
+def read_rows(file, format):
+    """Yield (line number, row dict) from a text file, or (line, None) for unparsable lines."""
+    if format == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            # Blank cells fall back to the column's default.
+            yield reader.line_num, {key: value for key, value in row.items() if key and value != ''}
+        return
+    for line_number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_number, row if isinstance(row, dict) else None
+
+
+class CatalogueImporter:
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.report = ImportReport()
+        # Category name -> id, filled as batches resolve them.
+        self.categories = {}
+        # One instance for every row: building a serializer deep-copies its
+        # fields, which would otherwise cost as much as the database work.
+        self.validator = ProductImportSerializer()
+
+    def run(self, file, format):
+        batch = []
+        for line, row in read_rows(file, format):
+            if row is None:
+                self.report.fail(line, {'non_field_errors': ["Not a JSON object."]})
+                continue
+            try:
+                data = self.validator.run_validation(row)
+            except ValidationError as exc:
+                self.report.fail(line, exc.detail)
+                continue
+            batch.append((line, data))
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+
+        invalidate_catalogue()
+        # Bulk writes bypass the signals that keep this process's suggest
+        # index current, so let it be rebuilt on next use.
+        discard_suggest_index()
+        return self.report
+
+    def import_batch(self, batch):
+        # A SKU repeated within one batch: the last row wins.
+        rows = {data['sku']: (line, data) for line, data in batch}
+        known_categories = dict(self.categories)
+        try:
+            with transaction.atomic():
+                self.resolve_categories(data['category'] for _, data in rows.values())
+                existing = set(Product.objects.filter(sku__in=rows).values_list('sku', flat=True))
+                products = Product.objects.bulk_create(
+                    [
+                        Product(
+                            sku=sku,
+                            name=data['name'],
+                            description=data['description'],
+                            price=data['price'],
+                            stock=data['stock'],
+                            category_id=self.categories[data['category'][-1]] if data['category'] else None,
+                        )
+                        for sku, (_, data) in rows.items()
+                    ],
+                    update_conflicts=True,
+                    unique_fields=['sku'],
+                    update_fields=UPSERT_FIELDS,
+                )
+                self.replace_images(products, rows)
+                get_search_backend().index([product.pk for product in products])
+        except DatabaseError as exc:
+            self.categories = known_categories
+            for line, _ in rows.values():
+                self.report.fail(line, {'non_field_errors': [f"Batch failed: {exc}"]})
+            return
+        self.report.updated += len(existing)
+        self.report.created += len(rows) - len(existing)
+
+    def resolve_categories(self, paths):
+        paths = [path for path in paths if path]
+        missing = {name for path in paths for name in path} - self.categories.keys()
+        if not missing:
+            return
+        self.categories.update(Category.objects.filter(name__in=missing).values_list('name', 'id'))
+        for path in paths:
+            parent_id = None
+            for name in path:
+                if name not in self.categories:
+                    self.categories[name] = Category.objects.create(name=name, parent_id=parent_id).pk
+                parent_id = self.categories[name]
+
+    def replace_images(self, products, rows):
+        images = {product.pk: rows[product.sku][1]['images'] for product in products}
+        images = {pk: names for pk, names in images.items() if names}
+        if not images:
+            return
+        ProductImage.objects.filter(product_id__in=images).delete()
+        ProductImage.objects.bulk_create(
+            ProductImage(product_id=pk, image=name) for pk, names in images.items() for name in names
+        )
+        # bulk_create() skips ProductImage.save(), which counts the blobs in use.
+        ImageBlob.objects.retain(name for names in images.values() for name in names)
+
+
+def import_catalogue(file, format, batch_size=DEFAULT_BATCH_SIZE):
+    """Import a text-mode CSV or NDJSON file and return its ImportReport."""
+    return CatalogueImporter(batch_size).run(file, format)
+
+
+def guess_format(filename):
+    return 'ndjson' if filename.lower().endswith(('.ndjson', '.jsonl', '.json')) else 'csv'
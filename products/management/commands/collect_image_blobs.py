@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from products.models import ImageBlob
+
+
+class Command(BaseCommand):
+    help = "Delete the content-addressed product image files no image or rendition uses any more."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours', type=float, default=24,
+            help="Spare files saved within this many hours, which an upload may be about to use (default: 24).",
+        )
+
+    def handle(self, *args, **options):
+        deleted, freed = ImageBlob.objects.collect_garbage(timedelta(hours=options['grace_hours']))
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} unreferenced image files, freeing {freed} bytes."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from products.exports import CATALOGUE_EXPORTS
+
+
+class Command(BaseCommand):
+    help = "Stream the product catalogue or the reviews as CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(CATALOGUE_EXPORTS))
+        parser.add_argument('--format', choices=['csv', 'ndjson'], default='csv')
+        parser.add_argument('--output', help="File to write to; standard output by default.")
+
+    def handle(self, *args, **options):
+        export = CATALOGUE_EXPORTS[options['dataset']]
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as file:
+                export.write(file, options['format'])
+        else:
+            export.write(self.stdout, options['format'])
@@ -0,0 +1,30 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importer import DEFAULT_BATCH_SIZE, guess_format, import_catalogue
+
+
+class Command(BaseCommand):
+    help = "Upsert products (by sku), their categories and image references from a CSV or NDJSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help="Guessed from the file extension by default.")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        format = options['format'] or guess_format(options['path'])
+        try:
+            with open(options['path'], newline='', encoding='utf-8') as file:
+                report = import_catalogue(file, format, batch_size=options['batch_size'])
+        except (OSError, UnicodeDecodeError) as exc:
+            raise CommandError(exc)
+
+        for error in report.errors:
+            self.stderr.write(f"line {error['line']}: {json.dumps(error['errors'])}")
+        style = self.style.WARNING if report.failed else self.style.SUCCESS
+        self.stdout.write(style(
+            f"Imported {report.created + report.updated} products "
+            f"({report.created} created, {report.updated} updated), {report.failed} rows failed."
+        ))
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from products.images import process_images
+from products.models import ProductImage
+
+
+class Command(BaseCommand):
+    help = "Make the resized renditions of product images that do not have them yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.PRODUCT_IMAGE_WORKERS,
+            help="Threads processing images (default: PRODUCT_IMAGE_WORKERS); 0 processes them in turn.",
+        )
+
+    def handle(self, *args, **options):
+        pending = list(ProductImage.objects.filter(processed_at__isnull=True).order_by('id').values_list('id', flat=True))
+        processed = process_images(pending, options['workers'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Made renditions for {processed} of {len(pending)} pending images; failures are logged."
+        ))
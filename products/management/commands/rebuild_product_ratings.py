@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from products.cache import invalidate_catalogue
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized rating_sum/rating_count columns on Product from Review."
+
+    def handle(self, *args, **options):
+        updated = Product.objects.rebuild_rating_aggregates()
+        invalidate_catalogue()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating aggregates for {updated} products."))
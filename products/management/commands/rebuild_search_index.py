@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.cache import invalidate_catalogue
+from products.models import Product
+from products.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product full-text search index from the Product table."
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        with transaction.atomic():
+            backend.rebuild()
+            invalidate_catalogue()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt the {type(backend).__name__} index for {Product.objects.count()} products."
+        ))
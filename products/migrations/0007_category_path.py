@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:18
+
+from django.db import migrations, models
+
+PATH_STEP = 10
+
+
+def build_category_paths(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    children = {}
+    for pk, parent_id in Category.objects.values_list('pk', 'parent_id'):
+        children.setdefault(parent_id, []).append(pk)
+
+    paths, pending = {}, [(pk, '') for pk in children.get(None, [])]
+    while pending:
+        pk, parent_path = pending.pop()
+        paths[pk] = f"{parent_path}{pk:0{PATH_STEP}d}"
+        pending.extend((child, paths[pk]) for child in children.get(pk, []))
+
+    categories = [Category(pk=pk, path=path) for pk, path in paths.items()]
+    Category.objects.bulk_update(categories, ['path'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_reserved'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(build_category_paths, migrations.RunPython.noop),
+    ]
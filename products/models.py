@@ -1,5 +1,32 @@
-from django.db import models
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models, transaction
+from django.db.models import Case, Count, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Concat, Substr
 from django.conf import settings
+from django.utils import timezone
+
+from .storage import product_image_storage
+
+PATH_STEP = 10  # digits per level of Category.path
+
+
+def path_successor(path):
+    """The smallest path that sorts after every path starting with `path`."""
+    return str(int(path) + 1).zfill(len(path))
+
+
+class CategoryQuerySet(models.QuerySet):
+    def subtree(self, path):
+        """
+        The category at `path` and all of its descendants. Paths are
+        digit-only, so the prefix match is a plain range over the path
+        index on every backend and collation.
+        """
+        return self.filter(path__gte=path, path__lt=path_successor(path))
+
 
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -10,36 +37,259 @@ class Category(models.Model):
             null=True,
             blank=True
         )
+    # Materialized path: the zero-padded ids of every ancestor and then
+    # this category, PATH_STEP digits each. Maintained by save().
+    path = models.CharField(max_length=255, db_index=True, editable=False, default='')
+
+    objects = CategoryQuerySet.as_manager()
 
     def __str__(self):
         return self.name
 
+    @staticmethod
+    def build_path(parent_path, pk):
+        return f"{parent_path}{pk:0{PATH_STEP}d}"
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            old_path = Category.objects.filter(pk=self.pk).values_list('path', flat=True).first()
+            super().save(*args, **kwargs)
+            parent_path = ''
+            if self.parent_id:
+                parent_path = Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).get()
+            self.path = self.build_path(parent_path, self.pk)
+            if self.path != old_path:
+                Category.objects.filter(pk=self.pk).update(path=self.path)
+            if old_path and self.path != old_path:
+                # Moved: re-root every descendant in one UPDATE.
+                Category.objects.subtree(old_path).exclude(pk=self.pk).update(
+                    path=Concat(Value(self.path), Substr('path', len(old_path) + 1))
+                )
+
+    def is_ancestor_of(self, other):
+        return bool(self.path) and other.path.startswith(self.path)
+
+
+class ProductQuerySet(models.QuerySet):
+    def with_listing_data(self):
+        """
+        Everything ProductSerializer needs, fetched up front: the category
+        and images, so a page of products costs a fixed number of queries.
+        Rating aggregates live on the row itself (see adjust_rating).
+        """
+        return self.select_related('category').prefetch_related('images', 'category__subcategories')
+
+    def adjust_rating(self, rating_delta, count_delta=0):
+        """Atomically shift the denormalized rating aggregates."""
+        return self.update(
+            rating_sum=F('rating_sum') + rating_delta,
+            rating_count=F('rating_count') + count_delta,
+        )
+
+    def rebuild_rating_aggregates(self):
+        """Recompute rating_sum/rating_count from Review in one statement."""
+        reviews = Review.objects.filter(product=OuterRef('pk')).order_by().values('product')
+        return self.update(
+            rating_sum=Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total')), 0),
+            rating_count=Coalesce(Subquery(reviews.annotate(total=Count('id')).values('total')), 0),
+        )
+
 
 class Product(models.Model):
+    # Natural key that catalogue imports upsert on; optional for products
+    # created through the API.
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
+    # Units held by StockReservations of unpaid orders; see orders.services.
+    reserved = models.PositiveIntegerField(default=0, editable=False)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name="products")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Maintained incrementally by the review views, rebuilt by the
+    # rebuild_product_ratings command.
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_avg = models.GeneratedField(
+        expression=Case(
+            When(rating_count=0, then=Value(0.0)),
+            default=Cast('rating_sum', FloatField()) / F('rating_count'),
+            output_field=FloatField(),
+        ),
+        output_field=FloatField(),
+        db_persist=True,
+    )
+
+    objects = ProductQuerySet.as_manager()
 
+    class Meta:
+        indexes = [
+            # Keyset pagination pages over (sort key, id).
+            models.Index(fields=['rating_avg', 'id'], name='product_rating_avg_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_idx'),
+            models.Index(fields=['created_at', 'id'], name='product_created_idx'),
+            # ?in_stock=true pages over the products with stock left to sell only.
+            models.Index(fields=['-id'], condition=Q(stock__gt=F('reserved')), name='product_in_stock_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    @property
+    def available_stock(self):
+        return max(self.stock - self.reserved, 0)
+
+
+class FullTextMatch(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", lhs_params + rhs_params
+
+
+class ProductSearchEntry(models.Model):
+    """
+    A row of the SQLite FTS5 table that products/search.py maintains. The
+    table is created by migration and only exists on SQLite; the model lets
+    searches join it to Product.
+    """
+    product = models.OneToOneField(
+        Product, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid',
+        db_constraint=False, related_name='search_entry',
+    )
+    # FTS5's hidden column named after the table, which MATCH runs against.
+    document = models.TextField(db_column='products_product_fts')
+    # bm25() with the weights configured by the migration; lower is better.
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'products_product_fts'
+
+
+ProductSearchEntry._meta.get_field('document').register_lookup(FullTextMatch)
+
+
+def rendition_files(renditions):
+    """The storage names in a ProductImage.renditions value."""
+    return [
+        value for rendition in renditions.values() for key, value in rendition.items() if key not in ('width', 'height')
+    ]
+
+
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="images")
-    image = models.ImageField(upload_to="product_images/")
+    image = models.ImageField(upload_to="product_images/", storage=product_image_storage)
     alt_text = models.CharField(max_length=255, blank=True)
+    # The resized copies products.images makes after upload, by name:
+    # {'thumbnail': {'width': ..., 'height': ..., 'webp': path, 'jpeg': path}, ...}
+    renditions = models.JSONField(default=dict, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The images still waiting for renditions.
+            models.Index(fields=['id'], condition=Q(processed_at__isnull=True), name='productimage_pending_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        image = super().from_db(db, field_names, values)
+        if not image.get_deferred_fields().intersection(('image', 'renditions')):
+            image._loaded_files = image.stored_files()
+        return image
+
+    def stored_files(self):
+        """The blobs this image uses: its original and its renditions."""
+        return ([self.image.name] if self.image else []) + rendition_files(self.renditions)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not {'image', 'renditions'}.intersection(update_fields):
+            return super().save(*args, **kwargs)
+        if self._state.adding:
+            loaded = []
+        else:
+            loaded = getattr(self, '_loaded_files', None)
+            if loaded is None:
+                stored = ProductImage.objects.filter(pk=self.pk).first()
+                loaded = stored.stored_files() if stored is not None else []
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            files = self.stored_files()
+            ImageBlob.objects.retain((Counter(files) - Counter(loaded)).elements())
+            ImageBlob.objects.release((Counter(loaded) - Counter(files)).elements())
+        self._loaded_files = files
 
     def __str__(self):
         return f"Image for {self.product.name}"
 
+
+class ImageBlobQuerySet(models.QuerySet):
+    def retain(self, names):
+        """Count a reference to each of `names` that is a blob, once per occurrence."""
+        counts = self._blob_counts(names)
+        self.bulk_create([ImageBlob(name=name) for name in counts], ignore_conflicts=True)
+        self._add(counts, 1)
+
+    def release(self, names):
+        self._add(self._blob_counts(names), -1)
+
+    def _blob_counts(self, names):
+        storage = product_image_storage()
+        return Counter(name for name in names if storage.is_blob(name))
+
+    def _add(self, counts, sign):
+        by_count = defaultdict(list)
+        for name, count in counts.items():
+            by_count[count].append(name)
+        for count, names in by_count.items():
+            self.filter(name__in=names).update(references=F('references') + sign * count)
+
+    def collect_garbage(self, grace=timedelta(days=1)):
+        """
+        Delete the blobs nothing references, counted down to 0 or never
+        counted (an upload whose row was not saved), once they have gone
+        `grace` without being saved again. Returns (blobs deleted, bytes freed).
+        """
+        storage = product_image_storage()
+        since = timezone.now() - grace
+        deleted, freed = 0, 0
+        for names in storage.blobs():
+            referenced = set(self.filter(name__in=names, references__gt=0).values_list('name', flat=True))
+            for name in set(names) - referenced:
+                # Counted again since the directory was read.
+                if self.filter(name=name, references__gt=0).exists():
+                    continue
+                size = storage.collect(name, since)
+                if size is not None:
+                    self.filter(name=name, references__lte=0).delete()
+                    deleted, freed = deleted + 1, freed + size
+        return deleted, freed
+
+
+class ImageBlob(models.Model):
+    """
+    A file in the content-addressed product image storage (products.storage)
+    and the number of ProductImage originals and renditions using it.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    references = models.IntegerField(default=0)
+
+    objects = ImageBlobQuerySet.as_manager()
+
+    def __str__(self):
+        return self.name
+
+
 class Review(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="reviews")
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    rating = models.IntegerField()
+    rating = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
     comment = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -47,6 +297,9 @@ class Review(models.Model):
     class Meta:
         unique_together = ('product', 'user') # one review per user per product
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['product', '-created_at', '-id'], name='review_product_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.product.name} ({self.rating})"
@@ -60,6 +313,9 @@ class WishlistItem(models.Model):
     class Meta:
         unique_together = ('user', 'product') # one product per user
         ordering = ['-added_at']
+        indexes = [
+            models.Index(fields=['user', '-added_at', '-id'], name='wishlist_user_added_idx'),
+        ]
 
 
     def __str__(self):
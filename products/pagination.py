@@ -0,0 +1,27 @@
+from ecommerce.pagination import KeysetPagination
+from .filters import ProductFilter
+
+
+class ProductPagination(KeysetPagination):
+    """
+    Keyset pagination over the catalogue. Honours ProductFilter's
+    `ordering` parameter by paging over (sort key, id) instead of (id), and
+    pages full-text search results by relevance unless told otherwise.
+    """
+    ordering = ('-id',)
+
+    def get_ordering(self, request, queryset, view):
+        param_map = ProductFilter.base_filters['ordering'].param_map
+        requested = request.query_params.get('ordering', '').split(',')[0].strip()
+        field = param_map.get(requested.lstrip('-'))
+        if field is None:
+            if 'search_rank' in queryset.query.annotations:
+                return ('-search_rank', '-id')
+            return self.ordering
+        if requested.startswith('-'):
+            return (f"-{field}", '-id')
+        return (field, 'id')
+
+
+class WishlistPagination(KeysetPagination):
+    ordering = ('-added_at', '-id')
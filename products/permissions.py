@@ -10,3 +10,12 @@ class IsAdminOrReadOnly(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
         return request.user and request.user.is_authenticated and request.user.is_admin
+
+
+class IsAdmin(permissions.BasePermission):
+    """
+    Only admins, for every method.
+    """
+
+    def has_permission(self, request, view):
+        return request.user and request.user.is_authenticated and request.user.is_admin
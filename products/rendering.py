@@ -0,0 +1,269 @@
+"""
+Read-only fast path for rendering products.
+
+ProductSerializer builds a serializer tree per product and introspects its
+fields for every row, which dominates the CPU cost of list pages. Here the
+same JSON is assembled from plain values() rows instead:
+
+* product_rows() turns a Product queryset (or, with a prefix, a queryset of
+  a model that points at Product) into a values() queryset with every
+  column the representation needs, its category's included.
+* related_querysets() returns the two queries for a page of rows: images
+  and subcategory names.
+* format_products() builds the dicts, formatting values with the same DRF
+  field instances ProductSerializer uses, so the output is byte-identical.
+  Images carry the renditions asked for (see products/images.py): list
+  pages ask for LIST_RENDITIONS only.
+
+render_products() runs the three in order, and arender_products() does for
+async views, fetching with the async ORM. Keeping fetching apart from
+formatting lets callers that fetch differently reuse the formatting. All
+three take the `fields` to render (see ecommerce/fields.py), and leave out
+the columns, join and queries that the other fields would need.
+
+summary_rows() and format_summaries() do the same for
+ProductSummarySerializer, the form nested in wishlist items by default; the
+primary image comes along as a subquery, so a page is a single query.
+"""
+from collections import defaultdict
+from functools import cache, partial
+from operator import itemgetter
+
+from django.db.models import OuterRef, Subquery
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from ecommerce.fields import selected_fields
+from .models import Category, ProductImage
+
+# The values() columns behind each field of ProductSerializer's representation.
+FIELD_COLUMNS = {
+    'id': ('id',),
+    'sku': ('sku',),
+    'name': ('name',),
+    'description': ('description',),
+    'price': ('price',),
+    'stock': ('stock',),
+    'category': ('category_id', 'category__name', 'category__parent_id'),
+    'images': (),
+    'average_rating': ('rating_avg',),
+    'review_count': ('rating_count',),
+    'created_at': ('created_at',),
+    'updated_at': ('updated_at',),
+}
+PRODUCT_FIELDS = tuple(FIELD_COLUMNS)
+
+
+SUMMARY_COLUMNS = ('id', 'name', 'price', 'stock', 'reserved', 'primary_image')
+
+# The image renditions list endpoints show; a single product shows them all.
+LIST_RENDITIONS = ('thumbnail',)
+
+
+@cache
+def serializer_fields():
+    from .serializers import ProductSerializer, WishlistItemSerializer
+    fields = ProductSerializer().fields
+    return fields['price'], fields['created_at'], fields['updated_at'], WishlistItemSerializer().fields['added_at']
+
+
+def product_rows(queryset, prefix='', columns=(), fields=PRODUCT_FIELDS):
+    """
+    `queryset` as values() rows holding the columns `fields` need, each
+    behind `prefix` (e.g. 'product__' for wishlist items), plus the
+    queryset's own `columns`. A search_rank annotation is kept so it can
+    still be paged on.
+    """
+    extra = [name for name in ('search_rank',) if name in queryset.query.annotations]
+    product_columns = [f"{prefix}{column}" for field in ('id', *fields) for column in FIELD_COLUMNS[field]]
+    return queryset.prefetch_related(None).values(*dict.fromkeys([*columns, *product_columns, *extra]))
+
+
+def related_querysets(rows, prefix='', fields=PRODUCT_FIELDS):
+    """
+    The (images, subcategories) values_list querysets for a page of rows;
+    either is empty when `fields` does not show it.
+    """
+    images = subcategories = ()
+    if 'images' in fields:
+        product_ids = [row[f"{prefix}id"] for row in rows]
+        images = ProductImage.objects.filter(product_id__in=product_ids).values_list(
+            'product_id', 'id', 'image', 'alt_text', 'renditions'
+        )
+    if 'category' in fields:
+        category_ids = {row[f"{prefix}category_id"] for row in rows} - {None}
+        subcategories = Category.objects.filter(parent_id__in=category_ids).values_list('parent_id', 'name')
+    return images, subcategories
+
+
+def image_url(name, request):
+    # Mirrors rest_framework.fields.FileField.to_representation.
+    if not name:
+        return None
+    if not api_settings.UPLOADED_FILES_USE_URL:
+        return name
+    url = ProductImage._meta.get_field('image').storage.url(name)
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def format_renditions(renditions, request=None, names=None):
+    """ProductImage.renditions with URLs for paths, only those in `names` unless it is None."""
+    return {
+        name: {key: value if key in ('width', 'height') else image_url(value, request) for key, value in rendition.items()}
+        for name, rendition in renditions.items()
+        if names is None or name in names
+    }
+
+
+def format_products(rows, images, subcategories, request=None, prefix='', fields=PRODUCT_FIELDS, renditions=None):
+    """
+    ProductSerializer's representation of each row, from fetched images and
+    subcategories, with the image renditions named in `renditions` (all of
+    them when None).
+    """
+    price, created_at, updated_at, _ = serializer_fields()
+    images_by_product = defaultdict(list)
+    for product_id, pk, image, alt_text, stored in images:
+        images_by_product[product_id].append({
+            'id': pk, 'image': image_url(image, request), 'alt_text': alt_text,
+            'renditions': format_renditions(stored, request, renditions),
+        })
+    names_by_parent = defaultdict(list)
+    for parent_id, name in subcategories:
+        names_by_parent[parent_id].append(name)
+
+    def category(row):
+        category_id = row['category_id']
+        if category_id is None:
+            return None
+        return {
+            'id': category_id,
+            'name': row['category__name'],
+            'parent': row['category__parent_id'],
+            'subcategories': names_by_parent[category_id],
+        }
+
+    formatters = {
+        'id': itemgetter('id'),
+        'sku': itemgetter('sku'),
+        'name': itemgetter('name'),
+        'description': itemgetter('description'),
+        'price': lambda row: price.to_representation(row['price']),
+        'stock': itemgetter('stock'),
+        'category': category,
+        'images': lambda row: images_by_product[row['id']],
+        'average_rating': lambda row: float(row['rating_avg']),
+        'review_count': lambda row: int(row['rating_count']),
+        'created_at': lambda row: created_at.to_representation(row['created_at']),
+        'updated_at': lambda row: updated_at.to_representation(row['updated_at']),
+    }
+    selected = [(field, formatters[field]) for field in fields]
+    if prefix:
+        start = len(prefix)
+        rows = ({column[start:]: value for column, value in row.items() if column.startswith(prefix)} for row in rows)
+    return [{field: format(row) for field, format in selected} for row in rows]
+
+
+def render_products(rows, request=None, prefix='', fields=PRODUCT_FIELDS, renditions=None):
+    rows = list(rows)
+    images, subcategories = related_querysets(rows, prefix, fields)
+    return format_products(rows, images, subcategories, request, prefix, fields, renditions)
+
+
+async def arender_products(rows, request=None, prefix='', fields=PRODUCT_FIELDS, renditions=None):
+    """render_products() for a page of rows that is already fetched, in an async view."""
+    fetched = []
+    for queryset in related_querysets(rows, prefix, fields):
+        # () when not needed; a queryset's truth value would run it synchronously.
+        fetched.append([row async for row in queryset] if queryset != () else ())
+    return format_products(rows, *fetched, request, prefix, fields, renditions)
+
+
+def summary_rows(queryset, prefix='', columns=()):
+    """
+    Like product_rows(), for SUMMARY_COLUMNS: the product's oldest image is
+    annotated as `primary_image`, which the prefix does not apply to.
+    """
+    product = OuterRef(f"{prefix}id" if prefix else 'pk')
+    primary_image = ProductImage.objects.filter(product_id=product).order_by('id').values('image')[:1]
+    product_columns = [f"{prefix}{column}" for column in SUMMARY_COLUMNS if column != 'primary_image']
+    return queryset.prefetch_related(None).annotate(primary_image=Subquery(primary_image)).values(
+        *columns, *product_columns, 'primary_image'
+    )
+
+
+def format_summaries(rows, request=None, prefix=''):
+    """ProductSummarySerializer's representation of each summary_rows() row."""
+    price = serializer_fields()[0]
+    return [
+        {
+            'id': row[f"{prefix}id"],
+            'name': row[f"{prefix}name"],
+            'price': price.to_representation(row[f"{prefix}price"]),
+            'primary_image': image_url(row['primary_image'], request),
+            'in_stock': row[f"{prefix}stock"] > row[f"{prefix}reserved"],
+        }
+        for row in rows
+    ]
+
+
+WISHLIST_COLUMNS = ('id', 'user_id', 'added_at')
+WISHLIST_FIELDS = ('id', 'user', 'product', 'added_at')
+
+
+def wishlist_rows(queryset, expand=False, fields=WISHLIST_FIELDS):
+    if 'product' not in fields:
+        return queryset.values(*WISHLIST_COLUMNS)
+    if expand:
+        return product_rows(queryset, 'product__', WISHLIST_COLUMNS)
+    return summary_rows(queryset, 'product__', WISHLIST_COLUMNS)
+
+
+def render_wishlist_items(rows, request=None, expand=False, fields=WISHLIST_FIELDS):
+    """WishlistItemSerializer's representation of wishlist_rows(..., expand, fields)."""
+    rows = list(rows)
+    added_at = serializer_fields()[3]
+    if 'product' not in fields:
+        products = [None] * len(rows)
+    elif expand:
+        products = render_products(rows, request, prefix='product__', renditions=LIST_RENDITIONS)
+    else:
+        products = format_summaries(rows, request, prefix='product__')
+    items = (
+        {'id': row['id'], 'user': row['user_id'], 'product': product, 'added_at': added_at.to_representation(row['added_at'])}
+        for row, product in zip(rows, products)
+    )
+    return [{field: item[field] for field in fields} for item in items]
+
+
+class ProductRenderMixin:
+    """
+    list() and retrieve() through render_products() instead of the
+    serializer, for the fields the request selects. Writes still go through
+    serializer_class. The view's permissions must not depend on the object,
+    which is a dict here.
+    """
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        fields = selected_fields(request, PRODUCT_FIELDS)
+        rows = product_rows(queryset, columns=self.sort_columns(queryset), fields=fields)
+        page = self.paginate_queryset(rows)
+        render = partial(render_products, request=request, fields=fields, renditions=LIST_RENDITIONS)
+        if page is not None:
+            return self.get_paginated_response(render(page))
+        return Response(render(rows))
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        fields = selected_fields(request, PRODUCT_FIELDS)
+        rows = product_rows(self.filter_queryset(self.get_queryset()), fields=fields)
+        row = get_object_or_404(rows, **{self.lookup_field: kwargs[lookup_url_kwarg]})
+        return Response(render_products([row], request, fields=fields)[0])
+
+    def sort_columns(self, queryset):
+        """The columns the paginator reads each row's position from."""
+        if self.paginator is None:
+            return ()
+        return [field.lstrip('-') for field in self.paginator.get_ordering(self.request, queryset, self)]
@@ -0,0 +1,150 @@
+"""
+Full-text product search.
+
+ProductViewSet's `search` parameter goes through a backend chosen for the
+database vendor, or named by the PRODUCT_SEARCH_BACKEND setting:
+
+* SQLite: an FTS5 virtual table, products_product_fts, keyed by product id
+  and joined through the unmanaged ProductSearchEntry model.
+* PostgreSQL: a tsvector column, products_product.search_vector, with a GIN
+  index. It is created by migration and not declared on the model.
+
+Both are kept in sync from Product save/delete signals (see signals.py)
+and can be rebuilt with the rebuild_search_index command. Every term is
+matched as a prefix, so partial words work for autocomplete, and results
+are annotated with a `search_rank` (higher is more relevant) that
+ProductPagination orders by.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from rest_framework import filters
+
+from .models import Product
+
+MAX_TERMS = 8
+
+
+def tokenize(terms):
+    words = []
+    for term in terms:
+        words.extend(re.findall(r'\w+', term.lower()))
+    return words[:MAX_TERMS]
+
+
+class SimpleSearchBackend:
+    """Case-insensitive substring match with no ranking, for other databases."""
+
+    def search(self, queryset, words):
+        for word in words:
+            queryset = queryset.filter(Q(name__icontains=word) | Q(description__icontains=word))
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    def index(self, product_ids):
+        pass
+
+    def remove(self, product_ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class SQLiteSearchBackend(SimpleSearchBackend):
+    table = 'products_product_fts'
+
+    def match_expression(self, words):
+        return ' '.join(f'"{word}"*' for word in words)
+
+    def search(self, queryset, words):
+        # A join rather than a correlated subquery, so bm25() is computed
+        # once per match instead of re-running the MATCH for every row.
+        return queryset.filter(
+            search_entry__document__match=self.match_expression(words)
+        ).annotate(search_rank=-F('search_entry__rank'))
+
+    def index(self, product_ids):
+        product_ids = list(product_ids)
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid IN ({placeholders})", product_ids)
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, name, description) "
+                f"SELECT id, name, description FROM {Product._meta.db_table} WHERE id IN ({placeholders})",
+                product_ids,
+            )
+
+    def remove(self, product_ids):
+        product_ids = list(product_ids)
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid IN ({placeholders})", product_ids)
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, name, description) "
+                f"SELECT id, name, description FROM {Product._meta.db_table}"
+            )
+
+
+class PostgresSearchBackend(SimpleSearchBackend):
+    # The 'simple' configuration does not stem, so prefixes typed so far
+    # still match the indexed words.
+    vector = (
+        "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(description, '')), 'B')"
+    )
+
+    def search(self, queryset, words):
+        tsquery = ' & '.join(f"{word}:*" for word in words)
+        product_table = Product._meta.db_table
+        rank = RawSQL(
+            f"ts_rank({product_table}.search_vector, to_tsquery('simple', %s))",
+            (tsquery,),
+            output_field=FloatField(),
+        )
+        matches = RawSQL(
+            f"SELECT id FROM {product_table} WHERE search_vector @@ to_tsquery('simple', %s)",
+            (tsquery,),
+        )
+        return queryset.filter(id__in=matches).annotate(search_rank=rank)
+
+    def index(self, product_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {Product._meta.db_table} SET search_vector = {self.vector} WHERE id = ANY(%s)",
+                [list(product_ids)],
+            )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"UPDATE {Product._meta.db_table} SET search_vector = {self.vector}")
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_search_backend():
+    path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    return BACKENDS.get(connection.vendor, SimpleSearchBackend)()
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """SearchFilter that answers `?search=` from the full-text index."""
+
+    def filter_queryset(self, request, queryset, view):
+        words = tokenize(self.get_search_terms(request))
+        if not words:
+            return queryset
+        return get_search_backend().search(queryset, words)
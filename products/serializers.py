@@ -1,20 +1,36 @@
+from functools import partial
+from operator import attrgetter
+
 from rest_framework import serializers
+from ecommerce.fields import FieldSelectionMixin
 from .models import Product, Category, ProductImage, Review, WishlistItem
-from django.db.models import Avg
+from .rendering import format_renditions
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(FieldSelectionMixin, serializers.ModelSerializer):
     subcategories = serializers.StringRelatedField(many=True, read_only=True)
     class Meta:
         model = Category
         fields = ['id', 'name', 'parent', 'subcategories']
 
+    def validate_parent(self, parent):
+        if parent is not None and self.instance is not None:
+            if parent.pk == self.instance.pk or self.instance.is_ancestor_of(parent):
+                raise serializers.ValidationError("A category cannot be moved under itself.")
+        return parent
+
 class ProductImageSerializer(serializers.ModelSerializer):
+    renditions = serializers.SerializerMethodField()
+
     class Meta:
         model = ProductImage
-        fields = ['id', 'image', 'alt_text']
+        fields = ['id', 'image', 'alt_text', 'renditions']
+
+    def get_renditions(self, image):
+        # A 'renditions' context entry narrows them, as list endpoints do.
+        return format_renditions(image.renditions, self.context.get('request'), self.context.get('renditions'))
 
         
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     category_id = serializers.PrimaryKeyRelatedField(
             queryset=Category.objects.all(),
@@ -22,25 +38,70 @@ class ProductSerializer(serializers.ModelSerializer):
             write_only=True
         )
     images = ProductImageSerializer(many=True, read_only=True)
-    average_rating = serializers.SerializerMethodField()
+    average_rating = serializers.FloatField(source='rating_avg', read_only=True)
+    review_count = serializers.IntegerField(source='rating_count', read_only=True)
+
+    class Meta:
+        model = Product
+        fields = ['id', 'sku', 'name', 'description', 'price', 'stock', 'category', 'category_id', 'images', 'average_rating', 'review_count', 'created_at', 'updated_at']
+
+class ProductSummarySerializer(serializers.ModelSerializer):
+    """The compact form of a product nested in cart, order and wishlist items."""
+    primary_image = serializers.SerializerMethodField()
+    in_stock = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
-        fields = ['id', 'name', 'description', 'price', 'stock', 'category', 'category_id', 'images', 'average_rating', 'created_at', 'updated_at']
+        fields = ['id', 'name', 'price', 'primary_image', 'in_stock']
 
-    def get_average_rating(self, obj):
-        return obj.reviews.aggregate(Avg('rating'))['rating__avg'] or 0
-class ReviewSerializer(serializers.ModelSerializer):
+    def get_primary_image(self, product):
+        # The oldest image; picked from the prefetched images when there are any.
+        image = min(product.images.all(), key=attrgetter('pk'), default=None)
+        if image is None or not image.image:
+            return None
+        request = self.context.get('request')
+        return request.build_absolute_uri(image.image.url) if request is not None else image.image.url
+
+    def get_in_stock(self, product):
+        return product.available_stock > 0
+
+
+class ReviewSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
 
     class Meta:
         model = Review
         fields = ['id', 'product', 'user', 'rating', 'comment', 'created_at', 'updated_at']
+        read_only_fields = ['product']
 
-class WishlistItemSerializer(serializers.ModelSerializer):
-    product = ProductSerializer(read_only=True)
+class WishlistItemSerializer(FieldSelectionMixin, serializers.ModelSerializer):
+    product = ProductSummarySerializer(read_only=True)
     product_id = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all(), source='product', write_only=True)
 
     class Meta:
         model = WishlistItem
-        fields = ['id', 'user', 'product', 'product_id', 'added_at']
\ No newline at end of file
+        fields = ['id', 'user', 'product', 'product_id', 'added_at']
+
+    expandable_fields = {'product': partial(ProductSerializer, read_only=True)}
+
+
+class ProductImportSerializer(serializers.Serializer):
+    """One row of a catalogue import file; see products/importer.py."""
+    sku = serializers.CharField(max_length=64)
+    name = serializers.CharField(max_length=255)
+    description = serializers.CharField(required=False, allow_blank=True, default='')
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    stock = serializers.IntegerField(min_value=0, required=False, default=0)
+    # "Parent > Child"; missing categories are created.
+    category = serializers.CharField(required=False, allow_blank=True, default='')
+    # "a.jpg|b.jpg"; when given, replaces the product's images.
+    images = serializers.CharField(required=False, allow_blank=True, default='')
+
+    def validate_category(self, value):
+        names = [name.strip() for name in value.split('>')] if value.strip() else []
+        if any(not name or len(name) > 100 for name in names):
+            raise serializers.ValidationError("Use 'Parent > Child' with non-empty names of at most 100 characters.")
+        return names
+
+    def validate_images(self, value):
+        return [image.strip() for image in value.split('|') if image.strip()]
@@ -0,0 +1,70 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import cache
+from .models import Category, ImageBlob, Product, ProductImage, Review
+from .search import get_search_backend
+from .suggest import loaded_suggest_index
+
+SEARCHABLE_FIELDS = {'name', 'description'}
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, **kwargs):
+    cache.bump_product(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or SEARCHABLE_FIELDS & set(update_fields):
+        get_search_backend().index([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    get_search_backend().remove([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=ProductImage)
+@receiver([post_save, post_delete], sender=Review)
+def product_child_changed(sender, instance, **kwargs):
+    cache.bump_product(instance.product_id)
+
+
+@receiver(post_delete, sender=ProductImage)
+def release_image_files(sender, instance, **kwargs):
+    # Deleting a product deletes its images without calling their delete().
+    ImageBlob.objects.release(getattr(instance, '_loaded_files', None) or instance.stored_files())
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, instance, **kwargs):
+    cache.invalidate_catalogue()
+
+
+@receiver(post_save, sender=Product)
+def suggest_product(sender, instance, **kwargs):
+    index = loaded_suggest_index()
+    if index is not None:
+        pk, name, popularity = instance.pk, instance.name, instance.rating_count
+        transaction.on_commit(lambda: index.update('product', pk, name, popularity))
+
+
+@receiver(post_save, sender=Category)
+def suggest_category(sender, instance, **kwargs):
+    index = loaded_suggest_index()
+    if index is not None:
+        pk, name = instance.pk, instance.name
+        transaction.on_commit(
+            lambda: index.update('category', pk, name, Product.objects.filter(category_id=pk).count())
+        )
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+def unsuggest(sender, instance, **kwargs):
+    index = loaded_suggest_index()
+    if index is not None:
+        kind, pk = ('product' if sender is Product else 'category'), instance.pk
+        transaction.on_commit(lambda: index.remove(kind, pk))
@@ -0,0 +1,120 @@
+"""
+Content-addressed storage for product images and their renditions.
+
+ContentAddressedStorage keeps each file once, named after the SHA-256 of
+its content (product_images/ab/cd/abcd...<64 hex>.jpg), whatever name it
+was uploaded under. Saving content that is already stored writes nothing
+and returns the existing name. Names therefore never collide, and the
+content behind a name never changes, so serve_media() (and the web server
+or CDN in front of MEDIA_URL) can let clients cache the files for good.
+
+Blobs are shared, so nothing deletes one directly. ImageBlob counts the
+ProductImage images and renditions that use each one, and
+ImageBlob.objects.collect_garbage() (`manage.py collect_image_blobs`)
+deletes the blobs left unreferenced.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage, storages
+from django.views.static import serve
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def product_image_storage():
+    return storages['product_images']
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    # The name of a file being written, until it is complete.
+    TEMPORARY_PREFIX = '.upload-'
+
+    def __init__(self, prefix='product_images', **kwargs):
+        super().__init__(**kwargs)
+        self.prefix = prefix
+        self.blob_pattern = re.compile(
+            rf"{re.escape(prefix)}/([0-9a-f]{{2}})/([0-9a-f]{{2}})/\1\2[0-9a-f]{{60}}(\.\w+)?"
+        )
+
+    def blob_name(self, digest, extension=''):
+        return f"{self.prefix}/{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+    def is_blob(self, name):
+        return self.blob_pattern.fullmatch(name) is not None
+
+    def get_available_name(self, name, max_length=None):
+        # _save() names the file after its content; no name needs avoiding.
+        return name
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        name = self.blob_name(digest.hexdigest(), os.path.splitext(name)[1].lower())
+        path = self.path(name)
+        try:
+            # Touched so that collect_garbage(), which spares recent blobs,
+            # leaves it to the row about to reference it.
+            os.utime(path)
+            return name
+        except FileNotFoundError:
+            pass
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, self.directory_permissions_mode or 0o777, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=directory, prefix=self.TEMPORARY_PREFIX)
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            os.chmod(temporary, self.file_permissions_mode or 0o644)
+            # Readers see the whole file or none of it; a concurrent save of
+            # the same content replaces it with the same bytes.
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return name
+
+    def blobs(self):
+        """Every blob name in the storage, one first-level directory (ab/) at a time, as lists."""
+        if not self.exists(self.prefix):
+            return
+        for top in sorted(self.listdir(self.prefix)[0]):
+            names = []
+            for sub in sorted(self.listdir(f"{self.prefix}/{top}")[0]):
+                directory = f"{self.prefix}/{top}/{sub}"
+                names += [f"{directory}/{name}" for name in self.listdir(directory)[1]]
+            yield [name for name in names if self.is_blob(name)]
+
+    def collect(self, name, since):
+        """
+        Delete the blob `name` unless it was saved or touched after `since`
+        (an aware datetime); return its size if it was deleted. The file is
+        moved aside before its time is checked, so a save that touches it
+        meanwhile either counts as recent or finds it gone and writes it again.
+        """
+        path = self.path(name)
+        aside = os.path.join(os.path.dirname(path), f"{self.TEMPORARY_PREFIX}{os.path.basename(path)}")
+        try:
+            os.rename(path, aside)
+        except FileNotFoundError:
+            return None
+        stat = os.stat(aside)
+        if stat.st_mtime > since.timestamp():
+            os.replace(aside, path)
+            return None
+        os.remove(aside)
+        return stat.st_size
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """django.views.static.serve(), marking content-addressed files immutable."""
+    response = serve(request, path, document_root, show_indexes)
+    if product_image_storage().is_blob(path):
+        response['Cache-Control'] = IMMUTABLE
+    return response
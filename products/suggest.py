@@ -0,0 +1,215 @@
+"""
+In-process prefix index behind the product suggest endpoint.
+
+Product and category names are indexed at every word start, so "lam" finds
+"Desk lamp" and "desk la" finds it too. The entries live in one sorted
+array of integers, each packing a slot number and the offset of a word in
+that slot's name; a lookup is two bisects that compare name slices. Each
+slot holds a kind, id, name and popularity: a product's review count, or
+the number of products in a category.
+
+Prefixes matching more than SCAN_LIMIT entries keep their top results in a
+bounded cache, which updates patch in place rather than discard.
+
+The index is built on first use. Product and Category signals (see
+signals.py) update it once their transaction commits, which keeps the
+process that made the change current; other processes pick changes up when
+their index is older than SUGGEST_INDEX_MAX_AGE and gets rebuilt, serving
+the old one while the rebuild runs.
+"""
+import heapq
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Count
+
+from .models import Category, Product
+
+KEY_LENGTH = 64
+# Prefixes matching more entries than this have their top results cached.
+SCAN_LIMIT = 128
+MAX_CACHED_PREFIXES = 4096
+MAX_RESULTS = 20
+OFFSET_BITS = 16
+KINDS = ('product', 'category')
+
+WORD_START = re.compile(r'(?<!\w)\w')
+
+
+def slot_key(kind, pk):
+    return KINDS.index(kind) + 2 * pk
+
+
+def collapse(text):
+    return ' '.join(text.split())
+
+
+def normalize(text):
+    return collapse(text).lower()
+
+
+class SuggestIndex:
+    def __init__(self):
+        self.kinds, self.ids, self.popularity = bytearray(), array('q'), array('q')
+        self.names = []
+        # kind code + 2 * pk -> slot
+        self.slots = {}
+        self.free_slots = []
+        self.entries = array('q')
+        self.top = OrderedDict()
+        self.lock = threading.Lock()
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def build(cls):
+        index = cls()
+        products = Product.objects.values_list('id', 'name', 'rating_count')
+        categories = Category.objects.annotate(product_count=Count('products')).values_list(
+            'id', 'name', 'product_count'
+        )
+        for kind, rows in (('product', products.iterator(chunk_size=10000)), ('category', categories)):
+            for pk, name, popularity in rows:
+                index.slots[slot_key(kind, pk)] = len(index.names)
+                index.kinds.append(KINDS.index(kind))
+                index.ids.append(pk)
+                index.names.append(collapse(name))
+                index.popularity.append(popularity)
+        entries = [entry for slot in range(len(index.names)) for entry in index.entries_for(slot)]
+        entries.sort(key=index.key)
+        index.entries = array('q', entries)
+        return index
+
+    def is_stale(self):
+        return time.monotonic() - self.built_at > settings.SUGGEST_INDEX_MAX_AGE.total_seconds()
+
+    def key(self, entry):
+        offset = entry & ((1 << OFFSET_BITS) - 1)
+        return self.names[entry >> OFFSET_BITS][offset:offset + KEY_LENGTH].lower()
+
+    def entries_for(self, slot):
+        name = self.names[slot]
+        return [slot << OFFSET_BITS | match.start() for match in WORD_START.finditer(name[:1 << OFFSET_BITS])]
+
+    def suggest(self, query, limit=10):
+        """Up to `limit` {'type', 'id', 'name'} dicts, most popular first."""
+        prefix = normalize(query)[:KEY_LENGTH]
+        if not prefix:
+            return []
+        limit = min(limit, MAX_RESULTS)
+        with self.lock:
+            lo = bisect_left(self.entries, prefix, key=self.key)
+            hi = bisect_left(self.entries, prefix + '\U0010ffff', lo, key=self.key)
+            if hi - lo <= SCAN_LIMIT:
+                ranked = self.rank(lo, hi, limit)
+            else:
+                ranked = self.top.get(prefix)
+                if ranked is None:
+                    ranked = self.top[prefix] = self.rank(lo, hi, MAX_RESULTS)
+                    if len(self.top) > MAX_CACHED_PREFIXES:
+                        self.top.popitem(last=False)
+                else:
+                    self.top.move_to_end(prefix)
+            return [
+                {'type': KINDS[self.kinds[slot]], 'id': self.ids[slot], 'name': self.names[slot]}
+                for slot in ranked[:limit]
+            ]
+
+    def rank(self, lo, hi, limit):
+        # Ties keep index order, i.e. alphabetical by the matched words.
+        slots = dict.fromkeys(map(OFFSET_BITS.__rrshift__, self.entries[lo:hi]))
+        return heapq.nlargest(limit, slots, key=self.popularity.__getitem__)
+
+    def update(self, kind, pk, name, popularity):
+        with self.lock:
+            self._remove(kind, pk)
+            slot = self.free_slots.pop() if self.free_slots else len(self.names)
+            if slot == len(self.names):
+                for column in (self.kinds, self.ids, self.popularity):
+                    column.append(0)
+                self.names.append('')
+            self.kinds[slot], self.ids[slot] = KINDS.index(kind), pk
+            self.names[slot], self.popularity[slot] = collapse(name), popularity
+            self.slots[slot_key(kind, pk)] = slot
+            for entry in self.entries_for(slot):
+                key = self.key(entry)
+                self.entries.insert(bisect_left(self.entries, key, key=self.key), entry)
+                self.promote(slot, key)
+
+    def remove(self, kind, pk):
+        with self.lock:
+            self._remove(kind, pk)
+
+    def _remove(self, kind, pk):
+        slot = self.slots.pop(slot_key(kind, pk), None)
+        if slot is None:
+            return
+        for entry in self.entries_for(slot):
+            key = self.key(entry)
+            position = bisect_left(self.entries, key, key=self.key)
+            while self.entries[position] != entry:
+                position += 1
+            del self.entries[position]
+            self.demote(slot, key)
+        self.names[slot] = ''
+        self.free_slots.append(slot)
+
+    def promote(self, slot, key):
+        """Let a new or updated slot into the cached results it now beats."""
+        popularity = self.popularity[slot]
+        for end in range(1, len(key) + 1):
+            ranked = self.top.get(key[:end])
+            if ranked is None or slot in ranked:
+                continue
+            if len(ranked) < MAX_RESULTS or popularity > self.popularity[ranked[-1]]:
+                ranked.append(slot)
+                ranked.sort(key=self.popularity.__getitem__, reverse=True)
+                del ranked[MAX_RESULTS:]
+
+    def demote(self, slot, key):
+        """Drop cached results that listed a removed slot; they are re-ranked on next use."""
+        for end in range(1, len(key) + 1):
+            ranked = self.top.get(key[:end])
+            if ranked is not None and slot in ranked:
+                del self.top[key[:end]]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_suggest_index():
+    """
+    The process-wide index, built on first use and rebuilt when it is too
+    old. Only the first build makes callers wait: a rebuild runs in the
+    caller that finds the index stale, and the others keep answering from
+    the current index until the new one is swapped in.
+    """
+    global _index
+    index = _index
+    if index is not None and not index.is_stale():
+        return index
+    if index is not None and not _index_lock.acquire(blocking=False):
+        return index
+    if index is None:
+        _index_lock.acquire()
+    try:
+        if _index is None or _index.is_stale():
+            _index = SuggestIndex.build()
+        return _index
+    finally:
+        _index_lock.release()
+
+
+def loaded_suggest_index():
+    """The index if this process has built one, without building it."""
+    return _index
+
+
+def discard_suggest_index():
+    global _index
+    _index = None
@@ -1,3 +1,1143 @@
-from django.test import TestCase
+import csv
+import importlib
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, APITestCase
+
+import ecommerce.urls
+import orders.urls
+from ecommerce.queryplans import QueryPlans
+from users.serializers import ClaimsTokenObtainPairSerializer
+from . import urls
+
+from .models import Category, ImageBlob, Product, ProductImage, Review, WishlistItem
+from .cache import product_version_key
+from .images import RENDITIONS
+from .rendering import LIST_RENDITIONS, product_rows, render_products
+from .serializers import ProductSerializer, ReviewSerializer, WishlistItemSerializer
+from .storage import product_image_storage, serve_media
+from .suggest import SCAN_LIMIT, _index_lock, discard_suggest_index, get_suggest_index
+from .views import ProductDetailView, ReviewUpdateDeleteView
+
+User = get_user_model()
+
+PRODUCTS_URL = '/api/products/products/'
+
+
+def make_catalogue(count, category=None, reviewers=()):
+    products = []
+    for i in range(count):
+        product = Product.objects.create(
+            name=f"Product {i}", price='9.99', stock=5, category=category
+        )
+        ProductImage.objects.create(product=product, image=f"product_images/{i}.jpg")
+        for rating, user in enumerate(reviewers, start=1):
+            Review.objects.create(product=product, user=user, rating=rating)
+        products.append(product)
+    Product.objects.rebuild_rating_aggregates()
+    return products
+
+
+class CatalogueTestCase(APITestCase):
+    def setUp(self):
+        # Version bumps run on commit, which never happens inside a TestCase.
+        cache.clear()
+
+
+class ProductListingQueryTests(CatalogueTestCase):
+    # Listing a page must cost the same number of queries whatever its size.
+    MAX_LISTING_QUERIES = 4
+
+    def setUp(self):
+        super().setUp()
+        parent = Category.objects.create(name="Electronics")
+        self.category = Category.objects.create(name="Phones", parent=parent)
+        Category.objects.create(name="Cases", parent=self.category)
+        self.reviewers = [
+            User.objects.create_user(username=f"reviewer{i}", password="pass")
+            for i in range(2)
+        ]
+
+    def count_listing_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_listing_query_count_is_constant(self):
+        make_catalogue(2, self.category, self.reviewers)
+        small, _ = self.count_listing_queries(PRODUCTS_URL)
+        make_catalogue(10, self.category, self.reviewers)
+        large, _ = self.count_listing_queries(PRODUCTS_URL)
+
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, self.MAX_LISTING_QUERIES)
+
+    def test_list_create_view_query_count_is_constant(self):
+        make_catalogue(10, self.category, self.reviewers)
+        queries, _ = self.count_listing_queries('/api/products/')
+        self.assertLessEqual(queries, self.MAX_LISTING_QUERIES)
+
+    def test_in_stock_leaves_out_fully_reserved_products(self):
+        available, reserved, sold_out = make_catalogue(3)
+        Product.objects.filter(pk=reserved.pk).update(reserved=5)
+        Product.objects.filter(pk=sold_out.pk).update(stock=0)
+        response = self.client.get(PRODUCTS_URL, {'in_stock': 'true'})
+        self.assertEqual([product['id'] for product in response.data['results']], [available.pk])
+
+    def test_rating_annotations_are_serialized(self):
+        product, = make_catalogue(1, self.category, self.reviewers)
+        unreviewed, = make_catalogue(1)
+
+        response = self.client.get(f"{PRODUCTS_URL}{product.pk}/")
+        self.assertEqual(response.data['average_rating'], 1.5)
+        self.assertEqual(response.data['review_count'], 2)
+        self.assertEqual(response.data['category']['subcategories'], ["Cases"])
+
+        response = self.client.get(f"{PRODUCTS_URL}{unreviewed.pk}/")
+        self.assertEqual(response.data['average_rating'], 0)
+        self.assertEqual(response.data['review_count'], 0)
+
+
+class RatingAggregateTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="reviewer", password="pass")
+        self.product = Product.objects.create(name="Lamp", price='20.00', stock=3)
+        self.client.force_authenticate(self.user)
+
+    def assertRating(self, rating_sum, rating_count, rating_avg):
+        self.product.refresh_from_db()
+        self.assertEqual(
+            (self.product.rating_sum, self.product.rating_count, self.product.rating_avg),
+            (rating_sum, rating_count, rating_avg),
+        )
+
+    def test_review_writes_keep_aggregates_current(self):
+        other = User.objects.create_user(username="other", password="pass")
+        Review.objects.create(product=self.product, user=other, rating=2)
+        Product.objects.rebuild_rating_aggregates()
+
+        response = self.client.post(
+            f"/api/products/products/{self.product.pk}/reviews/", {'rating': 5, 'comment': "Great"}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertRating(7, 2, 3.5)
+
+        review_url = f"/api/products/reviews/{response.data['id']}/"
+        self.client.patch(review_url, {'rating': 4})
+        self.assertRating(6, 2, 3.0)
+
+        self.client.delete(review_url)
+        self.assertRating(2, 1, 2.0)
+
+    def test_concurrent_review_writes_adjust_aggregates_once(self):
+        review = Review.objects.create(product=self.product, user=self.user, rating=2)
+        other = User.objects.create_user(username="other", password="pass")
+        Review.objects.create(product=self.product, user=other, rating=3)
+        Product.objects.rebuild_rating_aggregates()
+        view = ReviewUpdateDeleteView()
+
+        # Both requests loaded the review at 2; the first moved it to 4.
+        stale = Review.objects.get(pk=review.pk)
+        self.client.patch(f"/api/products/reviews/{review.pk}/", {'rating': 4})
+        serializer = ReviewSerializer(stale, data={'rating': 5}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        view.perform_update(serializer)
+        self.assertRating(8, 2, 4.0)
+
+        # Both requests loaded the review; the first deleted it.
+        self.assertEqual(self.client.delete(f"/api/products/reviews/{review.pk}/").status_code, 204)
+        view.perform_destroy(stale)
+        self.assertRating(3, 1, 3.0)
+
+    def test_rating_out_of_range_is_400(self):
+        reviews_url = f"/api/products/products/{self.product.pk}/reviews/"
+        for rating in (-1, 0, 6):
+            self.assertEqual(self.client.post(reviews_url, {'rating': rating}).status_code, 400)
+        self.assertRating(0, 0, 0)
+
+        review_url = f"/api/products/reviews/{self.client.post(reviews_url, {'rating': 3}).data['id']}/"
+        self.assertEqual(self.client.patch(review_url, {'rating': -10}).status_code, 400)
+        self.assertRating(3, 1, 3.0)
+
+    def test_review_for_missing_product_is_404(self):
+        response = self.client.post("/api/products/products/999/reviews/", {'rating': 5})
+        self.assertEqual(response.status_code, 404)
+
+    def test_rebuild_command_recomputes_from_reviews(self):
+        Review.objects.create(product=self.product, user=self.user, rating=4)
+        Product.objects.filter(pk=self.product.pk).update(rating_sum=99, rating_count=9)
+
+        call_command('rebuild_product_ratings', stdout=StringIO())
+        self.assertRating(4, 1, 4.0)
+
+    def test_filter_and_order_by_rating(self):
+        low = Product.objects.create(name="Low", price='1.00')
+        Product.objects.filter(pk=self.product.pk).adjust_rating(9, 2)
+        Product.objects.filter(pk=low.pk).adjust_rating(2, 1)
+
+        response = self.client.get(PRODUCTS_URL, {'min_rating': 3})
+        self.assertEqual([p['id'] for p in response.data['results']], [self.product.pk])
+
+        response = self.client.get(PRODUCTS_URL, {'ordering': 'rating'})
+        self.assertEqual([p['id'] for p in response.data['results']], [low.pk, self.product.pk])
+
+
+
+class KeysetPaginationTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.products = make_catalogue(5)
+
+    def collect_pages(self, params):
+        ids, url = [], PRODUCTS_URL
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids.extend(p['id'] for p in response.data['results'])
+            if response.data['next'] is None:
+                return ids
+            response = self.client.get(response.data['next'])
+
+    def test_pages_cover_catalogue_newest_first(self):
+        ids = self.collect_pages({'page_size': 2})
+        self.assertEqual(ids, sorted((p.pk for p in self.products), reverse=True))
+
+    def test_page_size_is_capped(self):
+        make_catalogue(110)
+        response = self.client.get(PRODUCTS_URL, {'page_size': 1000})
+        self.assertEqual(len(response.data['results']), 100)
+
+    def test_inserts_do_not_shift_following_pages(self):
+        first = self.client.get(PRODUCTS_URL, {'page_size': 2})
+        make_catalogue(3)
+        second = self.client.get(first.data['next'])
+        self.assertEqual(
+            [p['id'] for p in second.data['results']],
+            [self.products[2].pk, self.products[1].pk],
+        )
+
+        previous = self.client.get(second.data['previous'])
+        self.assertEqual(
+            [p['id'] for p in previous.data['results']],
+            [p['id'] for p in first.data['results']],
+        )
+
+    def test_sort_key_ties_are_paged_by_id(self):
+        Product.objects.filter(pk=self.products[0].pk).update(price='1.00')
+        ids = self.collect_pages({'ordering': '-price', 'page_size': 2})
+        expected = [p.pk for p in reversed(self.products[1:])] + [self.products[0].pk]
+        self.assertEqual(ids, expected)
+
+    def test_malformed_cursor_is_404(self):
+        response = self.client.get(PRODUCTS_URL, {'cursor': 'cD1ub3Rqc29u'})
+        self.assertEqual(response.status_code, 404)
+
+
+class CatalogueCacheTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.category = Category.objects.create(name="Audio")
+        self.product, = make_catalogue(1, self.category)
+        self.detail_url = f"{PRODUCTS_URL}{self.product.pk}/"
+
+    def test_repeated_reads_skip_the_database(self):
+        first = self.client.get(PRODUCTS_URL)
+        with self.assertNumQueries(0):
+            second = self.client.get(PRODUCTS_URL)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+        self.client.get(self.detail_url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.detail_url).data['id'], self.product.pk)
+
+    def test_query_string_is_normalized(self):
+        self.client.get(PRODUCTS_URL + '?in_stock=true&page_size=5')
+        with self.assertNumQueries(0):
+            self.client.get(PRODUCTS_URL + '?page_size=5&in_stock=true')
+
+    def test_if_none_match_answers_304_without_queries(self):
+        etag = self.client.get(self.detail_url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_product_write_invalidates_detail_and_lists(self):
+        other, = make_catalogue(1)
+        other_etag = self.client.get(f"{PRODUCTS_URL}{other.pk}/")['ETag']
+        list_etag = self.client.get(PRODUCTS_URL)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = "Renamed"
+            self.product.save()
+
+        self.assertEqual(self.client.get(self.detail_url).data['name'], "Renamed")
+        self.assertNotEqual(self.client.get(PRODUCTS_URL)['ETag'], list_etag)
+        self.assertEqual(self.client.get(f"{PRODUCTS_URL}{other.pk}/")['ETag'], other_etag)
+
+    def test_review_and_category_writes_invalidate_detail(self):
+        user = User.objects.create_user(username="critic", password="pass")
+        etag = self.client.get(self.detail_url)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(product=self.product, user=user, rating=4)
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = "Hi-Fi"
+            self.category.save()
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['category']['name'], "Hi-Fi")
+
+
+    def test_responses_are_cached_per_scheme_and_host(self):
+        ProductImage.objects.create(product=self.product, image="product_images/lamp.jpg")
+        make_catalogue(2, self.category)
+        with self.settings(ALLOWED_HOSTS=['a.example', 'b.example']):
+            a = self.client.get(self.detail_url, HTTP_HOST='a.example')
+            b = self.client.get(self.detail_url, HTTP_HOST='b.example')
+            self.assertTrue(b.data['images'][0]['image'].startswith('http://b.example/'))
+            self.assertNotEqual(a['ETag'], b['ETag'])
+
+            plain = self.client.get(PRODUCTS_URL, {'page_size': 1}, HTTP_HOST='a.example')
+            secure = self.client.get(PRODUCTS_URL, {'page_size': 1}, HTTP_HOST='a.example', secure=True)
+            self.assertTrue(plain.data['next'].startswith('http://a.example/'))
+            self.assertTrue(secure.data['next'].startswith('https://a.example/'))
+
+    def test_version_counters_expire(self):
+        self.assertEqual(self.client.get(f"{PRODUCTS_URL}999999/").status_code, 404)
+        self.assertIsNotNone(cache.get(product_version_key(999999)))
+        later = time.time() + settings.CATALOGUE_CACHE_TIMEOUT + 1
+        with mock.patch('time.time', return_value=later):
+            self.assertIsNone(cache.get(product_version_key(999999)))
+
+    def test_only_the_canonical_pk_is_cached(self):
+        # Writes bump the version of pk 4, never of "04".
+        self.client.get(self.detail_url)
+        for pk in (f"0{self.product.pk}", 'abc'):
+            self.assertEqual(self.client.get(f"{PRODUCTS_URL}{pk}/").status_code, 404)
+
+
+class CategoryTreeTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.electronics = Category.objects.create(name="Electronics")
+        self.phones = Category.objects.create(name="Phones", parent=self.electronics)
+        self.cases = Category.objects.create(name="Cases", parent=self.phones)
+        self.garden = Category.objects.create(name="Garden")
+
+    def refresh(self, *categories):
+        for category in categories:
+            category.refresh_from_db()
+
+    def test_paths_follow_the_tree(self):
+        self.assertTrue(self.cases.path.startswith(self.phones.path))
+        self.assertTrue(self.phones.path.startswith(self.electronics.path))
+        self.assertEqual(
+            set(Category.objects.subtree(self.electronics.path)),
+            {self.electronics, self.phones, self.cases},
+        )
+
+    def test_moving_a_category_moves_its_subtree(self):
+        self.phones.parent = self.garden
+        self.phones.save()
+        self.refresh(self.cases)
+
+        self.assertEqual(set(Category.objects.subtree(self.electronics.path)), {self.electronics})
+        self.assertEqual(
+            set(Category.objects.subtree(self.garden.path)),
+            {self.garden, self.phones, self.cases},
+        )
+        self.assertTrue(self.cases.path.startswith(self.phones.path))
+
+    def test_cannot_move_under_own_descendant(self):
+        admin = User.objects.create_user(username="admin", password="pass", is_admin=True)
+        self.client.force_authenticate(admin)
+        response = self.client.patch(
+            f"/api/products/categories/{self.electronics.pk}/", {'parent': self.cases.pk}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_tree_endpoint_is_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/products/categories/tree/')
+        self.assertEqual(response.data, [
+            {'id': self.electronics.pk, 'name': "Electronics", 'children': [
+                {'id': self.phones.pk, 'name': "Phones", 'children': [
+                    {'id': self.cases.pk, 'name': "Cases", 'children': []},
+                ]},
+            ]},
+            {'id': self.garden.pk, 'name': "Garden", 'children': []},
+        ])
+
+    def test_category_tree_filter_matches_descendants(self):
+        phone, = make_catalogue(1, self.phones)
+        case, = make_catalogue(1, self.cases)
+        make_catalogue(1, self.garden)
+
+        response = self.client.get(PRODUCTS_URL, {'category_tree': self.electronics.pk})
+        self.assertEqual({p['id'] for p in response.data['results']}, {phone.pk, case.pk})
+
+        response = self.client.get(PRODUCTS_URL, {'category_tree': self.cases.pk})
+        self.assertEqual([p['id'] for p in response.data['results']], [case.pk])
+
+        response = self.client.get(PRODUCTS_URL, {'category_tree': 999})
+        self.assertEqual(response.data['results'], [])
+
+
+class ProductSearchTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.lamp = Product.objects.create(
+            name="Desk lamp", description="Warm light for reading", price='19.99', stock=5
+        )
+        self.bulb = Product.objects.create(
+            name="LED bulb", description="Fits any desk lamp", price='4.99', stock=5
+        )
+        self.kettle = Product.objects.create(
+            name="Kettle", description="Boils water", price='29.99', stock=5
+        )
+
+    def search(self, query, **params):
+        cache.clear()
+        response = self.client.get(PRODUCTS_URL, {'search': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [p['id'] for p in response.data['results']]
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.assertEqual(self.search("lamp"), [self.lamp.pk, self.bulb.pk])
+
+    def test_every_term_must_match(self):
+        self.assertEqual(self.search("desk reading"), [self.lamp.pk])
+        self.assertEqual(self.search("kettle lamp"), [])
+
+    def test_prefix_matching(self):
+        self.assertEqual(self.search("ket"), [self.kettle.pk])
+        self.assertEqual(self.search("boi wat"), [self.kettle.pk])
+
+    def test_punctuation_is_not_query_syntax(self):
+        self.assertEqual(self.search('"kettle" OR (lamp*'), [])
+        self.assertEqual(self.search('kettle"'), [self.kettle.pk])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.kettle.name = "Teapot"
+        self.kettle.save()
+        self.assertEqual(self.search("kettle"), [])
+        self.assertEqual(self.search("teapot"), [self.kettle.pk])
+
+        self.kettle.delete()
+        self.assertEqual(self.search("teapot"), [])
+
+    def test_explicit_ordering_overrides_relevance(self):
+        self.assertEqual(self.search("lamp", ordering='price'), [self.bulb.pk, self.lamp.pk])
+
+    def test_results_page_by_relevance(self):
+        first = self.client.get(PRODUCTS_URL, {'search': "lamp", 'page_size': 1})
+        self.assertEqual([p['id'] for p in first.data['results']], [self.lamp.pk])
+        second = self.client.get(first.data['next'])
+        self.assertEqual([p['id'] for p in second.data['results']], [self.bulb.pk])
+        self.assertIsNone(second.data['next'])
+
+    def test_rebuild_command_restores_the_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM products_product_fts")
+        self.assertEqual(self.search("kettle"), [])
+
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search("kettle"), [self.kettle.pk])
+
+
+class SuggestTests(CatalogueTestCase):
+    SUGGEST_URL = f"{PRODUCTS_URL}suggest/"
+
+    def setUp(self):
+        super().setUp()
+        discard_suggest_index()
+        self.addCleanup(discard_suggest_index)
+        self.lighting = Category.objects.create(name="Lighting")
+        self.lamp = Product.objects.create(name="Desk lamp", price='19.99', stock=5, category=self.lighting)
+        self.floor_lamp = Product.objects.create(name="Floor  Lamp", price='49.99', stock=5, category=self.lighting)
+        self.ladder = Product.objects.create(name="Ladder", price='59.99', stock=5)
+        Product.objects.filter(pk=self.floor_lamp.pk).update(rating_count=3)
+
+    def suggest(self, q, **params):
+        response = self.client.get(self.SUGGEST_URL, {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(s['type'], s['name']) for s in response.data]
+
+    def test_matches_any_word_ranked_by_popularity(self):
+        self.assertEqual(self.suggest("LAM"), [('product', "Floor Lamp"), ('product', "Desk lamp")])
+        self.assertEqual(self.suggest("desk  la"), [('product', "Desk lamp")])
+        self.assertEqual(self.suggest("li"), [('category', "Lighting")])
+        self.assertEqual(self.suggest("la", limit=1), [('product', "Floor Lamp")])
+        self.assertEqual(self.suggest("xyz"), [])
+        self.assertEqual(self.suggest(""), [])
+
+    def test_answers_without_queries_once_built(self):
+        self.suggest("la")
+        with self.assertNumQueries(0):
+            self.suggest("lad")
+
+    def test_signals_refresh_the_index_on_commit(self):
+        self.suggest("la")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ladder.name = "Step stool"
+            self.ladder.save()
+            self.lamp.delete()
+            Category.objects.create(name="Stationery")
+        self.assertEqual(self.suggest("la"), [('product', "Floor Lamp")])
+        self.assertEqual(self.suggest("st"), [('category', "Stationery"), ('product', "Step stool")])
+
+    def test_broad_prefixes_rank_the_whole_match(self):
+        products = Product.objects.bulk_create(
+            Product(name=f"Lamp {i}", price='1.00', stock=1) for i in range(SCAN_LIMIT + 10)
+        )
+        Product.objects.filter(pk=products[-1].pk).update(rating_count=10)
+        self.assertEqual(self.suggest("lamp", limit=1), [('product', f"Lamp {SCAN_LIMIT + 9}")])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.get(pk=products[0].pk)
+            product.rating_count = 20
+            product.save()
+        self.assertEqual(self.suggest("lamp", limit=1), [('product', "Lamp 0")])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        self.assertEqual(self.suggest("lamp", limit=1), [('product', f"Lamp {SCAN_LIMIT + 9}")])
+
+    def test_stale_index_is_served_while_another_thread_rebuilds(self):
+        index = get_suggest_index()
+        with override_settings(SUGGEST_INDEX_MAX_AGE=timedelta(0)):
+            # A rebuild in progress holds the lock: the stale index answers meanwhile.
+            with _index_lock, self.assertNumQueries(0):
+                self.assertIs(get_suggest_index(), index)
+            self.assertIsNot(get_suggest_index(), index)
+
+
+class CatalogueExportTests(CatalogueTestCase):
+    EXPORT_URL = '/api/products/export/products/'
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(username="admin", password="pass", is_admin=True)
+        self.category = Category.objects.create(name="Kitchen")
+        self.kettle = Product.objects.create(
+            name="Kettle, steel", description='Says "hi"\nloudly', price='29.99', stock=3, category=self.category
+        )
+        self.spoon = Product.objects.create(name="Spoon", price='1.50', stock=0)
+
+    def export(self, url, **params):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_export_streams_every_product(self):
+        response, body = self.export(self.EXPORT_URL)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('filename="products.csv"', response['Content-Disposition'])
+
+        rows = list(csv.DictReader(StringIO(body)))
+        self.assertEqual([row['name'] for row in rows], ["Kettle, steel", "Spoon"])
+        self.assertEqual(rows[0]['description'], 'Says "hi"\nloudly')
+        self.assertEqual(rows[0]['category'], "Kitchen")
+        self.assertEqual(rows[0]['price'], '29.99')
+        self.assertEqual(rows[1]['category'], '')
+
+    def test_ndjson_export(self):
+        Review.objects.create(product=self.kettle, user=self.admin, rating=4, comment="Fine")
+        response, body = self.export('/api/products/export/reviews/', format='ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        row, = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual((row['product_id'], row['rating'], row['comment']), (self.kettle.pk, 4, "Fine"))
+
+    def test_export_is_one_query(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(self.EXPORT_URL)
+        with self.assertNumQueries(1):
+            b''.join(response.streaming_content)
+
+    def test_admin_only(self):
+        self.client.force_authenticate(User.objects.create_user(username="shopper", password="pass"))
+        self.assertEqual(self.client.get(self.EXPORT_URL).status_code, 403)
+
+    def test_command_writes_the_same_stream(self):
+        _, body = self.export(self.EXPORT_URL, format='ndjson')
+        out = StringIO()
+        call_command('export_catalogue', 'products', '--format', 'ndjson', stdout=out)
+        self.assertEqual(out.getvalue(), body)
+
+    def test_full_last_buffer_adds_no_blank_line(self):
+        # Two products fill the last buffer exactly.
+        with mock.patch('ecommerce.export.BUFFER_ROWS', 2):
+            _, body = self.export(self.EXPORT_URL)
+            out = StringIO()
+            call_command('export_catalogue', 'products', stdout=out)
+        self.assertEqual(out.getvalue(), body)
+        self.assertEqual(len(body.splitlines()), 4)
+
+
+class CatalogueImportTests(CatalogueTestCase):
+    IMPORT_URL = '/api/products/import/'
+
+    CSV = (
+        "sku,name,description,price,stock,category,images\n"
+        "K-1,Kettle,Boils water,29.99,3,Home > Kitchen,kettle.jpg|kettle-side.jpg\n"
+        "S-1,Spoon,,1.50,,Home > Kitchen,\n"
+        "B-1,Broken,,not-a-price,1,,\n"
+        "L-1,Lamp,,19.99,2,Lighting,lamp.jpg\n"
+    )
+
+    def run_import(self, content, *args):
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), 'catalogue.csv')
+        with open(path, 'w') as file:
+            file.write(content)
+        out, err = StringIO(), StringIO()
+        call_command('import_catalogue', path, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_import_creates_categories_products_and_images(self):
+        out, err = self.run_import(self.CSV)
+        self.assertIn("3 created, 0 updated), 1 rows failed", out)
+        self.assertIn("line 4:", err)
+        self.assertIn("price", err)
+
+        kitchen = Category.objects.get(name="Kitchen")
+        self.assertEqual(kitchen.parent.name, "Home")
+        self.assertTrue(kitchen.path.startswith(kitchen.parent.path))
+        kettle = Product.objects.get(sku='K-1')
+        self.assertEqual((kettle.name, kettle.stock, kettle.category), ("Kettle", 3, kitchen))
+        self.assertEqual(
+            sorted(kettle.images.values_list('image', flat=True)), ['kettle-side.jpg', 'kettle.jpg']
+        )
+        self.assertEqual(Product.objects.get(sku='S-1').stock, 0)
+        self.assertFalse(Product.objects.filter(sku='B-1').exists())
+
+        response = self.client.get(PRODUCTS_URL, {'search': "kett"})
+        self.assertEqual([p['sku'] for p in response.data['results']], ['K-1'])
+
+    def test_reimport_updates_in_place(self):
+        self.run_import(self.CSV)
+        kettle = Product.objects.get(sku='K-1')
+        out, _ = self.run_import(
+            "sku,name,price,stock,category,images\n"
+            "K-1,Steel kettle,24.99,7,Home > Kitchen,steel.jpg\n"
+            "S-1,Spoon,1.75,4,Home > Kitchen,\n",
+            '--batch-size', '1',
+        )
+        self.assertIn("(0 created, 2 updated), 0 rows failed", out)
+        kettle.refresh_from_db()
+        self.assertEqual((kettle.name, str(kettle.price), kettle.stock), ("Steel kettle", '24.99', 7))
+        self.assertEqual(list(kettle.images.values_list('image', flat=True)), ['steel.jpg'])
+        self.assertEqual(Product.objects.count(), 3)
+        self.assertEqual(Category.objects.count(), 3)
+
+    def test_batch_query_count_does_not_grow_with_rows(self):
+        Category.objects.create(name="Kitchen")
+
+        def queries(rows):
+            content = "sku,name,price,category\n" + "".join(
+                f"{prefix}-{i},Item {i},1.00,Kitchen\n" for prefix in ('A', 'B') for i in range(rows)
+            )
+            with CaptureQueriesContext(connection) as ctx:
+                self.run_import(content, '--batch-size', str(rows))
+            return len(ctx.captured_queries)
+
+        self.assertEqual(queries(5), queries(50))
+
+    def test_ndjson_upload_endpoint(self):
+        admin = User.objects.create_user(username="admin", password="pass", is_admin=True)
+        self.client.force_authenticate(admin)
+        upload = SimpleUploadedFile(
+            'catalogue.ndjson',
+            b'{"sku": "K-1", "name": "Kettle", "price": "29.99", "category": "Kitchen"}\n'
+            b'not json\n'
+            b'{"sku": "M-1", "name": "Mug"}\n',
+        )
+        response = self.client.post(self.IMPORT_URL, {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 2))
+        self.assertEqual([error['line'] for error in response.data['errors']], [2, 3])
+        self.assertIn('price', response.data['errors'][1]['errors'])
+
+    def test_import_is_admin_only(self):
+        self.client.force_authenticate(User.objects.create_user(username="shopper", password="pass"))
+        upload = SimpleUploadedFile('catalogue.csv', self.CSV.encode())
+        response = self.client.post(self.IMPORT_URL, {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 403)
+
+
+class ProductImageTestCase(CatalogueTestCase):
+    """Uploads go to a throwaway MEDIA_ROOT and make their renditions on commit."""
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name, PRODUCT_IMAGE_WORKERS=0))
+        self.product = Product.objects.create(name="Lamp", price='30.00', stock=3)
+        self.client.force_authenticate(User.objects.create_user(username="admin", password="pass", is_admin=True))
+
+    def upload(self, size=(800, 600), mode='RGBA', name='lamp.png'):
+        buffer = io.BytesIO()
+        Image.new(mode, size, 'red').save(buffer, 'PNG')
+        upload = SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                f"/api/products/products/{self.product.pk}/images/", {'image': upload, 'alt_text': "Lamp"},
+                format='multipart',
+            )
+
+
+class ProductImageRenditionTests(ProductImageTestCase):
+    def test_upload_answers_before_the_renditions_exist(self):
+        response = self.upload()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['alt_text'], response.data['renditions']), ("Lamp", {}))
+
+        image = ProductImage.objects.get(pk=response.data['id'])
+        self.assertIsNotNone(image.processed_at)
+        sizes = {name: (rendition['width'], rendition['height']) for name, rendition in image.renditions.items()}
+        # Scaled to fit, never enlarged.
+        self.assertEqual(sizes, {'thumbnail': (160, 120), 'card': (480, 360), 'full': (800, 600)})
+        storage = ProductImage._meta.get_field('image').storage
+        for extension, format in (('webp', 'WEBP'), ('jpeg', 'JPEG')):
+            with storage.open(image.renditions['thumbnail'][extension]) as file, Image.open(file) as rendition:
+                self.assertEqual((rendition.format, rendition.size), (format, (160, 120)))
+
+    def test_list_shows_thumbnails_and_detail_every_rendition(self):
+        self.upload()
+        [image] = self.client.get(PRODUCTS_URL).data['results'][0]['images']
+        self.assertEqual(list(image['renditions']), ['thumbnail'])
+        self.assertTrue(image['renditions']['thumbnail']['webp'].startswith('http://testserver/media/'))
+
+        [image] = self.client.get(f"{PRODUCTS_URL}{self.product.pk}/").data['images']
+        self.assertEqual(list(image['renditions']), list(RENDITIONS))
+
+    def test_uploads_are_admin_only(self):
+        self.client.force_authenticate(User.objects.create_user(username="shopper", password="pass"))
+        self.assertEqual(self.upload().status_code, 403)
+
+    def test_command_processes_pending_images(self):
+        response = self.upload(size=(100, 50), mode='P')
+        pending = ProductImage.objects.get(pk=response.data['id'])
+        ProductImage.objects.filter(pk=pending.pk).update(renditions={}, processed_at=None)
+        missing = ProductImage.objects.create(product=self.product, image="product_images/missing.jpg")
+
+        out = StringIO()
+        with self.assertLogs('products.images', 'ERROR'):
+            call_command('process_product_images', stdout=out)
+        self.assertIn("1 of 2", out.getvalue())
+        pending.refresh_from_db()
+        self.assertEqual(pending.renditions['full']['width'], 100)
+        self.assertFalse(ProductImage.objects.filter(pk=missing.pk, processed_at__isnull=False).exists())
+
+
+class ContentAddressedStorageTests(ProductImageTestCase):
+    def stored_files(self):
+        root = settings.MEDIA_ROOT
+        return sorted(
+            os.path.relpath(os.path.join(path, name), root)
+            for path, _, names in os.walk(root) for name in names
+        )
+
+    def references(self):
+        return dict(ImageBlob.objects.values_list('name', 'references'))
+
+    def test_identical_uploads_are_stored_once(self):
+        first = ProductImage.objects.get(pk=self.upload(name='front.png').data['id'])
+        second = ProductImage.objects.get(pk=self.upload(name='variant.png').data['id'])
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^product_images/([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}\.png$')
+        self.assertEqual(first.renditions, second.renditions)
+        # The original and three sizes in two formats.
+        self.assertEqual(self.stored_files(), sorted(first.stored_files()))
+        self.assertEqual(len(self.stored_files()), 7)
+        self.assertEqual(set(self.references().values()), {2})
+
+    def test_unreferenced_blobs_are_collected(self):
+        kept = ProductImage.objects.get(pk=self.upload().data['id'])
+        other = Product.objects.create(name="Shade", price='5.00', stock=1)
+        self.product = other
+        self.upload()
+        # Its card and full renditions are the same blob.
+        self.upload(size=(300, 300))
+        orphan = product_image_storage().save('orphan.txt', ContentFile(b"never referenced"))
+
+        other.delete()
+        references = self.references()
+        self.assertEqual({references[name] for name in kept.stored_files()}, {1})
+        self.assertEqual(list(references.values()).count(0), 5)
+
+        self.assertEqual(ImageBlob.objects.collect_garbage(), (0, 0))
+        deleted, freed = ImageBlob.objects.collect_garbage(timedelta(0))
+        self.assertEqual(deleted, 6)
+        self.assertGreater(freed, 0)
+        self.assertEqual(self.stored_files(), sorted(kept.stored_files()))
+        self.assertNotIn(orphan, self.references())
+        self.assertEqual(set(self.references().values()), {1})
+
+    def test_replacing_an_image_moves_the_reference(self):
+        image = ProductImage.objects.get(pk=self.upload().data['id'])
+        old = image.image.name
+        image.image.save('other.png', ContentFile(b"not really a png"))
+        references = self.references()
+        self.assertEqual((references[old], references[image.image.name]), (0, 1))
+
+    def test_blobs_are_served_immutable(self):
+        image = ProductImage.objects.get(pk=self.upload().data['id'])
+        with open(os.path.join(settings.MEDIA_ROOT, 'legacy.jpg'), 'wb') as file:
+            file.write(b"data")
+
+        request = APIRequestFactory().get('/')
+        response = serve_media(request, image.image.name, document_root=settings.MEDIA_ROOT)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        response = serve_media(request, 'legacy.jpg', document_root=settings.MEDIA_ROOT)
+        self.assertFalse(response.has_header('Cache-Control'))
+
+
+class RenderingParityTests(CatalogueTestCase):
+    """render_products() must produce exactly the bytes the serializers do."""
+
+    def setUp(self):
+        super().setUp()
+        self.request = APIRequestFactory().get('/')
+        parent = Category.objects.create(name="Home")
+        kitchen = Category.objects.create(name="Kitchen", parent=parent)
+        Category.objects.create(name="Cutlery", parent=kitchen)
+        Category.objects.create(name="Pans", parent=kitchen)
+        self.user = User.objects.create_user(username="shopper", password="pass")
+        reviewer = User.objects.create_user(username="critic", password="pass")
+        make_catalogue(3, kitchen, [self.user, reviewer])
+        make_catalogue(2, parent)
+        Product.objects.create(sku='UNI-1', name="Crème brûlée torch", description="Ünïcode\n", price='1234.50', stock=0)
+        ProductImage.objects.create(
+            product=Product.objects.first(), image="product_images/extra.jpg", alt_text="Side",
+            renditions={
+                name: {'width': size, 'height': size // 2, 'webp': f"r/{name}.webp", 'jpeg': f"r/{name}.jpg"}
+                for name, size in RENDITIONS.items()
+            },
+        )
+        ProductImage.objects.create(product=Product.objects.last(), image='')
+        Product.objects.rebuild_rating_aggregates()
+
+    def render(self, data):
+        return JSONRenderer().render(data)
+
+    def test_products_render_identically(self):
+        expected = ProductSerializer(
+            Product.objects.with_listing_data().order_by('id'), many=True, context={'request': self.request}
+        ).data
+        actual = render_products(product_rows(Product.objects.order_by('id')), self.request)
+        self.assertEqual(self.render(actual), self.render(expected))
+
+    def test_without_request_urls_stay_relative(self):
+        expected = ProductSerializer(Product.objects.with_listing_data().order_by('id'), many=True).data
+        actual = render_products(product_rows(Product.objects.order_by('id')))
+        self.assertEqual(self.render(actual), self.render(expected))
+
+    @override_settings(TIME_ZONE='Asia/Kolkata')
+    def test_timestamps_follow_the_current_timezone(self):
+        expected = ProductSerializer(Product.objects.with_listing_data().order_by('id'), many=True).data
+        actual = render_products(product_rows(Product.objects.order_by('id')))
+        self.assertEqual(self.render(actual), self.render(expected))
+        self.assertIn('+05:30', actual[0]['created_at'])
+
+    def test_endpoints_match_the_serializer(self):
+        response = self.client.get(PRODUCTS_URL, {'page_size': 100})
+        request = response.wsgi_request
+        products = Product.objects.with_listing_data().order_by('-id')
+        expected = ProductSerializer(
+            products, many=True, context={'request': request, 'renditions': LIST_RENDITIONS}
+        ).data
+        self.assertEqual(self.render(response.data['results']), self.render(expected))
+
+        product = Product.objects.first()
+        expected = ProductSerializer(products.get(pk=product.pk), context={'request': request}).data
+        self.assertEqual(set(expected['images'][-1]['renditions']), set(RENDITIONS))
+        for url in (f"{PRODUCTS_URL}{product.pk}/", f"/api/products/{product.pk}"):
+            response = self.client.get(url)
+            self.assertEqual(self.render(response.data), self.render(expected))
+
+    def test_wishlist_matches_the_serializer(self):
+        for product in [*Product.objects.order_by('id')[:3], Product.objects.last()]:
+            WishlistItem.objects.create(user=self.user, product=product)
+        self.client.force_authenticate(self.user)
+
+        for params in ({}, {'expand': 'product'}):
+            response = self.client.get('/api/products/wishlist/', params)
+            expected = WishlistItemSerializer(
+                WishlistItem.objects.filter(user=self.user).order_by('-added_at', '-id'),
+                many=True, context={'request': response.wsgi_request, 'renditions': LIST_RENDITIONS},
+            ).data
+            self.assertEqual(len(expected), 4)
+            self.assertEqual(self.render(response.data['results']), self.render(expected))
+
+    def test_wishlist_nests_the_product_summary(self):
+        WishlistItem.objects.create(user=self.user, product=Product.objects.first())
+        WishlistItem.objects.create(user=self.user, product=Product.objects.last())
+        self.client.force_authenticate(self.user)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/products/wishlist/')
+        sold_out, first = [item['product'] for item in response.data['results']]
+        self.assertEqual(set(first), {'id', 'name', 'price', 'primary_image', 'in_stock'})
+        self.assertTrue(first['in_stock'])
+        self.assertTrue(first['primary_image'].startswith('http://testserver/media/'))
+        self.assertEqual((sold_out['in_stock'], sold_out['primary_image']), (False, None))
+
+        response = self.client.get('/api/products/wishlist/', {'expand': 'product'})
+        self.assertIn('description', response.data['results'][0]['product'])
+
+    def test_missing_product_is_404(self):
+        self.assertEqual(self.client.get(f"{PRODUCTS_URL}999999/").status_code, 404)
+        # A pk that is not a number, as DRF's get_object() answers it.
+        view = ProductDetailView.as_view()
+        self.assertEqual(view(self.request, pk='abc').status_code, 404)
+
+
+class FieldSelectionTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        parent = Category.objects.create(name="Home")
+        self.category = Category.objects.create(name="Kitchen", parent=parent)
+        self.products = make_catalogue(3, self.category)
+        Product.objects.filter(pk=self.products[0].pk).update(price='1.00')
+
+    def list_products(self, params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(PRODUCTS_URL, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results'], [query['sql'] for query in ctx.captured_queries]
+
+    def test_fields_limit_the_representation_and_the_queries(self):
+        results, queries = self.list_products({'fields': 'id,name,price'})
+        self.assertEqual([list(product) for product in results], [['id', 'name', 'price']] * 3)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('products_category', queries[0])
+        self.assertNotIn('description', queries[0])
+
+        results, queries = self.list_products({'fields': 'id,images'})
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(results[0]['images'][0]['image'], "http://testserver/media/product_images/2.jpg")
+
+    def test_omit_drops_fields(self):
+        results, queries = self.list_products({'omit': 'category,images,description'})
+        self.assertNotIn('category', results[0])
+        self.assertIn('sku', results[0])
+        self.assertEqual(len(queries), 1)
+
+    def test_selection_matches_the_serializer(self):
+        response = self.client.get(PRODUCTS_URL, {'fields': 'id,category,review_count', 'omit': 'id'})
+        # Newest first, so the first result is the last product created.
+        product = Product.objects.with_listing_data().get(pk=self.products[-1].pk)
+        expected = ProductSerializer(product, context={'request': response.wsgi_request}).data
+        self.assertEqual(response.data['results'][0], expected)
+        self.assertEqual(list(expected), ['category', 'review_count'])
+
+    def test_paging_by_an_unselected_column(self):
+        first, _ = self.list_products({'fields': 'name', 'ordering': 'price', 'page_size': 1})
+        self.assertEqual(first, [{'name': "Product 0"}])
+        response = self.client.get(PRODUCTS_URL, {'fields': 'name', 'ordering': 'price', 'page_size': 2})
+        self.assertEqual(self.client.get(response.data['next']).data['results'], [{'name': "Product 2"}])
+
+    def test_detail_is_cached_per_selection(self):
+        url = f"{PRODUCTS_URL}{self.products[0].pk}/"
+        full = self.client.get(url)
+        trimmed = self.client.get(url, {'fields': 'name'})
+        self.assertEqual(trimmed.data, {'name': "Product 0"})
+        self.assertNotEqual(trimmed['ETag'], full['ETag'])
+        self.assertIn('description', self.client.get(url).data)
+
+    def test_writes_return_every_field(self):
+        self.client.force_authenticate(User.objects.create_user(username="admin", password="pass", is_admin=True))
+        response = self.client.post(
+            f"{PRODUCTS_URL}?fields=id",
+            {'name': "Kettle", 'description': "Boils", 'price': '20.00', 'stock': 1, 'category_id': self.category.pk},
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('description', response.data)
+
+    def test_wishlist_without_products_skips_the_join(self):
+        user = User.objects.create_user(username="shopper", password="pass")
+        WishlistItem.objects.create(user=user, product=self.products[0])
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/products/wishlist/', {'fields': 'id,added_at'})
+        self.assertEqual(list(response.data['results'][0]), ['id', 'added_at'])
+        self.assertNotIn('products_product', ctx.captured_queries[0]['sql'])
+
+
+class QueryPlanTests(CatalogueTestCase):
+    """The catalogue's filtered reads are served from indexes, not table scans."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="shopper", password="pass")
+        self.category = Category.objects.create(name="Kitchen")
+        self.products = make_catalogue(3, self.category, reviewers=[self.user])
+        WishlistItem.objects.create(user=self.user, product=self.products[0])
+        self.client.force_authenticate(self.user)
+
+    def assertIndexed(self, url, params=None):
+        with QueryPlans(connection) as plans:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(plans.statements())
+        self.assertEqual(plans.full_scans(), {})
+
+    def test_product_filters(self):
+        # Unfiltered, a page walks the primary key in order and stops at its
+        # size; each filter must have an index to do the same.
+        for params in (
+            {'in_stock': 'true'},
+            {'min_price': '5', 'ordering': 'price'},
+            {'max_price': '20', 'ordering': '-price'},
+            {'category': self.category.pk},
+            {'category_tree': self.category.pk},
+            {'ordering': '-rating'},
+            {'ordering': 'created_at'},
+        ):
+            with self.subTest(params):
+                self.assertIndexed(PRODUCTS_URL, params)
+
+    def test_reviews_and_wishlist(self):
+        self.assertIndexed(f"{PRODUCTS_URL}{self.products[0].pk}/reviews/")
+        self.assertIndexed('/api/products/wishlist/')
+
+
+ASYNC_ROUTES = ['product-list', 'product-detail', 'category-list', 'category-detail', 'product-reviews', 'cart-detail']
+
+
+def reload_urlconf():
+    """Rebuild the URL patterns, which pick their async routes at import."""
+    for module in (urls, orders.urls, ecommerce.urls):
+        importlib.reload(module)
+    clear_url_caches()
+
+
+class AsyncViewTestCase(CatalogueTestCase):
+    """Requests go through the DRF views, or the async ones within async_views()."""
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(reload_urlconf)
+
+    def async_views(self):
+        self.enterContext(override_settings(ASYNC_VIEWS=ASYNC_ROUTES))
+        reload_urlconf()
+
+    def authenticate(self, user):
+        access = ClaimsTokenObtainPairSerializer.get_token(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def assertSameResponses(self, requests):
+        """Each (url, params) answers the same through the DRF and the async view."""
+        def fetch():
+            responses = []
+            for url, params in requests:
+                cache.clear()
+                response = self.client.get(url, params)
+                # ETag versions are seeded from the clock once the cache is cleared.
+                responses.append((response.status_code, response.content, response.has_header('ETag')))
+            return responses
+
+        expected = fetch()
+        self.async_views()
+        self.assertEqual(fetch(), expected)
+        return expected
+
+
+class AsyncCatalogueViewTests(AsyncViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="shopper", password="pass")
+        parent = Category.objects.create(name="Home")
+        self.category = Category.objects.create(name="Kitchen", parent=parent)
+        self.products = make_catalogue(5, self.category, reviewers=[self.user])
+        Product.objects.filter(pk=self.products[0].pk).update(stock=0)
+        self.authenticate(self.user)
+
+    def test_catalogue_reads_match_the_drf_views(self):
+        product = self.products[1]
+        responses = self.assertSameResponses([
+            (PRODUCTS_URL, {}),
+            (PRODUCTS_URL, {'in_stock': 'true', 'ordering': '-price', 'page_size': 2}),
+            (PRODUCTS_URL, {'category_tree': self.category.parent_id, 'fields': 'id,name,category'}),
+            (PRODUCTS_URL, {'search': "product", 'omit': 'images'}),
+            (PRODUCTS_URL, {'min_price': 'cheap'}),
+            (f"{PRODUCTS_URL}{product.pk}/", {}),
+            (f"{PRODUCTS_URL}{product.pk}/", {'fields': 'name,images'}),
+            (f"{PRODUCTS_URL}999999/", {}),
+            ('/api/products/categories/', {}),
+            (f"/api/products/categories/{self.category.pk}/", {}),
+            (f"{PRODUCTS_URL}{product.pk}/reviews/", {'page_size': 1}),
+            (f"{PRODUCTS_URL}{product.pk}/reviews/", {'fields': 'rating,user'}),
+        ])
+        self.assertEqual([status for status, _, _ in responses].count(200), 10)
+
+    def test_pages_follow_on(self):
+        self.async_views()
+        page = self.client.get(PRODUCTS_URL, {'page_size': 2}).json()
+        ids = [product['id'] for product in page['results']]
+        while page['next']:
+            page = self.client.get(page['next']).json()
+            ids += [product['id'] for product in page['results']]
+        self.assertEqual(ids, sorted((product.pk for product in self.products), reverse=True))
+
+    def test_cached_reads_and_conditional_requests(self):
+        self.async_views()
+        url = f"{PRODUCTS_URL}{self.products[0].pk}/"
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_writes_go_to_the_drf_views(self):
+        self.async_views()
+        self.authenticate(User.objects.create_user(username="admin", password="pass", is_admin=True))
+        response = self.client.post(
+            PRODUCTS_URL, {'name': "Kettle", 'price': '20.00', 'stock': 1, 'category_id': self.category.pk}
+        )
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post(f"{PRODUCTS_URL}{self.products[0].pk}/reviews/", {'rating': 5})
+        self.assertEqual(response.status_code, 201)
+        self.client.credentials()
+        self.assertEqual(self.client.delete(f"{PRODUCTS_URL}{self.products[0].pk}/").status_code, 401)
+
+    def test_bad_tokens_are_refused(self):
+        self.async_views()
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer nonsense")
+        response = self.client.get(PRODUCTS_URL)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="api"')
 
-# Create your tests here.
@@ -10,7 +10,18 @@ from .views import (
         WishlistListView,
         WishlistAddView,
         WishlistRemoveView,
+        ProductExportView,
+        ReviewExportView,
+        CatalogueImportView,
         )
+from .async_views import (
+        AsyncCategoryDetailView,
+        AsyncCategoryListView,
+        AsyncProductDetailView,
+        AsyncProductListView,
+        AsyncReviewListView,
+        )
+from ecommerce.asyncviews import async_routes
 from rest_framework.routers import DefaultRouter
 
 router = DefaultRouter()
@@ -18,6 +29,14 @@ router.register(r'categories', CategoryViewSet, basename='category')
 router.register(r'products', ProductViewSet, basename='product')
 
 urlpatterns = [
+        # Ahead of the routes they stand in for, when settings.ASYNC_VIEWS selects them.
+        *async_routes(
+            path('products/', AsyncProductListView.as_view(), name='product-list'),
+            path('products/<int:pk>/', AsyncProductDetailView.as_view(), name='product-detail'),
+            path('categories/', AsyncCategoryListView.as_view(), name='category-list'),
+            path('categories/<int:pk>/', AsyncCategoryDetailView.as_view(), name='category-detail'),
+            path('products/<int:product_id>/reviews/', AsyncReviewListView.as_view(), name='product-reviews'),
+            ),
         path('', include(router.urls)),
         path('', ProductListCreateView.as_view(), name='product-list'),
         path('<int:pk>', ProductDetailView.as_view(), name='product-detail'),
@@ -27,5 +46,8 @@ urlpatterns = [
         path('wishlist/', WishlistListView.as_view(), name='wishlist-list'),
         path('wishlist/add/', WishlistAddView.as_view(), name='wishlist-add'),
         path('wishlist/<int:pk>/remove', WishlistRemoveView.as_view(), name='wishlist-remove'),
+        path('export/products/', ProductExportView.as_view(), name='product-export'),
+        path('export/reviews/', ReviewExportView.as_view(), name='review-export'),
+        path('import/', CatalogueImportView.as_view(), name='catalogue-import'),
         ]
 
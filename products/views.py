@@ -1,7 +1,14 @@
-from django.shortcuts import render
-from rest_framework import generics, permissions, viewsets, filters
+import io
+
+from django.db import transaction
+from django.http import Http404
+from django.shortcuts import render, get_object_or_404
+from rest_framework import generics, permissions, status, viewsets
+from rest_framework.decorators import action
 from rest_framework.parsers import MultiPartParser, FormParser
-from .models import Product, Category, ProductImage, Review, Product
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .models import Product, Category, ProductImage, Review, WishlistItem
 from .serializers import (
     ProductSerializer, 
     CategorySerializer, 
@@ -9,51 +16,91 @@ from .serializers import (
     ReviewSerializer,
     WishlistItemSerializer,
 )
-from .permissions import IsAdminOrReadOnly
+from .permissions import IsAdmin, IsAdminOrReadOnly
 from .filters import ProductFilter
+from .pagination import ProductPagination, WishlistPagination
+from .cache import CatalogueCacheMixin
+from .search import FullTextSearchFilter
+from .suggest import get_suggest_index
+from .rendering import WISHLIST_FIELDS, ProductRenderMixin, render_wishlist_items, wishlist_rows
+from .exports import PRODUCT_EXPORT, REVIEW_EXPORT
+from .importer import DEFAULT_BATCH_SIZE, guess_format, import_catalogue
+from .images import schedule_renditions
+from ecommerce.export import ExportView
+from ecommerce.fields import FieldSelectionViewMixin, is_expanded, selected_fields
+from ecommerce.pagination import KeysetPagination
 from django_filters.rest_framework import DjangoFilterBackend
 
-class ProductListCreateView(generics.ListCreateAPIView):
-    queryset = Product.objects.all()
+class ProductListCreateView(ProductRenderMixin, generics.ListCreateAPIView):
+    queryset = Product.objects.with_listing_data()
     serializer_class = ProductSerializer
     permission_classes = [IsAdminOrReadOnly]
+    pagination_class = ProductPagination
 
-class ProductDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Product.objects.all()
+class ProductDetailView(ProductRenderMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Product.objects.with_listing_data()
     serializer_class = ProductSerializer
     permission_classes = [IsAdminOrReadOnly]
 
 class CategoryViewSet(viewsets.ModelViewSet):
-    queryset = Category.objects.all()
+    queryset = Category.objects.prefetch_related('subcategories')
     serializer_class = CategorySerializer
     permission_classes = [IsAdminOrReadOnly]
 
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all()
+    @action(detail=False, methods=['get'])
+    def tree(self, request):
+        """The whole category tree, nested, from a single query ordered by path."""
+        nodes, roots = {}, []
+        for row in Category.objects.order_by('path').values('id', 'name', 'parent_id'):
+            node = nodes[row['id']] = {'id': row['id'], 'name': row['name'], 'children': []}
+            siblings = nodes[row['parent_id']]['children'] if row['parent_id'] else roots
+            siblings.append(node)
+        return Response(roots)
+
+class ProductViewSet(CatalogueCacheMixin, ProductRenderMixin, viewsets.ModelViewSet):
+    queryset = Product.objects.with_listing_data()
     serializer_class = ProductSerializer
     permission_classes = [IsAdminOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    pagination_class = ProductPagination
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter]
     filterset_class = ProductFilter
-    search_fields = ['name', 'description']
+
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        """Typeahead over product and category names, from the in-memory prefix index."""
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(get_suggest_index().suggest(request.query_params.get('q', ''), max(limit, 1)))
 
 class ProductImageUploadView(generics.CreateAPIView):
     queryset = ProductImage.objects.all()
-    serializer_class = ProductSerializer
+    serializer_class = ProductImageSerializer
     permission_classes = [permissions.IsAuthenticated, IsAdminOrReadOnly]
     parser_classes = [MultiPartParser, FormParser]
 
-class ReviewListCreateView(generics.ListCreateAPIView):
+    def perform_create(self, serializer):
+        # The response carries the original only; renditions follow in the background.
+        product = get_object_or_404(Product, pk=self.kwargs['product_id'])
+        image = serializer.save(product=product)
+        schedule_renditions(image.pk)
+
+class ReviewListCreateView(FieldSelectionViewMixin, generics.ListCreateAPIView):
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
+    field_querysets = {'user': lambda reviews, request: reviews.select_related('user')}
 
     def get_queryset(self):
         product_id = self.kwargs['product_id']
-        return Review.objects.filter(product_id=product_id)
+        return self.select_for_fields(Review.objects.filter(product_id=product_id))
 
+    @transaction.atomic
     def perform_create(self, serializer):
-        product_id = self.kwargs['product_id']
-        product = Product.objects.get(id=product_id)
-        serializer.save(product_id=product_id, user=self.request.user)
+        product = get_object_or_404(Product, id=self.kwargs['product_id'])
+        review = serializer.save(product=product, user=self.request.user)
+        Product.objects.filter(pk=product.pk).adjust_rating(review.rating, 1)
 
 
 class ReviewUpdateDeleteView(generics.RetrieveUpdateDestroyAPIView):
@@ -63,13 +110,45 @@ class ReviewUpdateDeleteView(generics.RetrieveUpdateDestroyAPIView):
     def get_queryset(self):
         return Review.objects.filter(user=self.request.user)
 
+    def locked_rating(self, review):
+        """
+        The review's rating as stored now, its row locked for the rest of the
+        transaction, so concurrent writes to it adjust the aggregates in turn;
+        None once it has been deleted.
+        """
+        return Review.objects.select_for_update().filter(pk=review.pk).values_list('rating', flat=True).first()
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        old_rating = self.locked_rating(serializer.instance)
+        if old_rating is None:
+            raise Http404
+        review = serializer.save()
+        if review.rating != old_rating:
+            Product.objects.filter(pk=review.product_id).adjust_rating(review.rating - old_rating)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        rating = self.locked_rating(instance)
+        deleted, _ = instance.delete()
+        # A concurrent delete got there first: it took the review off the aggregates.
+        if rating is not None and deleted:
+            Product.objects.filter(pk=instance.product_id).adjust_rating(-rating, -1)
+
 class WishlistListView(generics.ListCreateAPIView):
     serializer_class = WishlistItemSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = WishlistPagination
 
     def get_queryset(self):
         return WishlistItem.objects.filter(user=self.request.user)
 
+    def list(self, request, *args, **kwargs):
+        expand = is_expanded(request, 'product')
+        fields = selected_fields(request, WISHLIST_FIELDS)
+        page = self.paginate_queryset(wishlist_rows(self.get_queryset(), expand, fields))
+        return self.get_paginated_response(render_wishlist_items(page, request, expand, fields))
+
     
 class WishlistAddView(generics.CreateAPIView):
     serializer_class = WishlistItemSerializer
@@ -85,3 +164,35 @@ class WishlistRemoveView(generics.DestroyAPIView):
     def get_queryset(self):
         return WishlistItem.objects.filter(user=self.request.user)
 
+class ProductExportView(ExportView):
+    permission_classes = [IsAdmin]
+    export = PRODUCT_EXPORT
+
+class ReviewExportView(ExportView):
+    permission_classes = [IsAdmin]
+    export = REVIEW_EXPORT
+
+class CatalogueImportView(APIView):
+    """
+    Upload a CSV or NDJSON `file` of products; see products/importer.py for
+    the columns. Rows that fail are reported and skipped.
+    """
+    permission_classes = [IsAdmin]
+    parser_classes = [MultiPartParser, FormParser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "file is required"}, status=status.HTTP_400_BAD_REQUEST)
+        format = request.data.get('file_format') or guess_format(upload.name)
+        try:
+            batch_size = int(request.data.get('batch_size', DEFAULT_BATCH_SIZE))
+        except ValueError:
+            return Response({"error": "batch_size must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            report = import_catalogue(
+                io.TextIOWrapper(upload.file, encoding='utf-8', newline=''), format, max(batch_size, 1)
+            )
+        except UnicodeDecodeError:
+            return Response({"error": "file must be UTF-8"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report.as_dict())
@@ -0,0 +1,111 @@
+"""
+JWT authentication without a user query per request.
+
+Access tokens carry the user's roles (``is_admin``, ``is_customer``) and
+``token_version`` as claims, set when they are issued. The user a token
+names is read from a short-lived cache keyed by user id and token version,
+and from the database only on a miss. The cache keeps only CACHED_FIELDS,
+never the password hash; the user rebuilt from them defers every other
+field, which reading loads from the database.
+
+Saving a user drops their cached entry, so other changes show within a
+request. Changing a password, deactivating a user or changing their roles
+also bumps ``User.token_version`` (see User.save). That revokes every
+token issued before, so a token's claims always match the user it is
+accepted for.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+TOKEN_VERSION_CLAIM = 'token_version'
+ROLE_CLAIMS = ('is_admin', 'is_customer')
+# What authentication, the permission classes and the profile read.
+CACHED_FIELDS = ('id', 'username', 'email', 'is_active', 'is_admin', 'is_customer', 'token_version')
+
+
+def get_cache():
+    return caches[settings.USER_AUTH_CACHE_ALIAS]
+
+
+def user_cache_key(user_id, token_version):
+    return f"users:auth:{user_id}:{token_version}"
+
+
+def token_claims(user):
+    """The claims tokens issued to `user` carry besides simplejwt's own."""
+    claims = {name: getattr(user, name) for name in ROLE_CLAIMS}
+    claims[TOKEN_VERSION_CLAIM] = user.token_version
+    return claims
+
+
+def cached_user(fields):
+    """A User holding the CACHED_FIELDS in `fields`, with its other fields deferred."""
+    model = get_user_model()
+    names = [field.attname for field in model._meta.concrete_fields if field.attname in fields]
+    return model.from_db(DEFAULT_DB_ALIAS, names, [fields[name] for name in names])
+
+
+def forget_user(user_id, *token_versions):
+    """Drop the cached user for these versions, now and again once the write commits."""
+    keys = [user_cache_key(user_id, version) for version in token_versions]
+    get_cache().delete_many(keys)
+    transaction.on_commit(lambda: get_cache().delete_many(keys))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the token's user through the cache.
+    aauthenticate() does the same for async views, with the async ORM.
+    """
+
+    def get_user(self, validated_token):
+        key, version = self.cache_key(validated_token)
+        fields = get_cache().get(key)
+        if fields is None:
+            return self.remember(key, version, super().get_user(validated_token))
+        return cached_user(fields)
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        key, version = self.cache_key(validated_token)
+        fields = get_cache().get(key)
+        if fields is not None:
+            return cached_user(fields)
+        lookup = {api_settings.USER_ID_FIELD: validated_token[api_settings.USER_ID_CLAIM]}
+        try:
+            user = await self.user_model.objects.aget(**lookup)
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return self.remember(key, version, user)
+
+    def cache_key(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+        # Tokens issued before versions existed count as version 0.
+        version = validated_token.get(TOKEN_VERSION_CLAIM, 0)
+        return user_cache_key(user_id, version), version
+
+    def remember(self, key, version, user):
+        if user.token_version != version:
+            raise AuthenticationFailed(_("Token has been revoked."), code="token_revoked")
+        get_cache().set(key, {name: getattr(user, name) for name in CACHED_FIELDS}, settings.USER_AUTH_CACHE_TIMEOUT)
+        return user
@@ -2,8 +2,33 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 
 class User(AbstractUser):
+    # The fields access tokens copy into their claims or depend on; saving a
+    # change to any of them bumps token_version, which revokes every token
+    # issued before (see users.authentication).
+    TOKEN_FIELDS = ('password', 'is_active', 'is_admin', 'is_customer')
+
     is_customer = models.BooleanField(default=True)
     is_admin = models.BooleanField(default=False)
+    token_version = models.PositiveIntegerField(default=0, editable=False)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        if not user.get_deferred_fields().intersection(cls.TOKEN_FIELDS):
+            user._loaded_token_fields = user.token_fields()
+        return user
+
+    def token_fields(self):
+        return tuple(getattr(self, name) for name in self.TOKEN_FIELDS)
+
+    def save(self, *args, **kwargs):
+        loaded = getattr(self, '_loaded_token_fields', None)
+        if loaded is not None and loaded != self.token_fields():
+            self.token_version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'token_version'}
+        super().save(*args, **kwargs)
+        self._loaded_token_fields = self.token_fields()
 
     def __str__(self):
         return self.username
@@ -1,5 +1,11 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from ecommerce.fields import FieldSelectionMixin
+from .authentication import TOKEN_VERSION_CLAIM, token_claims
 
 User = get_user_model()
 
@@ -19,7 +25,31 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         user.save()
         return user
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email']
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Issues tokens that carry the user's roles and token version."""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        for claim, value in token_claims(user).items():
+            token[claim] = value
+        return token
+
+class VersionedTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refuses refresh tokens issued before the user's token version last changed."""
+
+    def validate(self, attrs):
+        refresh = RefreshToken(attrs['refresh'])
+        current = User.objects.filter(
+            **{api_settings.USER_ID_FIELD: refresh.get(api_settings.USER_ID_CLAIM)},
+            token_version=refresh.get(TOKEN_VERSION_CLAIM, 0),
+        )
+        if not current.exists():
+            raise AuthenticationFailed("Token has been revoked.", code="token_revoked")
+        return super().validate(attrs)
+
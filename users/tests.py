@@ -1,3 +1,90 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
 
-# Create your tests here.
+from .authentication import CACHED_FIELDS, cached_user, user_cache_key
+
+User = get_user_model()
+
+
+class ProfileTests(APITestCase):
+    PROFILE_URL = '/api/users/profile/'
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="ada", email="ada@example.com", password="pass")
+        self.client.force_authenticate(self.user)
+
+    def test_profile(self):
+        response = self.client.get(self.PROFILE_URL)
+        self.assertEqual(response.data, {'id': self.user.pk, 'username': "ada", 'email': "ada@example.com"})
+
+    def test_fields_and_omit(self):
+        self.assertEqual(self.client.get(self.PROFILE_URL, {'fields': 'username'}).data, {'username': "ada"})
+        self.assertEqual(list(self.client.get(self.PROFILE_URL, {'omit': 'email'}).data), ['id', 'username'])
+
+
+class CachedJWTAuthenticationTests(APITestCase):
+    PROFILE_URL = '/api/users/profile/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="ada", email="ada@example.com", password="pass")
+
+    def obtain(self, password="pass"):
+        response = self.client.post('/api/token/', {'username': "ada", 'password': password})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def get_profile(self, access):
+        return self.client.get(self.PROFILE_URL, HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def test_claims(self):
+        claims = AccessToken(self.obtain()['access'])
+        self.assertEqual(
+            (claims['is_admin'], claims['is_customer'], claims['token_version']), (False, True, 0)
+        )
+
+    def test_user_is_read_from_the_cache(self):
+        access = self.obtain()['access']
+        self.get_profile(access)
+        with self.assertNumQueries(0):
+            response = self.get_profile(access)
+        self.assertEqual(response.data['username'], "ada")
+
+    def test_cache_keeps_no_password_hash(self):
+        self.get_profile(self.obtain()['access'])
+        fields = cache.get(user_cache_key(self.user.pk, 0))
+        self.assertEqual(set(fields), set(CACHED_FIELDS))
+        user = cached_user(fields)
+        self.assertEqual((user.pk, user.is_admin, user.is_customer), (self.user.pk, False, True))
+        self.assertIn('password', user.get_deferred_fields())
+        # Reading a field the cache leaves out loads it.
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password("pass"))
+
+    def test_saving_the_user_refreshes_the_cache(self):
+        access = self.obtain()['access']
+        self.get_profile(access)
+        user = User.objects.get(pk=self.user.pk)
+        user.email = "lovelace@example.com"
+        user.save()
+        response = self.get_profile(access)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['email'], "lovelace@example.com")
+
+    def test_password_and_role_changes_revoke_tokens(self):
+        for change in ('password', 'is_admin', 'is_active'):
+            with self.subTest(change):
+                tokens = self.obtain()
+                self.get_profile(tokens['access'])
+                user = User.objects.get(pk=self.user.pk)
+                if change == 'password':
+                    user.set_password("pass")
+                else:
+                    setattr(user, change, not getattr(user, change))
+                user.save()
+                self.assertEqual(self.get_profile(tokens['access']).status_code, 401)
+                response = self.client.post('/api/token/refresh/', {'refresh': tokens['refresh']})
+                self.assertEqual(response.status_code, 401)
+                User.objects.filter(pk=self.user.pk).update(is_active=True, is_admin=False)